@@ -1,5 +1,6 @@
 # app/auth/oauth.py
 
+import logging
 from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -8,9 +9,13 @@ import jwt
 from app.connection_to_db import get_db
 from app.settings import settings
 from app.utils import ALGORITHM
+from app.logs import bind_request_context
 from app.models import User
+from app.tracing import span
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login/")
 
@@ -21,6 +26,7 @@ async def verify_token(token: str):
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
 
     except JWTError:
+        logger.debug("invalid access token")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
@@ -50,32 +56,35 @@ async def verify_token(token: str):
 
 
 async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    try:
-        # Verify the token and get the user ID
-        user_id = await verify_token(token)
-
-        # Fetch the user by ID
-        user = db.query(User).filter(User.id == user_id).first()
-
-        # Raise 404 if the user is not found
-        if user is None:
+    with span("get_current_user"):
+        try:
+            # Verify the token and get the user ID
+            user_id = await verify_token(token)
+
+            # Fetch the user by ID
+            user = db.query(User).filter(User.id == user_id).first()
+
+            # Raise 404 if the user is not found
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+                )
+
+            bind_request_context(user_id=str(user.id))
+            return user
+
+        # Allow known HTTPExceptions to propagate
+        except HTTPException as http_ex:
+            raise http_ex
+
+        # Catch any other unexpected exceptions and raise 500
+        except Exception as e:
+            logger.exception("authentication failed unexpectedly")
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"An unexpected error occurred: {str(e)}",
             )
 
-        return user
-
-    # Allow known HTTPExceptions to propagate
-    except HTTPException as http_ex:
-        raise http_ex
-
-    # Catch any other unexpected exceptions and raise 500
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An unexpected error occurred: {str(e)}",
-        )
-
 
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user),
@@ -0,0 +1,36 @@
+# app/api/batch.py
+
+from typing import Annotated, Optional
+from uuid import UUID
+from fastapi import HTTPException, Query, status
+from app.settings import settings
+
+
+def batch_ids(
+    ids: Annotated[Optional[list[str]], Query(description="Ids to look up, comma separated or repeated")] = None,
+) -> list[UUID] | None:
+    # Accepts ?ids=a,b,c as well as ?ids=a&ids=b; order and duplicates are kept
+    if ids is None:
+        return None
+
+    parsed = []
+    for value in ids:
+        for part in value.split(","):
+            if not part.strip():
+                continue
+            try:
+                parsed.append(UUID(part.strip()))
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Invalid id: {part.strip()}",
+                )
+
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No ids given")
+    if len(parsed) > settings.MULTI_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MULTI_GET_MAX_IDS} ids can be requested at once",
+        )
+    return parsed
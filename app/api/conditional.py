@@ -0,0 +1,29 @@
+# app/api/conditional.py
+#
+# Versioned resources (products, orders) send their version counter as a
+# strong ETag. Clients echo it in If-Match on PUT/DELETE; the write is then
+# refused with 412 if the resource changed since they read it.
+
+from typing import Annotated, Optional
+from fastapi import Header, HTTPException, status
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_version(
+    if_match: Annotated[Optional[str], Header(description="ETag of the version being modified")] = None,
+) -> int | None:
+    # None means no precondition: no header, or "*" for any current version
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    # If-Match uses strong comparison, so weak tags (W/"3") never match
+    tag = if_match.strip()
+    if len(tag) < 3 or tag[0] != '"' or tag[-1] != '"' or not tag[1:-1].isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be the ETag returned with the resource",
+        )
+    return int(tag[1:-1])
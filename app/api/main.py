@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import product, user, login, status, order
+from app.api.routes import product, user, login, status, order, outbox, inventory, events
 
 api_router = APIRouter()
 api_router.include_router(login.router, prefix="/login", tags=["login"])
@@ -8,3 +8,6 @@ api_router.include_router(user.router, prefix="/users", tags=["users"])
 api_router.include_router(status.router, prefix="/statuses", tags=["statuses"])
 api_router.include_router(order.router, prefix="/orders", tags=["orders"])
 api_router.include_router(product.router, prefix="/products", tags=["products"])
+api_router.include_router(inventory.router, prefix="/inventory", tags=["inventory"])
+api_router.include_router(outbox.router, prefix="/outbox", tags=["outbox"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
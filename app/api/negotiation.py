@@ -0,0 +1,184 @@
+# app/api/negotiation.py
+#
+# Content negotiation for bulk list endpoints. JSON stays the default; clients
+# can ask for compact encodings through the Accept header:
+#
+#   application/msgpack                  {"columns": [...], "rows": [[...], ...]}
+#                                        UUIDs as 16 raw bytes, decimals as strings,
+#                                        datetimes as MessagePack timestamps
+#   application/vnd.apache.arrow.stream  Arrow IPC stream, one column per field
+#                                        (decimal128 prices, int64 stock, ...)
+#
+# Paging metadata (e.g. for /products/search) goes next to "rows" in MessagePack
+# and into the schema metadata in Arrow.
+
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import NoneType, UnionType
+from typing import Any, Union, get_args, get_origin
+from uuid import UUID
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # optional dependency
+    pyarrow = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    "*/*": JSON_MEDIA_TYPE,
+    "application/*": JSON_MEDIA_TYPE,
+}
+
+# Documents the extra media types in OpenAPI
+BINARY_RESPONSES = {
+    200: {
+        "content": {
+            MSGPACK_MEDIA_TYPE: {},
+            ARROW_MEDIA_TYPE: {},
+        }
+    }
+}
+
+
+def _available(media_type: str) -> bool:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack is not None
+    if media_type == ARROW_MEDIA_TYPE:
+        return pyarrow is not None
+    return True
+
+
+def preferred_media_type(request: Request) -> str:
+    accept = request.headers.get("accept")
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    candidates, unavailable = [], []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        media_type = MEDIA_TYPE_ALIASES.get(media_type.lower(), media_type.lower())
+        if quality > 0 and media_type in (JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE):
+            if _available(media_type):
+                candidates.append((-quality, position, media_type))
+            else:
+                unavailable.append(media_type)
+
+    if candidates:
+        return min(candidates)[2]
+    # Only a binary encoding that isn't installed was asked for; anything else
+    # (e.g. Accept: text/html) keeps getting JSON as before
+    if unavailable:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"{', '.join(unavailable)} is not available. Use {JSON_MEDIA_TYPE} instead.",
+        )
+    return JSON_MEDIA_TYPE
+
+
+def _field_types(model: type[BaseModel]) -> dict[str, Any]:
+    types = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if get_origin(annotation) in (Union, UnionType):
+            args = [arg for arg in get_args(annotation) if arg is not NoneType]
+            annotation = args[0] if len(args) == 1 else str
+        types[name] = annotation
+    return types
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return value.bytes
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        # Stored timestamps are naive UTC
+        return msgpack.Timestamp.from_datetime(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+    raise TypeError(f"Cannot encode {type(value).__name__} as MessagePack")
+
+
+def encode_msgpack(rows: list[BaseModel], row_model: type[BaseModel], metadata: dict | None = None) -> bytes:
+    columns = list(row_model.model_fields)
+    payload = dict(metadata or {})
+    payload["columns"] = columns
+    payload["rows"] = [[getattr(row, column) for column in columns] for row in rows]
+    return msgpack.packb(payload, default=_msgpack_default)
+
+
+def _arrow_type(annotation: Any):
+    if annotation is UUID:
+        return pyarrow.binary(16)
+    if annotation is Decimal:
+        return pyarrow.decimal128(12, 2)
+    if annotation is bool:
+        return pyarrow.bool_()
+    if annotation is int:
+        return pyarrow.int64()
+    if annotation is float:
+        return pyarrow.float64()
+    if annotation is datetime:
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+def encode_arrow(rows: list[BaseModel], row_model: type[BaseModel], metadata: dict | None = None) -> bytes:
+    arrays, names = [], []
+    for name, annotation in _field_types(row_model).items():
+        arrow_type = _arrow_type(annotation)
+        values = [getattr(row, name) for row in rows]
+        if annotation is UUID:
+            values = [value.bytes if value is not None else None for value in values]
+        elif arrow_type == pyarrow.string():
+            values = [str(value) if value is not None else None for value in values]
+        arrays.append(pyarrow.array(values, type=arrow_type))
+        names.append(name)
+
+    table = pyarrow.Table.from_arrays(arrays, names=names)
+    if metadata:
+        table = table.replace_schema_metadata({key: json.dumps(value) for key, value in metadata.items()})
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate_rows(
+    request: Request,
+    json_payload: Any,
+    rows: list[BaseModel],
+    row_model: type[BaseModel],
+    metadata: dict | None = None,
+) -> Any:
+    # Returns json_payload untouched for JSON so the route's response_model still applies
+    media_type = preferred_media_type(request)
+
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = encode_msgpack(rows, row_model, metadata)
+    elif media_type == ARROW_MEDIA_TYPE:
+        body = encode_arrow(rows, row_model, metadata)
+    else:
+        return json_payload
+
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
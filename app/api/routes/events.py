@@ -0,0 +1,143 @@
+import asyncio
+import json
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.api.auth.oauth import get_current_user, verify_token
+from app.connection_to_db import get_db
+from app.events import Subscription, broker
+from app.models import Order, Status, User
+from app.settings import settings
+
+router = APIRouter()
+
+
+def _subscribe(db: Session, current_user: User, order_id: UUID | None, user_id: UUID | None) -> tuple[Subscription, dict | None]:
+    if (order_id is None) == (user_id is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Subscribe to either an order or a user")
+
+    snapshot = None
+    if order_id is not None:
+        # The current status goes out first, so nothing between the client's last read and now is missed
+        order = db.execute(
+            select(Order.user_id, Order.updated_at, Status.name.label("status"))
+            .join(Status, Order.status_id == Status.id)
+            .where(Order.id == order_id)
+        ).first()
+        if not order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        user_id = order.user_id
+        snapshot = {
+            "type": "order.snapshot",
+            "order_id": str(order_id),
+            "user_id": str(order.user_id),
+            "status": order.status,
+            "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        }
+
+    if not current_user.is_admin and str(current_user.id) != str(user_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. You can only follow your own orders.")
+
+    # The stream can stay open for hours; don't hold a pooled connection for it
+    db.close()
+
+    channel = f"order:{order_id}" if order_id is not None else f"user:{user_id}"
+    return broker.subscribe([channel]), snapshot
+
+
+def _sse_message(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _sse_stream(request: Request, subscription: Subscription, snapshot: dict | None):
+    try:
+        if snapshot:
+            yield _sse_message(snapshot)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                # Fell behind or shutting down; the client reconnects and gets a fresh snapshot
+                yield "event: overflow\ndata: {}\n\n"
+                break
+            yield _sse_message(event)
+    finally:
+        subscription.close()
+
+
+def _sse_response(request: Request, subscription: Subscription, snapshot: dict | None) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(request, subscription, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/orders/{order_id}")
+async def stream_order_events(
+    order_id: UUID,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    subscription, snapshot = _subscribe(db, current_user, order_id, None)
+    return _sse_response(request, subscription, snapshot)
+
+
+@router.get("/users/{user_id}")
+async def stream_user_order_events(
+    user_id: UUID,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    subscription, snapshot = _subscribe(db, current_user, None, user_id)
+    return _sse_response(request, subscription, snapshot)
+
+
+@router.websocket("/ws")
+async def order_events_websocket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    order_id: Optional[UUID] = Query(None),
+    user_id: Optional[UUID] = Query(None),
+    db: Session = Depends(get_db)
+):
+    # Browsers can't set headers on WebSockets, so the access token comes as a query parameter
+    try:
+        current_user_id = await verify_token(token)
+        current_user = db.query(User).filter(User.id == current_user_id).first()
+        if current_user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        subscription, snapshot = _subscribe(db, current_user, order_id, user_id)
+    except HTTPException as error:
+        await websocket.close(code=4000 + error.status_code, reason=str(error.detail))
+        return
+
+    await websocket.accept()
+    try:
+        if snapshot:
+            await websocket.send_json(snapshot)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Sending is how a vanished client is noticed
+                await websocket.send_json({"type": "keep-alive"})
+                continue
+            if event is None:
+                await websocket.close(code=4008, reason="overflow")
+                break
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
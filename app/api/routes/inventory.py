@@ -0,0 +1,56 @@
+from uuid import UUID
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+from app.api.auth.oauth import get_current_admin_user, get_current_user
+from app.connection_to_db import get_db
+from app.models import User
+from app.schemas import (
+    CreateStockReservationRequestModel,
+    EnableHotProductRequestModel,
+    HotProductResponseModel,
+    StockReservationResponseModel,
+)
+from app.services.inventory_service import InventoryService
+
+router = APIRouter()
+
+
+@router.post("/reservations", response_model=StockReservationResponseModel, status_code=status.HTTP_201_CREATED)
+async def reserve_stock(
+    request: CreateStockReservationRequestModel,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    inventory_service = InventoryService(db)
+    return inventory_service.reserve_for_cart(current_user.id, request.product_id, request.quantity)
+
+
+@router.delete("/reservations/{token}", status_code=status.HTTP_204_NO_CONTENT)
+async def release_reservation(
+    token: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    inventory_service = InventoryService(db)
+    inventory_service.release(token, current_user.id)
+
+
+@router.put("/hot-products/{product_id}", response_model=HotProductResponseModel, status_code=status.HTTP_200_OK)
+async def enable_hot_product(
+    product_id: UUID,
+    request: EnableHotProductRequestModel,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    inventory_service = InventoryService(db)
+    return inventory_service.enable_hot_product(product_id, request.slices)
+
+
+@router.delete("/hot-products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def disable_hot_product(
+    product_id: UUID,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    inventory_service = InventoryService(db)
+    inventory_service.disable_hot_product(product_id)
@@ -1,25 +1,38 @@
-from datetime import timedelta
+import logging
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException,status
 from fastapi.security import OAuth2PasswordRequestForm
 from app.connection_to_db import get_db
-from app.settings import settings
-from app.utils import create_access_token
+from app.logs import bind_request_context
+from app.metrics import LOGIN_FAILURES
+from app.schemas import RefreshTokenRequestModel, Token
+from app.services.token_service import TokenService
 from app.api.auth.auth import authenticate_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/")
+@router.post("/", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db,form_data.username, form_data.password)
+    user = await authenticate_user(db,form_data.username, form_data.password)
     if not user:
+        LOGIN_FAILURES.inc()
+        logger.warning("login failed", extra={"username": form_data.username})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=int(settings.ACCESS_TOKEN_EXPIRE_MINUTES))
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    bind_request_context(user_id=str(user.id))
+    logger.info("login")
+    return TokenService(db).issue_tokens(user.id)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(request: RefreshTokenRequestModel, db: Session = Depends(get_db)):
+    return TokenService(db).refresh(request.refresh_token)
+
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_refresh_token(request: RefreshTokenRequestModel, db: Session = Depends(get_db)):
+    TokenService(db).revoke(request.refresh_token)
@@ -1,13 +1,27 @@
-from fastapi import APIRouter, Depends, Path, status
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
 from app.api.auth.oauth import get_current_admin_user, get_current_user
+from app.api.batch import batch_ids
+from app.api.conditional import etag, if_match_version
 from app.connection_to_db import get_db
+from app.fields import parse_fields, sparse_response
+from app.jobs import order_intake_worker
 from app.models import User
+from app.services.order_intake_service import OrderIntakeService
 from app.services.order_service import OrderService
+from app.settings import settings
 from app.schemas import (
+    BulkCancelOrdersRequestModel,
+    BulkCancelOrdersResponseModel,
     CreateOrderRequestModel,
     CreateOrderResponseModel,
+    OrderBatchItemModel,
+    OrderIntakeMetricsResponseModel,
+    OrderTicketResponseModel,
     UpdateOrderStatusRequestModel,
     UpdateOrderStatusResponseModel,
     GetOrderResponseModel
@@ -16,42 +30,126 @@ from app.schemas import (
 
 router = APIRouter()
 
-@router.post("/", response_model=CreateOrderResponseModel, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=CreateOrderResponseModel,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": OrderTicketResponseModel, "description": "Queued (async intake mode)"}},
+)
 async def create_order(
     order_request: CreateOrderRequestModel,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    if settings.ORDER_INTAKE_MODE == "async":
+        ticket = OrderIntakeService(db).enqueue(current_user.id, order_request)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(ticket),
+            headers={"Location": f"/api/v1/orders/tickets/{ticket.id}"},
+        )
+
     order_service = OrderService(db)
     return order_service.create_order(current_user.id, order_request)
 
 
+@router.get("/tickets/{ticket_id}", response_model=OrderTicketResponseModel, status_code=status.HTTP_200_OK)
+async def get_order_ticket(
+    ticket_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return OrderIntakeService(db).get_ticket(ticket_id, current_user)
+
+
+@router.get("/intake/metrics", response_model=OrderIntakeMetricsResponseModel, status_code=status.HTTP_200_OK)
+async def get_order_intake_metrics(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    backlog = OrderIntakeService(db).get_backlog()
+
+    # Processing counters live in this process only; the queue is table-wide
+    worker = order_intake_worker.order_intake_worker
+    return OrderIntakeMetricsResponseModel(
+        mode=settings.ORDER_INTAKE_MODE,
+        worker_running=worker is not None,
+        **backlog,
+        processing=worker.metrics.snapshot() if worker else None,
+    )
+
+
+
+@router.post("/bulk-cancel", response_model=BulkCancelOrdersResponseModel, status_code=status.HTTP_200_OK)
+async def bulk_cancel_orders(
+    request: BulkCancelOrdersRequestModel,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    order_service = OrderService(db)
+    order_ids = order_service.cancel_stale_orders(request.older_than_minutes, request.limit)
+    return BulkCancelOrdersResponseModel(canceled_count=len(order_ids), order_ids=order_ids)
+
+
+@router.get("/", response_model=list[OrderBatchItemModel], status_code=status.HTTP_200_OK)
+async def get_orders_by_ids(
+    ids: Optional[list[UUID]] = Depends(batch_ids),
+    expand: Optional[Literal["products"]] = Query(None, description="Use 'products' to include product name and price"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if ids is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="ids is required")
+
+    order_service = OrderService(db)
+    return order_service.get_orders_by_ids(
+        ids, None if current_user.is_admin else current_user.id, expand_products=expand == "products"
+    )
+
 
 @router.put("/{order_id}/status", response_model=UpdateOrderStatusResponseModel, status_code=status.HTTP_200_OK)
 async def update_order_status(
     order_id: UUID,
     status_update: UpdateOrderStatusRequestModel,
+    response: Response,
+    expected_version: Optional[int] = Depends(if_match_version),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     order_service = OrderService(db)
-    return order_service.update_order_status(order_id, status_update.status)
+    updated_order = order_service.update_order_status(order_id, status_update.status, expected_version)
+    response.headers["ETag"] = etag(updated_order.version)
+    return updated_order
 
 @router.get("/{order_id}", response_model=GetOrderResponseModel, status_code=status.HTTP_200_OK)
 async def get_order_details(
+    response: Response,
     order_id: UUID = Path(..., description="The ID of the order to retrieve"),
+    expand: Optional[Literal["products"]] = Query(None, description="Use 'products' to include product name and price"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. status,updated_at"),
     db: Session = Depends(get_db)
 ):
     order_service = OrderService(db)
-    return order_service.get_order_details(order_id)
+    selected = parse_fields(fields, GetOrderResponseModel)
+    if selected:
+        # The version is read either way for the ETag, but only returned if asked for
+        with_version = tuple(name for name in GetOrderResponseModel.model_fields if name in selected or name == "version")
+        order = order_service.get_order_details(order_id, expand_products=expand == "products", fields=with_version)
+        sparse = sparse_response(jsonable_encoder(order, include=set(selected)))
+        sparse.headers["ETag"] = etag(order.version)
+        return sparse
+    order = order_service.get_order_details(order_id, expand_products=expand == "products")
+    response.headers["ETag"] = etag(order.version)
+    return order
 
 @router.delete("/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_order(
     order_id: UUID = Path(..., description="The ID of the order to be canceled"),
+    expected_version: Optional[int] = Depends(if_match_version),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     order_service = OrderService(db)
-    order_service.cancel_order(order_id, current_user.id)
+    order_service.cancel_order(order_id, current_user.id, expected_version)
     return None
 
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+from app.api.auth.oauth import get_current_admin_user
+from app.connection_to_db import get_db
+from app.jobs import outbox_worker
+from app.models import User
+from app.schemas import OutboxMetricsResponseModel
+from app.services.outbox_service import OutboxService
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_model=OutboxMetricsResponseModel, status_code=status.HTTP_200_OK)
+async def get_outbox_metrics(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    outbox_service = OutboxService(db)
+    backlog = outbox_service.get_backlog()
+
+    # Delivery counters live in this process only; the backlog is table-wide
+    worker = outbox_worker.outbox_worker
+    delivery = worker.metrics.snapshot() if worker else None
+
+    return OutboxMetricsResponseModel(
+        worker_running=worker is not None,
+        **backlog,
+        delivery=delivery,
+    )
@@ -1,20 +1,32 @@
-from typing import Annotated
+from typing import Annotated, Literal, Optional, Union
 from uuid import UUID
-from fastapi import APIRouter, Depends,Query, status
+from fastapi import APIRouter, Depends,Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from app.api.auth.oauth import get_current_admin_user
+from app.api.batch import batch_ids
+from app.api.conditional import etag, if_match_version
+from app.api.negotiation import BINARY_RESPONSES, negotiate_rows
 from app.connection_to_db import get_db
+from app.fields import parse_fields, sparse_model, sparse_response, sparse_rows
 from app.schemas import (
+    AdjustProductStockRequestModel,
     CreateProductRequestModel,
     CreateProductResponseModel,
+    GetProductBySearchResponseModel,
     GetProductResponseModel,
+    ProductBatchItemModel,
+    ProductStockResponseModel,
+    ProductSuggestionModel,
     SearchRequest,
     SearchResult,
+    TopProductModel,
     UpdatedProductRequestModel,
     UpdatedProductResponseModel,
 )
 from sqlalchemy.orm import Session
 from app.models import User
-from app.services.product_service import ProductService
+from app.services.product_service import ProductService, parse_price_breaks
+from app.settings import settings
 
 router = APIRouter()
 
@@ -40,41 +52,137 @@ async def create_product(
 async def update_product(
     product_id: UUID,
     product_update: UpdatedProductRequestModel,
+    response: Response,
+    expected_version: Optional[int] = Depends(if_match_version),
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db),
 ):
 
     product_service = ProductService(db)
-    updated_product = product_service.update_product(product_id, product_update)
+    updated_product = product_service.update_product(product_id, product_update, expected_version)
+    response.headers["ETag"] = etag(updated_product.version)
     return UpdatedProductResponseModel.from_orm(updated_product)
 
 
+@router.post(
+    "/{product_id}/stock",
+    response_model=ProductStockResponseModel,
+    status_code=status.HTTP_200_OK,
+)
+async def adjust_product_stock(
+    product_id: UUID,
+    adjustment: AdjustProductStockRequestModel,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    product_service = ProductService(db)
+    return product_service.adjust_stock(product_id, adjustment)
+
+
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: UUID,
+    expected_version: Optional[int] = Depends(if_match_version),
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db),
 ):
     product_service = ProductService(db)
-    product_service.delete_product(product_id)
+    product_service.delete_product(product_id, expected_version)
 
 
 @router.get(
-    "/", response_model=list[GetProductResponseModel], status_code=status.HTTP_200_OK
+    "/",
+    response_model=Union[list[GetProductResponseModel], list[ProductBatchItemModel]],
+    status_code=status.HTTP_200_OK,
+    responses=BINARY_RESPONSES,
 )
-def get_all_products(db: Session = Depends(get_db)):
+def get_all_products(
+    request: Request,
+    ids: Optional[list[UUID]] = Depends(batch_ids),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,price"),
+    db: Session = Depends(get_db),
+):
     product_service = ProductService(db)
-    products = product_service.get_all_products()
-    return [GetProductResponseModel.from_orm(product) for product in products]
+    # ?ids=... looks up specific products in one query instead of one request each
+    if ids is not None:
+        return product_service.get_products_by_ids(ids)
+
+    selected = parse_fields(fields, GetProductResponseModel)
+    products = product_service.get_all_products(selected)
+    if selected:
+        products = sparse_rows(products, GetProductResponseModel, selected)
+        return negotiate_rows(
+            request, sparse_response(products), products, sparse_model(GetProductResponseModel, selected)
+        )
+
+    products = [GetProductResponseModel.from_orm(product) for product in products]
+    return negotiate_rows(request, products, products, GetProductResponseModel)
 
 
-@router.get("/search", response_model=SearchResult, status_code=status.HTTP_200_OK)
+@router.get(
+    "/search",
+    response_model=SearchResult,
+    status_code=status.HTTP_200_OK,
+    responses=BINARY_RESPONSES,
+)
 async def search_products(
-    search_request: Annotated[SearchRequest, Query()], db: Session = Depends(get_db)
+    request: Request,
+    search_request: Annotated[SearchRequest, Query()],
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,price"),
+    facets: bool = Query(False, description="Also return availability counts and a price histogram"),
+    price_breaks: Optional[str] = Query(None, description="Comma-separated histogram bucket boundaries, e.g. 10,50,100"),
+    db: Session = Depends(get_db),
 ):
     product_service = ProductService(db)
-    search_result = product_service.search_products(search_request)
-    return search_result
+    selected = parse_fields(fields, GetProductBySearchResponseModel)
+    breaks = parse_price_breaks(price_breaks) if facets else None
+    if selected:
+        page, products = product_service.search_page(search_request, selected, breaks)
+        products = sparse_rows(products, GetProductBySearchResponseModel, selected)
+        return negotiate_rows(
+            request,
+            sparse_response({**page, "products": products}),
+            products,
+            sparse_model(GetProductBySearchResponseModel, selected),
+            metadata=jsonable_encoder(page),
+        )
+
+    search_result = product_service.search_products(search_request, breaks)
+    return negotiate_rows(
+        request,
+        search_result,
+        search_result.products,
+        GetProductBySearchResponseModel,
+        metadata=jsonable_encoder(search_result.dict(exclude={"products"}, exclude_none=True)),
+    )
+
+
+@router.get(
+    "/suggest",
+    response_model=list[ProductSuggestionModel],
+    status_code=status.HTTP_200_OK,
+)
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(10, ge=1, le=settings.SUGGEST_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    product_service = ProductService(db)
+    return product_service.suggest_products(q, limit)
+
+
+@router.get(
+    "/top",
+    response_model=list[TopProductModel],
+    status_code=status.HTTP_200_OK,
+)
+async def get_top_products(
+    window: Literal["1h", "24h", "7d"] = Query("24h"),
+    limit: int = Query(10, ge=1, le=settings.RANKING_MAX_TOP),
+    db: Session = Depends(get_db),
+):
+    product_service = ProductService(db)
+    return product_service.get_top_products(window, limit)
 
 
 @router.get(
@@ -82,8 +190,20 @@ async def search_products(
     response_model=GetProductResponseModel,
     status_code=status.HTTP_200_OK,
 )
-async def get_product(product_id: UUID, db: Session = Depends(get_db)):
+async def get_product(
+    product_id: UUID,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,price"),
+    db: Session = Depends(get_db),
+):
 
     product_service = ProductService(db)
-    product = product_service.get_product(product_id)
+    selected = parse_fields(fields, GetProductResponseModel)
+    product = product_service.get_product(product_id, selected)
+    if selected:
+        # A returned Response doesn't pick up headers set on the injected one
+        sparse = sparse_response(sparse_rows([product], GetProductResponseModel, selected)[0])
+        sparse.headers["ETag"] = etag(product.version)
+        return sparse
+    response.headers["ETag"] = etag(product.version)
     return GetProductResponseModel.from_orm(product)
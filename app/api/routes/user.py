@@ -1,7 +1,15 @@
+import json
+from typing import Annotated, AsyncIterator, Iterator, Optional, Union
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+import anyio.from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from app.api.auth.oauth import get_current_admin_user, get_current_user
-from app.connection_to_db import get_db
+from app.api.batch import batch_ids
+from app.api.negotiation import BINARY_RESPONSES, negotiate_rows
+from app.connection_to_db import SessionLocal, get_db
+from app.fields import parse_fields, sparse_response
 from app.schemas import (
     ChangeRoleRequestModel,
     CreateUserResponseModel,
@@ -9,10 +17,18 @@ from app.schemas import (
     GetUserResponseModel,
     UpdateUserRequestModel,
     UpdatedUserResponseModel,
+    UserBatchItemModel,
     UserCreateRequestModel,
+    UserOrderSummaryModel,
+    UserSearchRequest,
+    UserSearchResult,
 )
 from app.models import User
+from app.services.order_stats_service import OrderStatsService
+from app.services.token_service import TokenService
+from app.services.user_provisioning_service import UserProvisioningService
 from app.services.user_service import UserService
+from app.settings import settings
 from app.api.auth.auth import *
 from sqlalchemy.orm import Session
 
@@ -29,6 +45,67 @@ def create_user(user: UserCreateRequestModel, db: Session = Depends(get_db)):
    return user_service.create_user(user)  
 
 
+class _UploadStreamingResponse(StreamingResponse):
+    # Streams while the request body is still being read, so receive() must be
+    # left to the reader rather than watched for a disconnect
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/bulk", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def provision_users(
+    request: Request,
+    current_user: User = Depends(get_current_admin_user),
+):
+    # Body: one JSON user per line ({"username", "email", "password"}), at most
+    # PROVISION_MAX_BYTES. Rows are read, validated and created as the upload
+    # arrives; the response streams one JSON outcome per row as each chunk is
+    # committed, then {"summary": ...}.
+    content_length = request.headers.get("content-length")
+    if content_length is None or not content_length.isdigit():
+        raise HTTPException(status_code=status.HTTP_411_LENGTH_REQUIRED, detail="Content-Length is required")
+    if int(content_length) > settings.PROVISION_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.PROVISION_MAX_BYTES} bytes can be provisioned per request",
+        )
+    records = _ndjson_records(request)
+
+    def outcomes() -> Iterator[str]:
+        # Runs on the threadpool. Its own session: get_db's is closed before a
+        # streamed body is sent.
+        with SessionLocal() as db:
+            service = UserProvisioningService(db)
+            for outcome in service.provision(_from_event_loop(records)):
+                yield json.dumps(jsonable_encoder(outcome)) + "\n"
+            yield json.dumps({"summary": jsonable_encoder(service.summary())}) + "\n"
+
+    return _UploadStreamingResponse(outcomes(), media_type="application/x-ndjson")
+
+
+async def _ndjson_records(request: Request) -> AsyncIterator[tuple[int, str]]:
+    pending, line = b"", 0
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        for raw in lines:
+            line += 1
+            if raw.strip():
+                yield line, raw.decode("utf-8", errors="replace")
+    if pending.strip():
+        yield line + 1, pending.decode("utf-8", errors="replace")
+
+
+def _from_event_loop(records: AsyncIterator[tuple[int, str]]) -> Iterator[tuple[int, str]]:
+    # Lets the synchronous service pull rows from the upload, one at a time
+    while True:
+        try:
+            yield anyio.from_thread.run(records.__anext__)
+        except StopAsyncIteration:
+            return
+
+
 @router.put("/change_role", status_code=status.HTTP_200_OK)
 async def change_role(
     request: ChangeRoleRequestModel,
@@ -72,17 +149,40 @@ async def delete_user(
 
 
 @router.get(
-    "/", response_model=list[GetUserResponseModel], status_code=status.HTTP_200_OK
+    "/",
+    response_model=Union[list[GetUserResponseModel], list[UserBatchItemModel]],
+    status_code=status.HTTP_200_OK,
 )
-async def get_all_users(current_admin: User = Depends(get_current_admin_user), db: Session = Depends(get_db)): 
+async def get_all_users(
+    ids: Optional[list[UUID]] = Depends(batch_ids),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. username,email"),
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+): 
     user_service = UserService(db) 
-    return user_service.get_all_users()
+    if ids is not None:
+        return user_service.get_users_by_ids(ids)
+
+    selected = parse_fields(fields, GetUserResponseModel)
+    users = user_service.get_all_users(selected)
+    return sparse_response(users) if selected else users
     
 
 
+@router.get("/search", response_model=UserSearchResult, status_code=status.HTTP_200_OK)
+async def search_users(
+    search_request: Annotated[UserSearchRequest, Query()],
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    user_service = UserService(db)
+    return user_service.search_users(search_request)
+
+
 @router.get("/{user_id}", response_model=GetUserResponseModel)
 async def get_user_details(
     user_id: UUID,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. username,email"),
     current_user: User = Depends(get_current_user),
     db: Session =  Depends(get_db)
 ):
@@ -95,17 +195,58 @@ async def get_user_details(
 
     # Step 2: Retrieve User Data
     user_service = UserService(db)
-    user = user_service.get_user_by_id(user_id)
+    selected = parse_fields(fields, GetUserResponseModel)
+    user = user_service.get_user_by_id(user_id, selected)
     
-    return user
+    return sparse_response(user) if selected else user
 
 
-@router.get("/{user_id}/orders",response_model=list[GetOrderToUserResponseModel], status_code=status.HTTP_200_OK)
+@router.get(
+    "/{user_id}/orders",
+    response_model=list[GetOrderToUserResponseModel],
+    status_code=status.HTTP_200_OK,
+    responses=BINARY_RESPONSES,
+)
 async def get_orders_for_user(
+    request: Request,
     user_id: UUID,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
 # Step 2: Retrieve User Data
     user_service = UserService(db)
-    return user_service.getOrdersForUser(user_id)
\ No newline at end of file
+    orders = user_service.getOrdersForUser(user_id)
+    return negotiate_rows(request, orders, orders, GetOrderToUserResponseModel)
+
+@router.get("/{user_id}/summary", response_model=UserOrderSummaryModel, status_code=status.HTTP_200_OK)
+async def get_user_order_summary(
+    user_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_admin and str(current_user.id) != str(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. You can only view your own details.",
+        )
+
+    order_stats_service = OrderStatsService(db)
+    return order_stats_service.get_summary(user_id)
+
+
+@router.delete("/{user_id}/refresh-tokens", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_user_refresh_tokens(
+    user_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Signs the user out everywhere once their access tokens expire
+    if not current_user.is_admin and str(current_user.id) != str(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. You can only revoke your own sessions.",
+        )
+
+    token_service = TokenService(db)
+    token_service.revoke_all_for_user(user_id)
+    db.commit()
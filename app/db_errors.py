@@ -0,0 +1,63 @@
+# app/db_errors.py
+#
+# Services write first and let constraints reject bad data instead of running
+# a check query before every write (which also races with concurrent writers).
+# translate_integrity_errors turns the violations back into the HTTP errors the
+# API has always returned.
+#
+# Versioned models (version_id_col) are updated without locks; require_version
+# checks a client's If-Match and translate_stale_data reports a write that lost
+# the race to a concurrent one.
+
+from contextlib import contextmanager
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def constraint_name(error: IntegrityError) -> str | None:
+    diag = getattr(error.orig, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+
+def sqlstate(error: IntegrityError) -> str | None:
+    return getattr(error.orig, "pgcode", None)
+
+
+@contextmanager
+def translate_integrity_errors(db: Session, errors: dict[str, tuple[int, str]]):
+    # Keys are constraint/index names or SQLSTATEs; an exact constraint match wins.
+    # Anything unmapped is re-raised unchanged.
+    try:
+        yield
+    except IntegrityError as error:
+        db.rollback()
+        mapped = errors.get(constraint_name(error)) or errors.get(sqlstate(error))
+        if mapped is None:
+            raise
+        status_code, detail = mapped
+        raise HTTPException(status_code=status_code, detail=detail) from error
+
+
+def require_version(current: int, expected: int | None, resource: str) -> None:
+    if expected is not None and current != expected:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"{resource} has changed since version {expected}; it is now at version {current}.",
+        )
+
+
+@contextmanager
+def translate_stale_data(db: Session, resource: str):
+    try:
+        yield
+    except StaleDataError as error:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{resource} was modified by another request. Reload it and retry.",
+        ) from error
@@ -0,0 +1,194 @@
+# app/events.py
+#
+# Live order events for push clients (SSE / WebSocket). Services stage an event
+# with publish_after_commit; it reaches subscribers only once the transaction
+# commits. Each subscriber has a bounded queue; one that falls behind is sent
+# an overflow marker and disconnected, and reconnects to a fresh snapshot.
+#
+# EVENTS_BACKEND=memory delivers within the worker that made the change.
+# EVENTS_BACKEND=postgres sends events through NOTIFY, and every worker's
+# PostgresEventListener fans them out to its own subscribers.
+
+import asyncio
+import json
+import select
+import threading
+from collections import defaultdict
+from typing import Iterable
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event as sa_event, func
+from sqlalchemy import select as sa_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.settings import settings
+
+ORDER_EVENTS_CHANNEL = "order_events"
+
+
+def event_channels(event: dict) -> list[str]:
+    return [f"order:{event['order_id']}", f"user:{event['user_id']}"]
+
+
+class Subscription:
+    def __init__(self, broker: "EventBroker", channels: list[str], maxsize: int):
+        self.broker = broker
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    async def get(self) -> dict | None:
+        # None means the subscription was cut off (overflow or shutdown)
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+    def _offer(self, event: dict) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self._terminate()
+            self.overflowed = True
+            return False
+
+    def _terminate(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBroker:
+    # All subscriber state lives on the event loop; publish() can be called from any thread
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def close(self) -> None:
+        for subscription in {sub for subs in self._subscribers.values() for sub in subs}:
+            subscription._terminate()
+        self._subscribers.clear()
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, list(channels), self.queue_size)
+        for channel in subscription.channels:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({sub for subs in self._subscribers.values() for sub in subs})
+
+    def publish(self, event: dict) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(event)
+        else:
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict) -> None:
+        self.published += 1
+        # A subscriber to both an order and its user still gets the event once
+        targets = set()
+        for channel in event_channels(event):
+            targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            if subscription._offer(event):
+                self.delivered += 1
+            else:
+                self.overflows += 1
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker(settings.EVENTS_QUEUE_SIZE)
+
+
+def publish_after_commit(db: Session, event: dict) -> None:
+    event = jsonable_encoder(event)
+    if settings.EVENTS_BACKEND == "postgres":
+        # NOTIFY is transactional: listeners only see it if the commit succeeds
+        db.execute(sa_select(func.pg_notify(ORDER_EVENTS_CHANNEL, json.dumps(event))))
+    else:
+        db.info.setdefault("pending_events", []).append(event)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending_events(session: Session) -> None:
+    for event in session.info.pop("pending_events", ()):
+        broker.publish(event)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session: Session) -> None:
+    session.info.pop("pending_events", None)
+
+
+class PostgresEventListener:
+    # One LISTEN connection per worker process, feeding the local broker
+    def __init__(self, engine: Engine, event_broker: EventBroker, poll_interval: float = 1.0):
+        self.engine = engine
+        self.broker = event_broker
+        self.poll_interval = poll_interval
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-events-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as error:
+                # Reconnect after a short pause; events sent meanwhile are missed,
+                # which clients cover by re-reading the order when they reconnect
+                self.last_error = repr(error)
+                self._stop.wait(self.poll_interval)
+
+    def _listen(self) -> None:
+        raw_connection = self.engine.raw_connection()
+        raw_connection.detach()
+        connection = raw_connection.driver_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {ORDER_EVENTS_CHANNEL}")
+            while not self._stop.is_set():
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    self.broker.publish(json.loads(notification.payload))
+        finally:
+            raw_connection.close()
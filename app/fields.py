@@ -0,0 +1,51 @@
+# app/fields.py
+#
+# Sparse fieldsets: ?fields=name,price on read endpoints. Services load only the
+# requested columns, and the response is built from a trimmed copy of the
+# endpoint's schema (one per schema and field set, created on first use).
+
+from functools import lru_cache
+from typing import Any, Iterable
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, create_model
+
+# Always returned so clients can tell records apart
+ALWAYS_INCLUDED = ("id",)
+
+
+def parse_fields(fields: str | None, model: type[BaseModel]) -> tuple[str, ...] | None:
+    if fields is None:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(model.model_fields)}",
+        )
+    requested.update(name for name in ALWAYS_INCLUDED if name in model.model_fields)
+
+    # Schema order, so equal field sets share one cached model
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+@lru_cache(maxsize=256)
+def sparse_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    return create_model(
+        f"{model.__name__}_{'_'.join(fields)}",
+        __config__=model.model_config,
+        **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields},
+    )
+
+
+def sparse_rows(rows: Iterable[Any], model: type[BaseModel], fields: tuple[str, ...]) -> list[BaseModel]:
+    trimmed = sparse_model(model, fields)
+    return [trimmed.model_validate({name: getattr(row, name) for name in fields}) for row in rows]
+
+
+def sparse_response(content: Any) -> JSONResponse:
+    # Bypasses the route's response_model, which would expect the full schema
+    return JSONResponse(content=jsonable_encoder(content))
@@ -0,0 +1,87 @@
+# app/ids.py
+#
+# Primary key generators. uuid4 keys are random, so every insert lands on a
+# random page of the primary key index; uuid7 keys (RFC 9562) start with a
+# millisecond timestamp, so new rows append to the right edge of the index
+# like a sequence would. Both fit the existing UUID(as_uuid=True) columns and
+# can be mixed in one table.
+#
+# Which generator a table uses comes from ID_GENERATOR and ID_GENERATOR_OVERRIDES,
+# which is merged over TABLE_ID_GENERATORS.
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable
+from app.settings import settings
+
+_UUID7_COUNTER_MAX = 0xFFF
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+
+def uuid7(timestamp_ms: int | None = None) -> uuid.UUID:
+    global _uuid7_last
+    # 48 bits of Unix milliseconds, then 12 bits of counter that keep ids from
+    # one process increasing within a millisecond, then 62 random bits
+    with _uuid7_lock:
+        now_ms = time.time_ns() // 1_000_000 if timestamp_ms is None else timestamp_ms
+        last_ms, counter = _uuid7_last
+        if now_ms <= last_ms and timestamp_ms is None:
+            now_ms, counter = last_ms, counter + 1
+            if counter > _UUID7_COUNTER_MAX:
+                # Counter exhausted: borrow the next millisecond
+                now_ms, counter = last_ms + 1, 0
+        else:
+            counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        if timestamp_ms is None:
+            _uuid7_last = (now_ms, counter)
+
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (now_ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | random_bits
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(value: uuid.UUID) -> datetime | None:
+    # Creation time to the millisecond; None for ids that aren't uuid7 (e.g. older uuid4 rows)
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
+
+
+def uuid7_bounds(start: datetime, end: datetime) -> tuple[uuid.UUID, uuid.UUID]:
+    # Smallest and largest uuid7 created in [start, end), for range scans on the
+    # primary key: WHERE id >= low AND id <= high
+    def millis(moment: datetime) -> int:
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+
+    low = millis(start) << 80 | 0x7 << 76 | 0b10 << 62
+    high = (millis(end) - 1) << 80 | 0x7 << 76 | 0xFFF << 64 | 0b10 << 62 | ((1 << 62) - 1)
+    return uuid.UUID(int=low), uuid.UUID(int=high)
+
+
+ID_GENERATORS: dict[str, Callable[[], uuid.UUID]] = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+
+# Append-heavy tables default to uuid7 whatever ID_GENERATOR says
+TABLE_ID_GENERATORS = {
+    "orders": "uuid7",
+    "order_products": "uuid7",
+    "stock_reservations": "uuid7",
+    "outbox_events": "uuid7",
+    "order_tickets": "uuid7",
+}
+
+
+def id_generator(table: str) -> Callable[[], uuid.UUID]:
+    overrides = {**TABLE_ID_GENERATORS, **settings.ID_GENERATOR_OVERRIDES}
+    name = overrides.get(table, settings.ID_GENERATOR)
+    if name not in ID_GENERATORS:
+        raise ValueError(f"Unknown id generator {name!r} for table {table!r}; use one of {', '.join(ID_GENERATORS)}")
+    return ID_GENERATORS[name]
@@ -0,0 +1,53 @@
+# app/jobs/backfill_order_product_prices.py
+#
+# Fills unit_price and line_total on order lines written before they were
+# captured at checkout. The price paid was never stored for those rows, so the
+# product's current price is the best value available.
+#
+#   python -m app.jobs.backfill_order_product_prices [batch_size]
+
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+
+# Walks the lines in id order so rows that can't be filled (their product has
+# no price) are passed over instead of being picked again by every batch
+BACKFILL_BATCH = text("""
+    WITH batch AS (
+        SELECT id FROM order_products
+        WHERE unit_price IS NULL AND (CAST(:after AS uuid) IS NULL OR id > CAST(:after AS uuid))
+        ORDER BY id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), updated AS (
+        UPDATE order_products AS op
+        SET unit_price = p.price,
+            line_total = p.price * op.quantity
+        FROM batch, products AS p
+        WHERE op.id = batch.id AND p.id = op.product_id AND p.price IS NOT NULL
+        RETURNING op.id
+    )
+    SELECT (SELECT id FROM batch ORDER BY id DESC LIMIT 1) AS last_id, (SELECT count(*) FROM updated) AS updated
+""")
+
+
+def backfill_order_product_prices(db: Session, batch_size: int = 5000) -> int:
+    # Small committed batches keep locks and WAL bursts short on a live table
+    total, after = 0, None
+    while True:
+        last_id, updated = db.execute(BACKFILL_BATCH, {"after": after, "batch_size": batch_size}).one()
+        db.commit()
+        if last_id is None:
+            return total
+        total += updated
+        after = str(last_id)
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        total = backfill_order_product_prices(db, batch_size)
+    print(f"Backfilled {total} order lines in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,31 @@
+# app/jobs/inventory_flush.py
+#
+# Applies confirmed hot-product sales to products.stock and returns expired
+# reservations to their slices. Runs inside the API unless
+# INVENTORY_FLUSH_ENABLED=false, or standalone:
+#
+#   python -m app.jobs.inventory_flush
+
+import logging
+import time
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.services.inventory_service import InventoryService
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def flush_inventory(db: Session) -> dict:
+    return InventoryService(db).flush()
+
+
+if __name__ == "__main__":
+    while True:
+        # A failed run is retried on the next tick; expired reservations wait until then
+        try:
+            with SessionLocal() as db:
+                flush_inventory(db)
+        except Exception:
+            logger.exception("Inventory flush failed")
+        time.sleep(settings.INVENTORY_FLUSH_INTERVAL_SECONDS)
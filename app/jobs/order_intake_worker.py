@@ -0,0 +1,140 @@
+# app/jobs/order_intake_worker.py
+#
+# Places orders queued by POST /orders in async intake mode (ORDER_INTAKE_MODE=async).
+# Each thread takes ORDER_INTAKE_BATCH_SIZE tickets per transaction, so a burst
+# of checkouts reaches the database at a steady rate set by the thread count and
+# batch size instead of as one connection per request. Several processes can run
+# side by side; tickets are claimed with SKIP LOCKED.
+#
+#   python -m app.jobs.order_intake_worker
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.services.order_intake_service import OrderIntakeService
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OrderIntakeMetrics:
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_processing_lag_seconds = 0.0
+        self.max_processing_lag_seconds = 0.0
+        self._recent: deque[tuple[float, int]] = deque()
+        self._lock = threading.Lock()
+
+    def record_batch(self, completed: int, failed: int, lags: list[float]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.completed += completed
+            self.failed += failed
+            if lags:
+                self.last_processing_lag_seconds = max(lags)
+                self.max_processing_lag_seconds = max(self.max_processing_lag_seconds, *lags)
+            self._recent.append((now, completed + failed))
+            while self._recent and self._recent[0][0] < now - self.window_seconds:
+                self._recent.popleft()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sum(count for _, count in self._recent)
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "throughput_per_second": recent / self.window_seconds,
+                "last_processing_lag_seconds": self.last_processing_lag_seconds,
+                "max_processing_lag_seconds": self.max_processing_lag_seconds,
+            }
+
+
+class OrderIntakeWorker:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        threads: int = settings.ORDER_INTAKE_WORKER_THREADS,
+        batch_size: int = settings.ORDER_INTAKE_BATCH_SIZE,
+        poll_interval: float = settings.ORDER_INTAKE_POLL_INTERVAL_SECONDS,
+        max_attempts: int = settings.ORDER_INTAKE_MAX_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.metrics = OrderIntakeMetrics()
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._run, name=f"order-intake-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            db = self.session_factory()
+            try:
+                claimed = self.run_once(db)
+            except Exception as exc:
+                logger.exception("order intake batch failed")
+                db.rollback()
+                self.last_error = str(exc)
+                claimed = 0
+            finally:
+                db.close()
+
+            # A full batch means there is probably more waiting, so go again straight away
+            if claimed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self, db: Session) -> int:
+        result = OrderIntakeService(db).process_batch(self.batch_size, self.max_attempts)
+        if result["claimed"]:
+            self.metrics.record_batch(result["completed"], result["failed"], result["lags"])
+        return result["claimed"]
+
+
+order_intake_worker: OrderIntakeWorker | None = None
+
+
+def start_order_intake_worker() -> OrderIntakeWorker:
+    global order_intake_worker
+    order_intake_worker = OrderIntakeWorker()
+    order_intake_worker.start()
+    return order_intake_worker
+
+
+def stop_order_intake_worker() -> None:
+    global order_intake_worker
+    if order_intake_worker is not None:
+        order_intake_worker.stop()
+        order_intake_worker = None
+
+
+if __name__ == "__main__":
+    worker = start_order_intake_worker()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stop_order_intake_worker()
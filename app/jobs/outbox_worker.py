@@ -0,0 +1,245 @@
+# app/jobs/outbox_worker.py
+#
+# Drains the outbox_events table in batches. Delivery is at-least-once: a
+# handler may see the same event again after a crash or a failed sibling
+# handler, so handlers must be idempotent (use event.id as the dedupe key).
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Callable
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.models import OutboxEvent
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[OutboxEvent], None]
+
+MAX_BACKOFF_SECONDS = 300
+
+
+class OutboxHandlerRegistry:
+    def __init__(self):
+        self._handlers: dict[str, list[EventHandler]] = defaultdict(list)
+
+    def register(self, event_type: str, handler: EventHandler) -> None:
+        # Use "*" to receive every event type
+        self._handlers[event_type].append(handler)
+
+    def handlers_for(self, event_type: str) -> list[EventHandler]:
+        return self._handlers.get(event_type, []) + self._handlers.get("*", [])
+
+
+registry = OutboxHandlerRegistry()
+
+
+def _event_to_dict(event: OutboxEvent) -> dict:
+    return {
+        "id": str(event.id),
+        "event_type": event.event_type,
+        "aggregate_id": str(event.aggregate_id),
+        "payload": event.payload,
+        "created_at": event.created_at.isoformat(),
+        "attempts": event.attempts,
+    }
+
+
+class InMemorySink:
+    def __init__(self):
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: OutboxEvent) -> None:
+        with self._lock:
+            self.events.append(_event_to_dict(event))
+
+
+class FileSink:
+    # Appends one JSON document per line, handy for local runs without a broker
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event: OutboxEvent) -> None:
+        line = json.dumps(_event_to_dict(event))
+        with self._lock, open(self.path, "a", encoding="utf-8") as sink:
+            sink.write(line + "\n")
+
+
+class OutboxMetrics:
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_delivery_lag_seconds = 0.0
+        self.max_delivery_lag_seconds = 0.0
+        self._recent: deque[tuple[float, int]] = deque()
+        self._lock = threading.Lock()
+
+    def record_batch(self, processed: int, retried: int, failed: int, lags: list[float]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.processed += processed
+            self.retried += retried
+            self.failed += failed
+            if lags:
+                self.last_delivery_lag_seconds = max(lags)
+                self.max_delivery_lag_seconds = max(self.max_delivery_lag_seconds, *lags)
+            self._recent.append((now, processed))
+            while self._recent and self._recent[0][0] < now - self.window_seconds:
+                self._recent.popleft()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sum(count for _, count in self._recent)
+            return {
+                "processed": self.processed,
+                "retried": self.retried,
+                "failed": self.failed,
+                "batches": self.batches,
+                "throughput_per_second": recent / self.window_seconds,
+                "last_delivery_lag_seconds": self.last_delivery_lag_seconds,
+                "max_delivery_lag_seconds": self.max_delivery_lag_seconds,
+            }
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        handlers: OutboxHandlerRegistry = registry,
+        threads: int = settings.OUTBOX_WORKER_THREADS,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        poll_interval: float = settings.OUTBOX_POLL_INTERVAL_SECONDS,
+        max_attempts: int = settings.OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.handlers = handlers
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.metrics = OutboxMetrics()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._run, name=f"outbox-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            db = self.session_factory()
+            try:
+                delivered = self.run_once(db)
+            except Exception:
+                logger.exception("outbox batch failed")
+                db.rollback()
+                delivered = 0
+            finally:
+                db.close()
+
+            # A full batch means there is probably more waiting, so go again straight away
+            if delivered < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self, db: Session) -> int:
+        now = datetime.utcnow()
+
+        # SKIP LOCKED lets several workers (threads or processes) share the table
+        # without handing the same event to two of them at once.
+        events = (
+            db.query(OutboxEvent)
+            .filter(
+                OutboxEvent.processed_at.is_(None),
+                OutboxEvent.failed_at.is_(None),
+                OutboxEvent.available_at <= now,
+            )
+            .order_by(OutboxEvent.available_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not events:
+            db.commit()
+            return 0
+
+        processed, retried, failed, lags = 0, 0, 0, []
+        for event in events:
+            try:
+                for handler in self.handlers.handlers_for(event.event_type):
+                    handler(event)
+            except Exception as exc:
+                event.attempts += 1
+                event.last_error = str(exc)[:1000]
+                if event.attempts >= self.max_attempts:
+                    event.failed_at = now
+                    failed += 1
+                else:
+                    event.available_at = now + self._backoff(event.attempts)
+                    retried += 1
+            else:
+                event.processed_at = datetime.utcnow()
+                lags.append((event.processed_at - event.created_at).total_seconds())
+                processed += 1
+
+        db.commit()
+        self.metrics.record_batch(processed, retried, failed, lags)
+        return len(events)
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        # Exponential backoff with jitter so retries of a broken handler spread out
+        delay = min(2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+outbox_worker: OutboxWorker | None = None
+# Paths that already have a FileSink on the registry, so restarting the worker
+# doesn't write every event to the same file twice
+_file_sink_paths: set[str] = set()
+
+
+def start_outbox_worker() -> OutboxWorker:
+    global outbox_worker
+    if settings.OUTBOX_SINK_PATH and settings.OUTBOX_SINK_PATH not in _file_sink_paths:
+        registry.register("*", FileSink(settings.OUTBOX_SINK_PATH))
+        _file_sink_paths.add(settings.OUTBOX_SINK_PATH)
+    outbox_worker = OutboxWorker()
+    outbox_worker.start()
+    return outbox_worker
+
+
+def stop_outbox_worker() -> None:
+    global outbox_worker
+    if outbox_worker is not None:
+        outbox_worker.stop()
+        outbox_worker = None
+
+
+if __name__ == "__main__":
+    # Run the worker pool as its own process: python -m app.jobs.outbox_worker
+    worker = start_outbox_worker()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stop_outbox_worker()
@@ -0,0 +1,284 @@
+# app/jobs/partitions.py
+#
+# Monthly range partitioning of orders and order_products by created_at.
+#
+#   python -m app.jobs.partitions convert   # one-off, run in a maintenance window
+#   python -m app.jobs.partitions maintain  # create the upcoming monthly partitions
+#   python -m app.jobs.partitions archive   # detach closed months into the archive
+#
+# A partitioned table's primary key must include the partition key, so both
+# tables are keyed on (id, created_at) and order lines reference their order by
+# (order_id, created_at). Order lines carry the created_at of their order, so
+# both halves of an order always sit in the same month and are archived together.
+
+import gzip
+import os
+import re
+import sys
+from datetime import date, datetime
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.settings import settings
+
+PARTITIONED_TABLES = ("orders", "order_products")
+TERMINAL_STATUSES = ("Completed", "Canceled")
+ARCHIVE_SCHEMA = "archive"
+
+PARTITIONED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_status_id ON orders (status_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_products_order_id ON order_products (order_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_products_product_id ON order_products (product_id)",
+]
+
+PARTITIONED_FOREIGN_KEYS = [
+    "ALTER TABLE orders ADD FOREIGN KEY (user_id) REFERENCES users (id)",
+    "ALTER TABLE orders ADD FOREIGN KEY (status_id) REFERENCES statuses (id) ON DELETE RESTRICT",
+    "ALTER TABLE order_products ADD FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE RESTRICT",
+    "ALTER TABLE order_products ADD FOREIGN KEY (order_id, created_at) REFERENCES orders (id, created_at)",
+]
+
+
+def _month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    return db.execute(
+        text("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = :table AND pg_table_is_visible(c.oid)
+            )
+        """),
+        {"table": table},
+    ).scalar()
+
+
+def _table_exists(db: Session, name: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def _create_partition(db: Session, parent: str, table: str, month: date) -> bool:
+    partition = _partition_name(table, month)
+    if _table_exists(db, partition):
+        return False
+
+    bounds = {"start": month, "end": _add_months(month, 1)}
+
+    # Rows that fell into the default partition before this month existed have
+    # to move out first, or Postgres refuses to create the overlapping partition.
+    default_partition = f"{table}_default"
+    has_default = _table_exists(db, default_partition)
+    if has_default:
+        db.execute(text(f'CREATE TEMP TABLE moved_rows (LIKE "{parent}") ON COMMIT DROP'))
+        db.execute(
+            text(f"""
+                WITH moved AS (
+                    DELETE FROM "{default_partition}"
+                    WHERE created_at >= :start AND created_at < :end
+                    RETURNING *
+                )
+                INSERT INTO moved_rows SELECT * FROM moved
+            """),
+            bounds,
+        )
+
+    db.execute(text(
+        f'CREATE TABLE "{partition}" PARTITION OF "{parent}" '
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+
+    if has_default:
+        db.execute(text(f'INSERT INTO "{parent}" SELECT * FROM moved_rows'))
+        db.execute(text("DROP TABLE moved_rows"))
+    return True
+
+
+def convert_to_partitioned(db: Session, months_ahead: int = settings.PARTITION_MONTHS_AHEAD) -> None:
+    if is_partitioned(db, "orders"):
+        return
+
+    db.execute(text("LOCK TABLE orders, order_products IN ACCESS EXCLUSIVE MODE"))
+
+    # Align line timestamps with their order so both land in the same month
+    db.execute(text("""
+        UPDATE order_products AS op SET created_at = o.created_at
+        FROM orders AS o
+        WHERE o.id = op.order_id AND op.created_at IS DISTINCT FROM o.created_at
+    """))
+
+    first_order_at = db.execute(text("SELECT min(created_at) FROM orders")).scalar() or datetime.utcnow()
+    first_month = _month_start(first_order_at)
+    last_month = _add_months(_month_start(datetime.utcnow()), months_ahead)
+
+    for table in PARTITIONED_TABLES:
+        parent = f"{table}_partitioned"
+        db.execute(text(f'CREATE TABLE "{parent}" (LIKE "{table}" INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'))
+        db.execute(text(f'ALTER TABLE "{parent}" ADD PRIMARY KEY (id, created_at)'))
+        db.execute(text(f'CREATE TABLE "{table}_default" PARTITION OF "{parent}" DEFAULT'))
+
+        month = first_month
+        while month <= last_month:
+            _create_partition(db, parent, table, month)
+            month = _add_months(month, 1)
+
+        db.execute(text(f'INSERT INTO "{parent}" SELECT * FROM "{table}"'))
+
+    # order_products references orders, so it goes first
+    for table in reversed(PARTITIONED_TABLES):
+        db.execute(text(f'DROP TABLE "{table}"'))
+    for table in PARTITIONED_TABLES:
+        db.execute(text(f'ALTER TABLE "{table}_partitioned" RENAME TO "{table}"'))
+
+    for statement in PARTITIONED_FOREIGN_KEYS + PARTITIONED_INDEXES:
+        db.execute(text(statement))
+
+    db.commit()
+
+
+def create_future_partitions(db: Session, months_ahead: int = settings.PARTITION_MONTHS_AHEAD) -> list[str]:
+    if not all(is_partitioned(db, table) for table in PARTITIONED_TABLES):
+        return []
+
+    created = []
+    this_month = _month_start(datetime.utcnow())
+    for offset in range(months_ahead + 1):
+        month = _add_months(this_month, offset)
+        for table in PARTITIONED_TABLES:
+            if _create_partition(db, table, table, month):
+                created.append(_partition_name(table, month))
+
+    db.commit()
+    return created
+
+
+def _monthly_partitions(db: Session, table: str) -> list[date]:
+    names = db.execute(
+        text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :table AND pg_table_is_visible(p.oid)
+        """),
+        {"table": table},
+    ).scalars()
+
+    months = []
+    for name in names:
+        match = re.fullmatch(rf"{table}_p(\d{{4}})_(\d{{2}})", name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _export_ndjson(db: Session, partition: str, archive_dir: str) -> str:
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{partition}.ndjson.gz")
+
+    rows = db.execute(
+        text(f'SELECT row_to_json(t)::text FROM "{partition}" AS t'),
+        execution_options={"stream_results": True, "yield_per": 10000},
+    ).scalars()
+    with gzip.open(path, "wt", encoding="utf-8") as archive:
+        for row in rows:
+            archive.write(row + "\n")
+    return path
+
+
+def _drop_order_foreign_keys(db: Session, partition: str) -> None:
+    # A detached order_products partition keeps its foreign key to orders as a
+    # constraint of its own, which would stop the orders month from detaching
+    constraints = db.execute(
+        text("""
+            SELECT conname FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = to_regclass(:partition) AND confrelid = to_regclass('orders')
+        """),
+        {"partition": partition},
+    ).scalars().all()
+    for constraint in constraints:
+        db.execute(text(f'ALTER TABLE "{partition}" DROP CONSTRAINT "{constraint}"'))
+
+
+def archive_partitions(
+    db: Session,
+    older_than_months: int = settings.ARCHIVE_AFTER_MONTHS,
+    mode: str = settings.ARCHIVE_MODE,
+    archive_dir: str = settings.ARCHIVE_DIR,
+) -> list[str]:
+    if not all(is_partitioned(db, table) for table in PARTITIONED_TABLES):
+        return []
+
+    cutoff = _add_months(_month_start(datetime.utcnow()), -older_than_months)
+
+    archived = []
+    for month in _monthly_partitions(db, "orders"):
+        if _add_months(month, 1) > cutoff:
+            break
+
+        # A month is only archived once every order in it is closed
+        has_open_orders = text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM "{_partition_name('orders', month)}"
+                WHERE status_id NOT IN (SELECT id FROM statuses WHERE name IN :names)
+            )
+        """).bindparams(bindparam("names", expanding=True))
+        if db.execute(has_open_orders, {"names": list(TERMINAL_STATUSES)}).scalar():
+            continue
+
+        partitions = [_partition_name(table, month) for table in reversed(PARTITIONED_TABLES)]
+        for table, partition in zip(reversed(PARTITIONED_TABLES), partitions):
+            if _table_exists(db, partition):
+                db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"'))
+                _drop_order_foreign_keys(db, partition)
+
+        for partition in partitions:
+            if not _table_exists(db, partition):
+                continue
+            if mode == "ndjson":
+                _export_ndjson(db, partition, archive_dir)
+                db.execute(text(f'DROP TABLE "{partition}"'))
+            else:
+                db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"'))
+                db.execute(text(f'ALTER TABLE "{partition}" SET SCHEMA "{ARCHIVE_SCHEMA}"'))
+                if settings.ARCHIVE_TABLESPACE:
+                    db.execute(text(
+                        f'ALTER TABLE "{ARCHIVE_SCHEMA}"."{partition}" SET TABLESPACE "{settings.ARCHIVE_TABLESPACE}"'
+                    ))
+            archived.append(partition)
+
+        # One commit per month keeps the parent tables' exclusive lock short
+        db.commit()
+
+    return archived
+
+
+def maintain_partitions(db: Session) -> None:
+    create_future_partitions(db)
+    if settings.ARCHIVE_ENABLED:
+        archive_partitions(db)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "maintain"
+    with SessionLocal() as db:
+        if command == "convert":
+            convert_to_partitioned(db)
+            print("orders and order_products are now partitioned by created_at")
+        elif command == "maintain":
+            print("Created:", ", ".join(create_future_partitions(db)) or "nothing")
+        elif command == "archive":
+            print("Archived:", ", ".join(archive_partitions(db)) or "nothing")
+        else:
+            sys.exit(f"Unknown command {command!r}, expected convert, maintain or archive")
@@ -0,0 +1,45 @@
+# app/jobs/provision_users.py
+#
+# Creates accounts from a file the way POST /users/bulk does: a CSV with
+# username, email and password columns, or one JSON user per line (.ndjson,
+# .jsonl, or "-" for stdin). Writes one JSON outcome per row to stdout and the
+# summary to stderr.
+#
+#   python -m app.jobs.provision_users users.csv > outcomes.ndjson
+
+import csv
+import json
+import sys
+from typing import Iterator, TextIO
+from app.connection_to_db import SessionLocal
+from app.services.user_provisioning_service import UserProvisioningService, shutdown_hash_pool
+
+
+def read_records(source: TextIO, is_csv: bool) -> Iterator[tuple[int, object]]:
+    if is_csv:
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(source, start=1):
+        if text.strip():
+            yield line, text
+
+
+def provision_users(path: str) -> dict:
+    source = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        with SessionLocal() as db:
+            service = UserProvisioningService(db)
+            for outcome in service.provision(read_records(source, path.lower().endswith(".csv"))):
+                print(outcome.json(exclude_none=True))
+            return service.summary().dict()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        shutdown_hash_pool()
+
+
+if __name__ == "__main__":
+    summary = provision_users(sys.argv[1] if len(sys.argv) > 1 else "-")
+    print(json.dumps(summary), file=sys.stderr)
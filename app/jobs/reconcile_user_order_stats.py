@@ -0,0 +1,21 @@
+# app/jobs/reconcile_user_order_stats.py
+#
+# Recomputes user_order_stats from orders, one batch of users per transaction.
+# Run it once after upgrading to fill the table, then whenever drift is
+# suspected (or daily with USER_STATS_RECONCILE_ENABLED=true):
+#
+#   python -m app.jobs.reconcile_user_order_stats
+
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.services.order_stats_service import OrderStatsService
+from app.settings import settings
+
+
+def reconcile_user_order_stats(db: Session) -> int:
+    return OrderStatsService(db).reconcile(settings.USER_STATS_RECONCILE_BATCH_SIZE)
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        print(f"Rebuilt order stats for {reconcile_user_order_stats(db)} users")
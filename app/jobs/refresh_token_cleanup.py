@@ -0,0 +1,19 @@
+# app/jobs/refresh_token_cleanup.py
+#
+# Deletes expired and long-revoked refresh tokens. Runs hourly inside the API,
+# or once from the command line:
+#
+#   python -m app.jobs.refresh_token_cleanup
+
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+from app.services.token_service import TokenService
+
+
+def purge_refresh_tokens(db: Session) -> int:
+    return TokenService(db).purge_expired()
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        print(f"Deleted {purge_refresh_tokens(db)} refresh tokens")
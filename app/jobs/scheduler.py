@@ -0,0 +1,58 @@
+import logging
+import threading
+from typing import Any, Callable
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    # Runs job(db) on a daemon thread every interval_seconds, each run in its own session
+    def __init__(
+        self,
+        name: str,
+        interval_seconds: float,
+        job: Callable[[Session], Any],
+        session_factory: Callable[[], Session] = SessionLocal,
+        run_immediately: bool = True,
+    ):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.job = job
+        self.session_factory = session_factory
+        self.run_immediately = run_immediately
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Any:
+        db = self.session_factory()
+        try:
+            result = self.job(db)
+            self.last_error = None
+            return result
+        except Exception as exc:
+            logger.exception("periodic job failed", extra={"job": self.name})
+            db.rollback()
+            self.last_error = str(exc)
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        if not self.run_immediately:
+            self._stop.wait(self.interval_seconds)
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
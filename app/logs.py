@@ -0,0 +1,239 @@
+# app/logs.py
+#
+# JSON logs without blocking the request path. Loggers only put records on a
+# bounded in-memory queue (QueueHandler); a QueueListener thread formats and
+# writes them. When the queue is full the record is dropped and counted rather
+# than making the caller wait. DEBUG records are sampled at LOG_DEBUG_SAMPLE_RATE.
+# Drops and sampled-out records are exported as metrics, and a WARNING is
+# written every LOG_DROP_REPORT_SECONDS (and at shutdown) while records are lost.
+#
+# Every record carries the request id, user id and route of the request it was
+# logged from (see RequestContextMiddleware and bind_request_context).
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from uuid import uuid4
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.metrics import LOG_RECORDS_DROPPED, LOG_RECORDS_SAMPLED_OUT
+from app.settings import settings
+
+# A dict per request, so values bound later (the user, once authenticated) are
+# seen everywhere the request runs, including threadpool copies of the context
+_request_context: ContextVar[dict | None] = ContextVar("request_context", default=None)
+
+CONTEXT_FIELDS = ("request_id", "user_id", "route")
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def bind_request_context(**values) -> None:
+    context = _request_context.get()
+    if context is not None:
+        context.update(values)
+
+
+class ContextFilter(logging.Filter):
+    # Runs on the logging thread, before the record is queued
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get() or {}
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, debug_rate: float):
+        super().__init__()
+        self.debug_rate = debug_rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or random.random() < self.debug_rate:
+            return True
+        self.sampled_out += 1
+        LOG_RECORDS_SAMPLED_OUT.inc()
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.enqueued = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default prepare() formats the message here, on the caller's thread.
+        # Only resolve the arguments and the traceback, and leave JSON to the listener.
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                document[field] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in CONTEXT_FIELDS:
+                document[key] = value
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return json.dumps(document, default=str)
+
+
+class LogPipeline:
+    def __init__(self, stream=None, level: str = "INFO", queue_size: int = 10000, debug_sample_rate: float = 0.01):
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.sampler = SamplingFilter(debug_sample_rate)
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(ContextFilter())
+
+        self.output = logging.StreamHandler(stream or sys.stdout)
+        self.output.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, self.output, respect_handler_level=False)
+        self.level = logging.getLevelName(level.upper())
+        self.reported_dropped = 0
+
+    def start(self) -> None:
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+
+    def stop(self) -> None:
+        # Writes out whatever is still queued
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        self.report_drops()
+
+    def report_drops(self) -> None:
+        # Written straight to the output: the queue may be the thing that is full
+        dropped = self.handler.dropped
+        if dropped <= self.reported_dropped:
+            return
+        self.output.handle(logging.makeLogRecord({
+            "name": __name__,
+            "levelno": logging.WARNING,
+            "levelname": "WARNING",
+            "msg": "log records dropped, the log queue was full",
+            "dropped": dropped - self.reported_dropped,
+            "dropped_total": dropped,
+            "queue_size": self.queue.maxsize,
+        }))
+        self.reported_dropped = dropped
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+            "queue_depth": self.queue.qsize(),
+        }
+
+
+_pipeline: LogPipeline | None = None
+_pipeline_lock = threading.Lock()
+
+
+def configure_logging() -> LogPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline(
+                level=settings.LOG_LEVEL,
+                queue_size=settings.LOG_QUEUE_SIZE,
+                debug_sample_rate=settings.LOG_DEBUG_SAMPLE_RATE,
+            )
+            _pipeline.start()
+        return _pipeline
+
+
+def report_log_drops() -> None:
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.report_drops()
+
+
+def shutdown_logging() -> None:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
+
+
+access_logger = logging.getLogger("app.access")
+
+
+class RequestContextMiddleware:
+    # Binds a request id (the client's X-Request-ID, or a new one) and the route
+    # for the duration of each request, echoes the id back, and logs one access line
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid4().hex
+        context = {"request_id": request_id, "user_id": None, "route": scope["path"]}
+        token = _request_context.set(context)
+        started = time.perf_counter()
+        response_status = 500
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # The matched route template is only known once routing has run
+            route = scope.get("route")
+            if route is not None:
+                context["route"] = getattr(route, "path", context["route"])
+            access_logger.info(
+                "request",
+                extra={
+                    "method": scope.get("method", "WEBSOCKET"),
+                    "status": response_status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
+            _request_context.reset(token)
@@ -1,11 +1,105 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.main import api_router
+from app.api.middleware import CompressionMiddleware
 from app.connection_to_db import engine
+from app.events import PostgresEventListener, broker
+from app.jobs.outbox_worker import start_outbox_worker, stop_outbox_worker
+from app.jobs.inventory_flush import flush_inventory
+from app.jobs.order_intake_worker import start_order_intake_worker, stop_order_intake_worker
+from app.jobs.partitions import maintain_partitions
+from app.jobs.reconcile_user_order_stats import reconcile_user_order_stats
+from app.jobs.refresh_token_cleanup import purge_refresh_tokens
+from app.jobs.scheduler import PeriodicJob
+from app.logs import RequestContextMiddleware, configure_logging, report_log_drops, shutdown_logging
+from app.metrics import METRICS_ACTIVE, MetricsMiddleware, instrument_engine, metrics_endpoint, shutdown_metrics
+from app.migrations import run_migrations
+from app.ranking import resync_sales_ranking
+from app.services.user_provisioning_service import shutdown_hash_pool
+from app.settings import settings
+from app.suggest import sync_product_suggest
+from app.tracing import TRACING_ACTIVE, TracingMiddleware, setup_tracing, shutdown_tracing
 from . import models
 
 # Create the tables
 models.Base.metadata.create_all(engine)
+run_migrations(engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    setup_tracing(engine)
+    instrument_engine(engine)
+
+    # Background workers run inside the API process only when enabled;
+    # otherwise run them separately, e.g. python -m app.jobs.outbox_worker
+    if settings.OUTBOX_WORKER_ENABLED:
+        start_outbox_worker()
+    if settings.ORDER_INTAKE_WORKER_ENABLED:
+        start_order_intake_worker()
+
+    # Live order events for /events subscribers
+    broker.start(asyncio.get_running_loop())
+    event_listener = None
+    if settings.EVENTS_BACKEND == "postgres":
+        event_listener = PostgresEventListener(engine, broker)
+        event_listener.start()
+
+    periodic_jobs = [PeriodicJob("log-drop-report", settings.LOG_DROP_REPORT_SECONDS, lambda db: report_log_drops())]
+    if settings.INVENTORY_FLUSH_ENABLED:
+        periodic_jobs.append(PeriodicJob("inventory-flush", settings.INVENTORY_FLUSH_INTERVAL_SECONDS, flush_inventory))
+    periodic_jobs.append(PeriodicJob("refresh-token-cleanup", 60 * 60, purge_refresh_tokens))
+    if settings.PARTITION_MAINTENANCE_ENABLED:
+        periodic_jobs.append(PeriodicJob("partition-maintenance", 24 * 60 * 60, maintain_partitions))
+    if settings.RANKING_ENABLED:
+        periodic_jobs.append(PeriodicJob("sales-ranking-resync", settings.RANKING_RESYNC_SECONDS, resync_sales_ranking))
+    if settings.SUGGEST_ENABLED:
+        periodic_jobs.append(PeriodicJob("product-suggest-sync", settings.SUGGEST_SYNC_SECONDS, sync_product_suggest))
+    if settings.USER_STATS_RECONCILE_ENABLED:
+        periodic_jobs.append(PeriodicJob(
+            "user-stats-reconcile",
+            settings.USER_STATS_RECONCILE_INTERVAL_SECONDS,
+            reconcile_user_order_stats,
+            run_immediately=False,
+        ))
+    for job in periodic_jobs:
+        job.start()
+
+    yield
+
+    for job in periodic_jobs:
+        job.stop()
+    stop_outbox_worker()
+    stop_order_intake_worker()
+    if event_listener is not None:
+        event_listener.stop()
+    broker.close()
+    shutdown_hash_pool()
+    shutdown_tracing()
+    shutdown_metrics()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+if TRACING_ACTIVE:
+    app.add_middleware(TracingMiddleware)
+
+if METRICS_ACTIVE:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+# Outermost, so the access log covers compression too
+app.add_middleware(RequestContextMiddleware)
 
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
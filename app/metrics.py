@@ -0,0 +1,188 @@
+# app/metrics.py
+#
+# Prometheus metrics at /metrics, when METRICS_ENABLED=true and prometheus-client
+# is installed; otherwise every metric here is a no-op.
+#
+# Per route template: request count by status and a latency histogram (rate,
+# errors, duration), plus SQL statements per request. Also connection pool
+# usage, bcrypt work running and queued, order/login counters, and log records
+# lost to a full log queue or to DEBUG sampling.
+#
+# With several uvicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty
+# directory (cleared on each deploy) before starting them. Each process then
+# writes its samples to its own memory-mapped files, and a scrape of any worker
+# sums them all.
+#
+# Recording on the request path is an increment of a per-request list for each
+# SQL statement and, once the response is sent, one histogram observation and
+# two counter increments on label children looked up from a dict.
+
+import os
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.settings import settings
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional dependency, metrics stay off without it
+    prometheus_client = None
+
+METRICS_ACTIVE = settings.METRICS_ENABLED and prometheus_client is not None
+MULTIPROCESS = METRICS_ACTIVE and bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _NoopMetric:
+    def labels(self, *values, **labels):
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def track_inprogress(self):
+        return nullcontext()
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if not METRICS_ACTIVE:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+REQUESTS = _metric("Counter", "http_requests", "HTTP requests by route template and status", ("method", "route", "status"))
+REQUEST_DURATION = _metric(
+    "Histogram", "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+STATEMENTS_PER_REQUEST = _metric(
+    "Histogram", "http_request_sql_statements", "SQL statements executed per request", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+# Gauges are summed over live processes in multi-process mode
+POOL_SIZE = _metric("Gauge", "db_pool_size", "Configured connection pool size", multiprocess_mode="livesum")
+POOL_OPEN = _metric("Gauge", "db_pool_connections_open", "Open database connections", multiprocess_mode="livesum")
+POOL_CHECKED_OUT = _metric("Gauge", "db_pool_connections_checked_out", "Connections in use", multiprocess_mode="livesum")
+BCRYPT_IN_PROGRESS = _metric(
+    "Gauge", "bcrypt_operations_in_progress", "Password hashes and checks running", multiprocess_mode="livesum",
+)
+BCRYPT_WAITING = _metric(
+    "Gauge", "bcrypt_operations_waiting", "Login password checks queued for a bcrypt thread", multiprocess_mode="livesum",
+)
+
+ORDERS_CREATED = _metric("Counter", "orders_created", "Orders placed")
+ORDERS_CANCELED = _metric("Counter", "orders_canceled", "Orders canceled, by the customer or as stale", ("reason",))
+STOCK_OUTS = _metric("Counter", "order_stock_outs", "Checkouts rejected for insufficient stock")
+LOGIN_FAILURES = _metric("Counter", "login_failures", "Rejected username/password logins")
+LOG_RECORDS_DROPPED = _metric("Counter", "log_records_dropped", "Log records dropped because the log queue was full")
+LOG_RECORDS_SAMPLED_OUT = _metric("Counter", "log_records_sampled_out", "DEBUG log records left out by sampling")
+
+# Statements run by the current request, shared with threadpool copies of the context
+_statements: ContextVar[list | None] = ContextVar("sql_statements", default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not METRICS_ACTIVE:
+        return
+    if hasattr(engine.pool, "size"):
+        POOL_SIZE.set(engine.pool.size())
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter = _statements.get()
+        if counter is not None:
+            counter[0] += 1
+
+    @event.listens_for(engine, "connect")
+    def _connected(dbapi_connection, connection_record):
+        POOL_OPEN.inc()
+
+    @event.listens_for(engine, "close")
+    def _closed(dbapi_connection, connection_record):
+        POOL_OPEN.dec()
+
+    @event.listens_for(engine, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checked_in(dbapi_connection, connection_record):
+        POOL_CHECKED_OUT.dec()
+
+
+def shutdown_metrics() -> None:
+    # Drops this process's live gauges from the multi-process totals
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if MULTIPROCESS:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), media_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Label children by (method, route[, status]), so recording skips labels()
+        self._request_children: dict[tuple, tuple] = {}
+        self._status_children: dict[tuple, object] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _statements.set(counter)
+        started = time.perf_counter()
+        response_status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _statements.reset(token)
+            self._record(scope, response_status, time.perf_counter() - started, counter[0])
+
+    def _record(self, scope: Scope, response_status: int, duration: float, statements: int) -> None:
+        # Unmatched paths share one label, so scanners can't blow up the series count
+        route = scope.get("route")
+        key = (scope["method"], getattr(route, "path", "unmatched"))
+        children = self._request_children.get(key)
+        if children is None:
+            children = self._request_children.setdefault(
+                key, (REQUEST_DURATION.labels(*key), STATEMENTS_PER_REQUEST.labels(*key))
+            )
+        children[0].observe(duration)
+        children[1].observe(statements)
+
+        status_key = (*key, response_status)
+        requests = self._status_children.get(status_key)
+        if requests is None:
+            requests = self._status_children.setdefault(status_key, REQUESTS.labels(*key, str(response_status)))
+        requests.inc()
@@ -0,0 +1,110 @@
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# create_all only creates missing tables, so changes to tables that already
+# exist are listed here as idempotent statements and applied in order at startup.
+MIGRATIONS = [
+    # Price paid per order line, captured at checkout
+    "ALTER TABLE order_products ADD COLUMN IF NOT EXISTS unit_price NUMERIC(10, 2)",
+    "ALTER TABLE order_products ADD COLUMN IF NOT EXISTS line_total NUMERIC(10, 2)",
+    # Foreign key lookups on orders and order_products
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_status_id ON orders (status_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_products_order_id ON order_products (order_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_products_product_id ON order_products (product_id)",
+    # Admin user search: email prefix, username substring and keyset pagination
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_lower_pattern ON users (lower(email) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_id ON users (username, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_id ON users (email, id)",
+    # The primary keys already index id; these duplicates only slowed down inserts
+    "DROP INDEX IF EXISTS ix_users_id",
+    "DROP INDEX IF EXISTS ix_statuses_id",
+    "DROP INDEX IF EXISTS ix_products_id",
+    "DROP INDEX IF EXISTS ix_orders_id",
+    "DROP INDEX IF EXISTS ix_order_products_id",
+    # Version counters for optimistic locking (exposed as ETag / If-Match)
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    # Catalog version behind the search facet cache. Stock updates from checkout
+    # don't change facets, so they don't bump it.
+    "INSERT INTO catalog_version (id, version) VALUES (true, 1) ON CONFLICT DO NOTHING",
+    """
+    CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE catalog_version SET version = version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'products_catalog_version') THEN
+            CREATE TRIGGER products_catalog_version
+                AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF name, price, "isAvailable" ON products
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+        END IF;
+    END
+    $$
+    """,
+    # Retry delay for order tickets that failed unexpectedly
+    "ALTER TABLE order_tickets ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP",
+    # Separate version for the product name index, so repricing doesn't rebuild it
+    "ALTER TABLE catalog_version ADD COLUMN IF NOT EXISTS names_version BIGINT NOT NULL DEFAULT 1",
+    """
+    CREATE OR REPLACE FUNCTION bump_product_names_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE catalog_version SET names_version = names_version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'products_names_version') THEN
+            CREATE TRIGGER products_names_version
+                AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF name ON products
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_product_names_version();
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+# Case-insensitive unique names, enforced by the database instead of ilike pre-checks.
+# Names that differ only in case may already exist, so each index is built only once
+# its table has none left (the duplicates are logged until they are renamed).
+UNIQUE_NAME_INDEXES = {
+    "uq_products_name_lower": "products",
+    "uq_statuses_name_lower": "statuses",
+}
+
+
+def _create_unique_name_indexes(connection) -> None:
+    for index, table in UNIQUE_NAME_INDEXES.items():
+        duplicates = connection.execute(text(
+            f"SELECT lower(name) FROM {table} GROUP BY lower(name) HAVING count(*) > 1 ORDER BY 1"
+        )).scalars().all()
+        if duplicates:
+            logger.warning(
+                "not creating %s: %s has names that differ only in case (%s); "
+                "rename them and restart to enforce unique names",
+                index, table, ", ".join(duplicates),
+            )
+            continue
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} (lower(name))"))
+
+
+def run_migrations(engine: Engine) -> None:
+    with engine.begin() as connection:
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
+        _create_unique_name_indexes(connection)
@@ -1,15 +1,16 @@
 from datetime import datetime
 import uuid
 from app.connection_to_db import Base
+from app.ids import id_generator
 from sqlalchemy.orm import Mapped, mapped_column,relationship
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, Numeric, String
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, ForeignKeyConstraint, Index, Integer, Numeric, String, text
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id:Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id:Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("users"))
     username:Mapped[str] = mapped_column(String, index=True)
     email:Mapped[str] = mapped_column(String, unique=True, index=True)
     hashed_password:Mapped[str] = mapped_column(String)
@@ -23,7 +24,7 @@ class User(Base):
 class Status(Base):
     __tablename__ = 'statuses'
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("statuses"))
     name: Mapped[str] = mapped_column(String, unique=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
@@ -34,7 +35,7 @@ class Status(Base):
 class Product(Base):
     __tablename__ = 'products'
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("products"))
     name: Mapped[str] = mapped_column(String, index=True)
     price: Mapped[Numeric] = mapped_column(Numeric(10, 2))
     description: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -42,36 +43,187 @@ class Product(Base):
     isAvailable: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Bumped by every ORM update, which fails with StaleDataError if another
+    # writer got there first. Stock changes from checkout, cancellation and the
+    # inventory flush don't bump it, so selling doesn't invalidate an admin's
+    # ETag; stock is adjusted relative to its current value instead.
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("1"))
 
     order_products: Mapped[list["OrderProduct"]] = relationship("OrderProduct", back_populates="product")
 
+    __mapper_args__ = {"version_id_col": version}
+
 # Order class
 class Order(Base):
     __tablename__ = 'orders'
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('users.id'))
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("orders"))
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('users.id'), index=True)
 
     user: Mapped["User"] = relationship("User", back_populates="orders")
-    status_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('statuses.id'))
+    status_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('statuses.id', ondelete='RESTRICT'), index=True)
     total_price: Mapped[Numeric] = mapped_column(Numeric(10, 2))
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Part of the key because orders can be partitioned by month (app/jobs/partitions.py)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow)
     updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Optimistic locking, as on Product; bulk status updates bump it themselves
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("1"))
 
     status: Mapped["Status"] = relationship("Status", back_populates="orders")
     order_products: Mapped[list["OrderProduct"]] = relationship("OrderProduct", back_populates="order")
 
+    __mapper_args__ = {"version_id_col": version}
+
 # OrderProduct class
 class OrderProduct(Base):
     __tablename__ = 'order_products'
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    order_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('orders.id'))
-    product_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('products.id'))
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("order_products"))
+    order_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    product_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('products.id', ondelete='RESTRICT'), index=True)
     quantity: Mapped[int] = mapped_column(Integer)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Price snapshot taken at checkout; NULL only for lines not yet backfilled
+    unit_price: Mapped[Numeric | None] = mapped_column(Numeric(10, 2), nullable=True)
+    line_total: Mapped[Numeric | None] = mapped_column(Numeric(10, 2), nullable=True)
+    # Always the created_at of the order, so a line sits in its order's partition
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow)
     updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     order: Mapped["Order"] = relationship("Order", back_populates="order_products")
     product: Mapped["Product"] = relationship("Product", back_populates="order_products")
-    
\ No newline at end of file
+
+    __table_args__ = (
+        ForeignKeyConstraint(["order_id", "created_at"], ["orders.id", "orders.created_at"]),
+    )
+
+# ProductStockSlice class
+# Hot products keep their sellable stock split across several rows so that
+# concurrent checkouts don't all queue on the single products row.
+class ProductStockSlice(Base):
+    __tablename__ = 'product_stock_slices'
+
+    product_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('products.id'), primary_key=True)
+    slice_no: Mapped[int] = mapped_column(Integer, primary_key=True)
+    stock: Mapped[int] = mapped_column(Integer, default=0)
+
+# StockReservation class
+class StockReservation(Base):
+    __tablename__ = 'stock_reservations'
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("stock_reservations"))
+    # One reservation may span several slices; its rows share the token handed to the client
+    token: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    product_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('products.id'))
+    slice_no: Mapped[int] = mapped_column(Integer)
+    quantity: Mapped[int] = mapped_column(Integer)
+    user_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    order_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True, index=True)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    confirmed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    released_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    flushed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index(
+            "ix_stock_reservations_held",
+            "expires_at",
+            postgresql_where=text("confirmed_at IS NULL AND released_at IS NULL"),
+        ),
+        Index(
+            "ix_stock_reservations_unflushed",
+            "product_id",
+            postgresql_where=text("confirmed_at IS NOT NULL AND flushed_at IS NULL AND released_at IS NULL"),
+        ),
+    )
+
+# OutboxEvent class
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_events'
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("outbox_events"))
+    event_type: Mapped[str] = mapped_column(String)
+    aggregate_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
+    payload: Mapped[dict] = mapped_column(JSONB)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    failed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # Workers only ever scan undelivered events, so keep that index small
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            postgresql_where=text("processed_at IS NULL AND failed_at IS NULL"),
+        ),
+    )
+
+# RefreshToken class
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("refresh_tokens"))
+    # HMAC-SHA256 of the token; the token itself is never stored
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True)
+    # All tokens rotated from the same login share a family
+    family_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    used_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    revoked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+# UserOrderStats class
+class UserOrderStats(Base):
+    __tablename__ = 'user_order_stats'
+
+    # Maintained by OrderService in the same transaction as the order change
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    order_count: Mapped[int] = mapped_column(Integer, default=0)
+    canceled_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Total of orders that were not canceled
+    lifetime_spend: Mapped[Numeric] = mapped_column(Numeric(14, 2), default=0)
+    last_order_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# OrderTicket class
+# A checkout accepted in async intake mode, waiting for (or done by) the intake worker
+class OrderTicket(Base):
+    __tablename__ = 'order_tickets'
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=id_generator("order_tickets"))
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    # The CreateOrderRequestModel as submitted
+    request: Mapped[dict] = mapped_column(JSONB)
+    status: Mapped[str] = mapped_column(String, default="queued")  # queued, completed or failed
+    order_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    error_status: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(String, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    # Set after a failed attempt so the retry waits instead of failing again right away
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # Workers only scan the queue, so keep that index to queued tickets
+    __table_args__ = (
+        Index(
+            "ix_order_tickets_queued",
+            "created_at",
+            postgresql_where=text("status = 'queued'"),
+        ),
+    )
+
+# CatalogVersion class
+# A single row, bumped by triggers on products so caches of catalog queries know
+# when to refresh: version when a name, price or availability changes, and
+# names_version only when products are added, removed or renamed
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+
+    id: Mapped[bool] = mapped_column(Boolean, primary_key=True, default=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=1)
+    names_version: Mapped[int] = mapped_column(BigInteger, default=1, server_default=text("1"))
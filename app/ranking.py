@@ -0,0 +1,221 @@
+# app/ranking.py
+#
+# Units sold per product over sliding windows (1h, 24h, 7d), kept in memory as
+# time-bucketed counters. Orders add their quantities when created and remove
+# them when canceled. Each window also keeps a running total per product, so
+# expiring a bucket only subtracts that bucket's counts. The top list is
+# rebuilt from the totals at most every RANKING_REFRESH_SECONDS, and only when
+# something changed; reads return the cached list.
+#
+# Counters are per process. A periodic resync reloads them from the database,
+# which also picks up orders taken by other workers. Sales recorded while a
+# reload runs are kept and replayed onto the reloaded counters, except for
+# orders whose change the reload's snapshot already shows.
+
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable
+from uuid import UUID
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models import Order, OrderProduct, Status
+from app.settings import settings
+
+# window name -> (span, bucket size) in seconds
+WINDOWS = {
+    "1h": (60 * 60, 60),
+    "24h": (24 * 60 * 60, 60 * 60),
+    "7d": (7 * 24 * 60 * 60, 60 * 60),
+}
+
+
+def _epoch(moment: datetime) -> float:
+    # Stored timestamps are naive UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class _Window:
+    def __init__(self, span: int, bucket_seconds: int):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = span // bucket_seconds
+        self.buckets: dict[int, Counter] = {}
+        self.totals: Counter = Counter()
+        self.oldest = 0
+        self.top: list[tuple[UUID, int]] = []
+        self.dirty = True
+        self.refreshed_at = 0.0
+
+    def add(self, at: float, product_id: UUID, units: int) -> None:
+        bucket = int(at // self.bucket_seconds)
+        if bucket < self.oldest:
+            return
+        self.buckets.setdefault(bucket, Counter())[product_id] += units
+        self.totals[product_id] += units
+        if self.totals[product_id] == 0:
+            del self.totals[product_id]
+        self.dirty = True
+
+    def expire(self, now: float) -> None:
+        oldest = int(now // self.bucket_seconds) - self.bucket_count + 1
+        if oldest <= self.oldest:
+            return
+        self.oldest = oldest
+        # Totals stay the exact sum of the live buckets. They can go negative when a
+        # cancellation arrives for a sale this process never saw (until the next resync).
+        for bucket in [bucket for bucket in self.buckets if bucket < oldest]:
+            for product_id, units in self.buckets.pop(bucket).items():
+                self.totals[product_id] -= units
+                if self.totals[product_id] == 0:
+                    del self.totals[product_id]
+            self.dirty = True
+
+    def ranked(self, now: float, refresh_seconds: float, size: int) -> list[tuple[UUID, int]]:
+        if self.dirty and now - self.refreshed_at >= refresh_seconds:
+            self.top = heapq.nlargest(
+                size, (item for item in self.totals.items() if item[1] > 0), key=lambda item: item[1]
+            )
+            self.dirty = False
+            self.refreshed_at = now
+        return self.top
+
+
+class SalesRanking:
+    def __init__(self, refresh_seconds: float = 1.0, max_top: int = 100):
+        self.refresh_seconds = refresh_seconds
+        self.max_top = max_top
+        self._lock = threading.Lock()
+        self._windows = self._new_windows(time.time())
+        # (order_id, sales, at) recorded since a load started; None when no load runs
+        self._pending: list[tuple[UUID | None, list[tuple[UUID, int]], float]] | None = None
+
+    @staticmethod
+    def _new_windows(now: float) -> dict[str, _Window]:
+        windows = {name: _Window(span, bucket_seconds) for name, (span, bucket_seconds) in WINDOWS.items()}
+        for window in windows.values():
+            window.expire(now)
+        return windows
+
+    def record(
+        self,
+        sales: Iterable[tuple[UUID, int]],
+        at: datetime | float,
+        now: float | None = None,
+        order_id: UUID | None = None,
+    ) -> None:
+        # sales are (product_id, units) of one committed order change; negative
+        # units take a canceled sale back out
+        at = at if isinstance(at, (int, float)) else _epoch(at)
+        sales = list(sales)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._add(self._windows, sales, at, now)
+            if self._pending is not None:
+                self._pending.append((order_id, sales, at))
+
+    @staticmethod
+    def _add(windows: dict[str, _Window], sales: list[tuple[UUID, int]], at: float, now: float) -> None:
+        for window in windows.values():
+            window.expire(now)
+            for product_id, units in sales:
+                window.add(at, product_id, units)
+
+    def top(self, window: str, limit: int, now: float | None = None) -> list[tuple[UUID, int]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            ranked_window = self._windows[window]
+            ranked_window.expire(now)
+            return ranked_window.ranked(now, self.refresh_seconds, self.max_top)[:limit]
+
+    def totals(self, window: str, now: float | None = None) -> dict[UUID, int]:
+        # Units per product over the window, for callers that weigh products by sales
+        now = time.time() if now is None else now
+        with self._lock:
+            totals_window = self._windows[window]
+            totals_window.expire(now)
+            return {product_id: units for product_id, units in totals_window.totals.items() if units > 0}
+
+    def load(self, db: Session) -> int:
+        # Rebuilds every window from the last 7 days of non-canceled orders. Reads
+        # run in one REPEATABLE READ snapshot, so db must not have begun a transaction.
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        with self._lock:
+            self._pending = []
+        try:
+            return self._load(db)
+        finally:
+            with self._lock:
+                self._pending = None
+            db.rollback()
+
+    def _load(self, db: Session) -> int:
+        now = time.time()
+        since = datetime.utcfromtimestamp(now - max(span for span, _ in WINDOWS.values()))
+        # Minutes are the finest bucket size of any window
+        bucket = func.date_trunc("minute", OrderProduct.created_at).label("bucket")
+        rows = db.execute(
+            select(OrderProduct.product_id, bucket, func.sum(OrderProduct.quantity).label("units"))
+            .join(Order, Order.id == OrderProduct.order_id)
+            .join(Status, Order.status_id == Status.id)
+            .where(
+                OrderProduct.created_at >= since,
+                Order.created_at >= since,
+                Status.name != "Canceled",
+            )
+            .group_by(OrderProduct.product_id, bucket)
+        ).all()
+
+        windows = self._new_windows(now)
+        for row in rows:
+            at = _epoch(row.bucket)
+            for window in windows.values():
+                window.add(at, row.product_id, int(row.units))
+
+        counted: dict[UUID, bool] = {}
+        with self._lock:
+            pending = list(self._pending)
+        self._replay(db, windows, pending, counted)
+        with self._lock:
+            # Whatever was recorded during the replay; usually nothing
+            self._replay(db, windows, self._pending[len(pending):], counted)
+            self._windows = windows
+        return len(rows)
+
+    @staticmethod
+    def _replay(
+        db: Session,
+        windows: dict[str, _Window],
+        pending: list[tuple[UUID | None, list[tuple[UUID, int]], float]],
+        counted: dict[UUID, bool],
+    ) -> None:
+        # counted says whether the load's snapshot includes an order's sales. A
+        # recorded change is skipped when the snapshot already shows its result.
+        unknown = {order_id for order_id, _, _ in pending if order_id is not None and order_id not in counted}
+        if unknown:
+            visible = dict(db.execute(
+                select(Order.id, Status.name != "Canceled")
+                .join(Status, Order.status_id == Status.id)
+                .where(Order.id.in_(unknown))
+            ).all())
+            counted.update({order_id: visible.get(order_id, False) for order_id in unknown})
+        now = time.time()
+        for order_id, sales, at in pending:
+            if not sales:
+                continue
+            placed = sales[0][1] > 0
+            if order_id is not None:
+                if counted[order_id] == placed:
+                    continue
+                counted[order_id] = placed
+            SalesRanking._add(windows, sales, at, now)
+
+
+sales_ranking = SalesRanking(settings.RANKING_REFRESH_SECONDS, settings.RANKING_MAX_TOP)
+
+
+def resync_sales_ranking(db: Session) -> int:
+    return sales_ranking.load(db)
@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
 from decimal import Decimal
 import re
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID, uuid4
 from pydantic import BaseModel, EmailStr, Field, validator
 from app.utils import get_password_hash, verify_password
@@ -12,6 +12,12 @@ from app.utils import get_password_hash, verify_password
 class Token(BaseModel):
     access_token: str  # The access token for authentication
     token_type: str  # The type of the token (e.g., "bearer")
+    refresh_token: Optional[str] = None  # Exchange at /login/refresh for a new pair
+
+
+# Refresh token sent to /login/refresh and /login/revoke
+class RefreshTokenRequestModel(BaseModel):
+    refresh_token: str
 
 
 # TokenData Model for storing user information associated with the token
@@ -130,11 +136,67 @@ class GetUserResponseModel(UserBaseModel):
         from_attributes = True
 
 
+class UserSearchRequest(BaseModel):
+    email_prefix: Optional[str] = Field(default=None, min_length=1, description="Case-insensitive email prefix")
+    username: Optional[str] = Field(default=None, min_length=1, description="Case-insensitive username substring")
+    is_admin: Optional[bool] = None
+    is_active: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    sort_by: Literal["created_at", "email", "username"] = "created_at"
+    sort_order: Literal["asc", "desc"] = "desc"
+    limit: int = Field(default=50, ge=1, le=500)
+    cursor: Optional[str] = Field(default=None, description="next_cursor from the previous page")
+
+
+class UserSearchResult(BaseModel):
+    users: list[GetUserResponseModel]
+    next_cursor: Optional[str]
+    estimated_total: int
+
+
+class UserOrderSummaryModel(BaseModel):
+    user_id: UUID
+    order_count: int
+    canceled_count: int
+    lifetime_spend: Decimal
+    last_order_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# One entry per requested id, in request order
+class UserBatchItemModel(BaseModel):
+    id: UUID
+    found: bool
+    user: Optional[GetUserResponseModel] = None
+
+
 class ChangeRoleRequestModel(BaseModel):
     user_id: str = Field(..., description="The unique identifier of the user")
     is_admin: bool = Field(..., description="The new admin status for the user")
 
 
+# Outcome of one input row of a bulk provisioning run
+class ProvisionedUserModel(BaseModel):
+    line: int
+    status: Literal["created", "exists", "duplicate", "invalid"]
+    email: Optional[str] = None
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+
+class ProvisioningSummaryModel(BaseModel):
+    total: int
+    created: int
+    exists: int
+    duplicate: int
+    invalid: int
+    seconds: float
+    users_per_second: float
+
+
 # ------------ Status Model -----------------#
 # Models
 class StatusBaseModel(BaseModel):
@@ -231,6 +293,15 @@ class UpdatedProductResponseModel(ProductBaseModel):
         from_attributes = True
 
 
+class AdjustProductStockRequestModel(BaseModel):
+    delta: int = Field(..., description="Units to add (positive) or take away (negative)")
+
+
+class ProductStockResponseModel(BaseModel):
+    product_id: UUID
+    stock: int
+
+
 class SearchRequest(BaseModel):
     name: Optional[str] = Field(default="")
     min_price: Optional[float] = None
@@ -253,12 +324,28 @@ class GetProductBySearchResponseModel(ProductBaseModel):
         from_attributes = True
 
 
+class PriceBucketModel(BaseModel):
+    # [min_price, max_price); None is an open end
+    min_price: Optional[Decimal]
+    max_price: Optional[Decimal]
+    count: int
+
+
+class SearchFacetsModel(BaseModel):
+    available: int
+    unavailable: int
+    min_price: Optional[Decimal]
+    max_price: Optional[Decimal]
+    price_buckets: list[PriceBucketModel]
+
+
 class SearchResult(BaseModel):
     page: int
     total_pages: int
     products_per_page: int
     total_products: int
     products: list[GetProductBySearchResponseModel]
+    facets: Optional[SearchFacetsModel] = None
 
 
 class GetProductResponseModel(ProductBaseModel):
@@ -275,12 +362,40 @@ class GetProductResponseModel(ProductBaseModel):
         from_attributes = True
 
 
+# One entry per requested id, in request order
+class ProductBatchItemModel(BaseModel):
+    id: UUID
+    found: bool
+    product: Optional[GetProductResponseModel] = None
+
+
+class ProductSuggestionModel(BaseModel):
+    product_id: UUID
+    name: str
+
+
+# Best sellers over a sliding window, most units first
+class TopProductModel(BaseModel):
+    product_id: UUID
+    name: str
+    units_sold: int
+
+
 # ------------------------ Order ------------------------- #
 # Order Product Models
 class OrderProductBaseModel(BaseModel):
     product_id: UUID
     quantity: int = Field(..., ge=1)
 
+class OrderProductSummaryModel(BaseModel):
+    name: str
+    price: Decimal
+
+class OrderProductDetailModel(OrderProductBaseModel):
+    unit_price: Optional[Decimal] = None
+    line_total: Optional[Decimal] = None
+    product: Optional[OrderProductSummaryModel] = None
+
 class OrderProduct(OrderProductBaseModel):
     id: UUID = Field(default_factory=uuid4)
     order_id: UUID
@@ -318,7 +433,7 @@ class Order(OrderBaseModel):
 
 # Request Models
 class CreateOrderProductRequestModel(OrderProductBaseModel):
-    pass
+    reservation_token: Optional[UUID] = Field(default=None, description="Token of a held stock reservation for this line")
 
 class CreateOrderRequestModel(BaseModel):
     products: list[CreateOrderProductRequestModel]
@@ -326,6 +441,10 @@ class CreateOrderRequestModel(BaseModel):
 class UpdateOrderStatusRequestModel(BaseModel):
     status: str = Field(..., description="New status for the order")
 
+class BulkCancelOrdersRequestModel(BaseModel):
+    older_than_minutes: int = Field(..., ge=1, description="Cancel pending orders older than this")
+    limit: int = Field(default=1000, ge=1, le=50000, description="Maximum number of orders to cancel")
+
 # Response Models
 class CreateOrderResponseModel(BaseModel):
     id:UUID
@@ -341,6 +460,25 @@ class CreateOrderResponseModel(BaseModel):
         }
     
 
+class BulkCancelOrdersResponseModel(BaseModel):
+    canceled_count: int
+    order_ids: list[UUID]
+
+
+# Returned with 202 in async intake mode; poll GET /orders/tickets/{id} for the outcome
+class OrderTicketResponseModel(BaseModel):
+    id: UUID
+    status: str
+    order_id: Optional[UUID] = None
+    error_status: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class UpdateOrderStatusResponseModel(BaseModel):
     id: UUID
     user_id: UUID
@@ -348,6 +486,8 @@ class UpdateOrderStatusResponseModel(BaseModel):
     status: str
     created_at: datetime
     updated_at: datetime
+    # Also sent as the ETag; pass it back in If-Match to guard the next change
+    version: int
     
     class Config:
         json_encoders = {
@@ -364,7 +504,8 @@ class GetOrderResponseModel(BaseModel):
     total_price: Decimal = Field(..., description="Total price of the order", decimal_places=2)
     created_at: datetime
     updated_at: Optional[datetime]
-    products: list[OrderProductBaseModel]
+    version: int
+    products: list[OrderProductDetailModel]
 
     class Config:
         json_encoders = {
@@ -382,4 +523,70 @@ class GetOrderToUserResponseModel(BaseModel):
         from_attributes=True
         json_encoders = {
             datetime: lambda v: v.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+
+# One entry per requested id, in request order
+class OrderBatchItemModel(BaseModel):
+    id: UUID
+    found: bool
+    order: Optional[GetOrderResponseModel] = None
+
+
+# ------------------------ Inventory ------------------------- #
+class CreateStockReservationRequestModel(BaseModel):
+    product_id: UUID
+    quantity: int = Field(..., ge=1)
+
+
+class StockReservationResponseModel(BaseModel):
+    token: UUID
+    product_id: UUID
+    quantity: int
+    expires_at: datetime
+
+
+class EnableHotProductRequestModel(BaseModel):
+    slices: Optional[int] = Field(default=None, ge=2, le=1024, description="Number of stock slices")
+
+
+class HotProductResponseModel(BaseModel):
+    product_id: UUID
+    slices: int
+    available_stock: int
+
+
+# ------------------------ Outbox ------------------------- #
+class OutboxDeliveryMetricsModel(BaseModel):
+    processed: int
+    retried: int
+    failed: int
+    batches: int
+    throughput_per_second: float
+    last_delivery_lag_seconds: float
+    max_delivery_lag_seconds: float
+
+
+class OutboxMetricsResponseModel(BaseModel):
+    worker_running: bool
+    pending: int
+    failed: int
+    lag_seconds: float
+    delivery: Optional[OutboxDeliveryMetricsModel] = None
+
+
+# ------------------------ Order intake ------------------------- #
+class OrderIntakeProcessingMetricsModel(BaseModel):
+    completed: int
+    failed: int
+    batches: int
+    throughput_per_second: float
+    last_processing_lag_seconds: float
+    max_processing_lag_seconds: float
+
+
+class OrderIntakeMetricsResponseModel(BaseModel):
+    mode: str
+    worker_running: bool
+    queued: int
+    lag_seconds: float
+    processing: Optional[OrderIntakeProcessingMetricsModel] = None
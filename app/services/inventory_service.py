@@ -0,0 +1,316 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from app.models import Product, ProductStockSlice, StockReservation
+from app.schemas import HotProductResponseModel, StockReservationResponseModel
+from app.settings import settings
+
+# Hot products ("flash sale" SKUs) sell from N stock slices instead of the
+# products row. For every hot product:
+#
+#   products.stock == sum(slices) + held reservations + confirmed but unflushed
+#
+# Checkouts only touch one slice row each, and confirmed sales are applied to
+# products.stock in batches by flush().
+
+# How many times to look for an unlocked slice before waiting on a locked one
+SKIP_LOCKED_ATTEMPTS = 3
+
+
+class InventoryService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_available_stock(self, product_ids: list[UUID]) -> dict[UUID, int]:
+        # Only hot products have slices, so the keys double as the set of hot products
+        if not product_ids:
+            return {}
+        rows = self.db.execute(
+            select(ProductStockSlice.product_id, func.sum(ProductStockSlice.stock))
+            .where(ProductStockSlice.product_id.in_(product_ids))
+            .group_by(ProductStockSlice.product_id)
+        ).all()
+        return {product_id: int(stock) for product_id, stock in rows}
+
+    def is_hot(self, product_id: UUID) -> bool:
+        return product_id in self.get_available_stock([product_id])
+
+    def reserve(
+        self,
+        product_id: UUID,
+        quantity: int,
+        user_id: UUID | None = None,
+        order_id: UUID | None = None,
+        ttl_seconds: int | None = None,
+    ) -> list[StockReservation] | None:
+        # Without a ttl the reservation is a confirmed sale (checkout); with one it
+        # is held for the client until it is confirmed, released or expires.
+        taken = self._take_from_one_slice(product_id, quantity) or self._take_from_many_slices(product_id, quantity)
+        if not taken:
+            return None
+
+        now = datetime.utcnow()
+        token = uuid4()
+        reservations = [
+            StockReservation(
+                token=token,
+                product_id=product_id,
+                slice_no=slice_no,
+                quantity=slice_quantity,
+                user_id=user_id,
+                order_id=order_id,
+                expires_at=now + timedelta(seconds=ttl_seconds) if ttl_seconds else None,
+                confirmed_at=None if ttl_seconds else now,
+            )
+            for slice_no, slice_quantity in taken
+        ]
+        self.db.add_all(reservations)
+        return reservations
+
+    def _take_from_one_slice(self, product_id: UUID, quantity: int) -> list[tuple[int, int]] | None:
+        for attempt in range(SKIP_LOCKED_ATTEMPTS + 1):
+            # Pick a random slice that can cover the whole quantity, skipping slices
+            # other checkouts are holding. Only the last attempt waits for a lock.
+            candidate = (
+                select(ProductStockSlice.slice_no)
+                .where(ProductStockSlice.product_id == product_id, ProductStockSlice.stock >= quantity)
+                .order_by(func.random())
+                .limit(1)
+                .with_for_update(skip_locked=attempt < SKIP_LOCKED_ATTEMPTS)
+                .scalar_subquery()
+            )
+            slice_no = self.db.execute(
+                update(ProductStockSlice)
+                .where(ProductStockSlice.product_id == product_id, ProductStockSlice.slice_no == candidate)
+                .values(stock=ProductStockSlice.stock - quantity)
+                .returning(ProductStockSlice.slice_no)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+            if slice_no is not None:
+                return [(slice_no, quantity)]
+        return None
+
+    def _take_from_many_slices(self, product_id: UUID, quantity: int) -> list[tuple[int, int]] | None:
+        # Rare path once slices run low: lock all of the product's slices in a fixed
+        # order (so concurrent callers can't deadlock) and drain them in turn.
+        slices = self.db.execute(
+            select(ProductStockSlice)
+            .where(ProductStockSlice.product_id == product_id, ProductStockSlice.stock > 0)
+            .order_by(ProductStockSlice.slice_no)
+            .with_for_update()
+        ).scalars().all()
+        if sum(stock_slice.stock for stock_slice in slices) < quantity:
+            return None
+
+        taken, remaining = [], quantity
+        for stock_slice in slices:
+            take = min(stock_slice.stock, remaining)
+            stock_slice.stock -= take
+            taken.append((stock_slice.slice_no, take))
+            remaining -= take
+            if remaining == 0:
+                break
+        return taken
+
+    def confirm(self, token: UUID, user_id: UUID, product_id: UUID, quantity: int, order_id: UUID) -> None:
+        now = datetime.utcnow()
+        confirmed = self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.token == token,
+                StockReservation.user_id == user_id,
+                StockReservation.product_id == product_id,
+                StockReservation.confirmed_at.is_(None),
+                StockReservation.released_at.is_(None),
+                StockReservation.expires_at > now,
+            )
+            .values(confirmed_at=now, order_id=order_id, expires_at=None)
+            .returning(StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        if sum(confirmed) != quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Reservation {token} has expired or does not match the requested product and quantity",
+            )
+
+    def reserve_for_cart(self, user_id: UUID, product_id: UUID, quantity: int) -> StockReservationResponseModel:
+        if not self.is_hot(product_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Reservations are only available for hot products",
+            )
+
+        reservations = self.reserve(
+            product_id, quantity, user_id=user_id, ttl_seconds=settings.INVENTORY_RESERVATION_TTL_SECONDS
+        )
+        if not reservations:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for product {product_id}",
+            )
+        self.db.commit()
+
+        return StockReservationResponseModel(
+            token=reservations[0].token,
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=reservations[0].expires_at,
+        )
+
+    def release(self, token: UUID, user_id: UUID) -> None:
+        released = self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.token == token,
+                StockReservation.user_id == user_id,
+                StockReservation.confirmed_at.is_(None),
+                StockReservation.released_at.is_(None),
+            )
+            .values(released_at=datetime.utcnow())
+            .returning(StockReservation.product_id, StockReservation.slice_no, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not released:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+
+        self._return_to_slices(released)
+        self.db.commit()
+
+    def release_for_orders(self, order_ids: list[UUID]) -> None:
+        # Stock of canceled hot-product lines goes back to its slice. Sales that were
+        # already flushed had left products.stock as well, so that is restored too.
+        released = self.db.execute(
+            update(StockReservation)
+            .where(StockReservation.order_id.in_(order_ids), StockReservation.released_at.is_(None))
+            .values(released_at=datetime.utcnow())
+            .returning(
+                StockReservation.product_id,
+                StockReservation.slice_no,
+                StockReservation.quantity,
+                StockReservation.flushed_at,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        self._return_to_slices(released)
+        self._adjust_product_stock(
+            [(row.product_id, row.quantity) for row in released if row.flushed_at is not None]
+        )
+
+    def flush(self) -> dict:
+        now = datetime.utcnow()
+
+        # Held reservations that ran out go back to their slice
+        expired = self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.confirmed_at.is_(None),
+                StockReservation.released_at.is_(None),
+                StockReservation.expires_at < now,
+            )
+            .values(released_at=now)
+            .returning(StockReservation.product_id, StockReservation.slice_no, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        self._return_to_slices(expired)
+
+        # Confirmed sales reach products.stock once per flush instead of once per checkout
+        flushed = self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.confirmed_at.isnot(None),
+                StockReservation.flushed_at.is_(None),
+                StockReservation.released_at.is_(None),
+            )
+            .values(flushed_at=now)
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        self._adjust_product_stock([(row.product_id, -row.quantity) for row in flushed])
+
+        self.db.commit()
+        return {"expired": len(expired), "flushed": len(flushed)}
+
+    def enable_hot_product(self, product_id: UUID, slices: int | None = None) -> HotProductResponseModel:
+        slices = slices or settings.INVENTORY_DEFAULT_SLICES
+        product = self.db.query(Product).filter(Product.id == product_id).with_for_update().first()
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        if self.is_hot(product_id):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Product is already in hot mode")
+
+        base, extra = divmod(product.stock, slices)
+        self.db.add_all(
+            ProductStockSlice(product_id=product_id, slice_no=slice_no, stock=base + (1 if slice_no < extra else 0))
+            for slice_no in range(slices)
+        )
+        self.db.commit()
+
+        return HotProductResponseModel(product_id=product_id, slices=slices, available_stock=product.stock)
+
+    def disable_hot_product(self, product_id: UUID) -> None:
+        # Lock the product so no admin stock update runs while slices are folded back in
+        product = self.db.query(Product).filter(Product.id == product_id).with_for_update().first()
+        if not product or not self.is_hot(product_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product is not in hot mode")
+
+        now = datetime.utcnow()
+        # Held stock is still counted in products.stock, so releasing it needs no adjustment
+        self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.product_id == product_id,
+                StockReservation.confirmed_at.is_(None),
+                StockReservation.released_at.is_(None),
+            )
+            .values(released_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        sold = self.db.execute(
+            update(StockReservation)
+            .where(
+                StockReservation.product_id == product_id,
+                StockReservation.confirmed_at.isnot(None),
+                StockReservation.flushed_at.is_(None),
+                StockReservation.released_at.is_(None),
+            )
+            .values(flushed_at=now)
+            .returning(StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        self._adjust_product_stock([(product_id, -sum(sold))])
+        self.db.execute(delete(ProductStockSlice).where(ProductStockSlice.product_id == product_id))
+        self.db.commit()
+
+    def _return_to_slices(self, rows) -> None:
+        totals = defaultdict(int)
+        for row in rows:
+            totals[(row.product_id, row.slice_no)] += row.quantity
+
+        # Sorted so concurrent callers lock slices in the same order
+        for (product_id, slice_no), quantity in sorted(totals.items(), key=str):
+            self.db.execute(
+                update(ProductStockSlice)
+                .where(ProductStockSlice.product_id == product_id, ProductStockSlice.slice_no == slice_no)
+                .values(stock=ProductStockSlice.stock + quantity)
+                .execution_options(synchronize_session=False)
+            )
+
+    def _adjust_product_stock(self, deltas: list[tuple[UUID, int]]) -> None:
+        totals = defaultdict(int)
+        for product_id, delta in deltas:
+            totals[product_id] += delta
+
+        for product_id, delta in sorted(totals.items(), key=str):
+            if delta:
+                self.db.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(stock=Product.stock + delta)
+                    .execution_options(synchronize_session=False)
+                )
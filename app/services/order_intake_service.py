@@ -0,0 +1,144 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.models import OrderTicket, Product, User
+from app.schemas import CreateOrderRequestModel, OrderTicketResponseModel
+from app.services.inventory_service import InventoryService
+from app.services.order_service import OrderService
+from app.settings import settings
+
+# In async intake mode POST /orders only stores the request as a ticket.
+# process_batch() places queued orders a batch per transaction: the batch's
+# product rows are locked once, in id order, and each order runs in its own
+# savepoint so a rejected order doesn't undo the others. Stock is checked and
+# taken from an in-memory ledger of the locked rows, and the batch's sales are
+# written back as one grouped UPDATE, not one per order line. Hot products are
+# left out of the lock and the ledger; their lines take stock from the slices
+# through InventoryService.reserve as in a synchronous checkout. Tickets are
+# claimed with SKIP LOCKED and completed in the same transaction as their
+# order, so a crash leaves them queued and no order is placed twice. A ticket
+# that fails unexpectedly is retried later, after an exponential backoff.
+#
+# Synchronous checkouts and admin edits of the batch's products wait for its
+# commit. To bound that wait, a batch stops taking tickets once it has held
+# the locks for ORDER_INTAKE_MAX_LOCK_SECONDS; the rest stay queued.
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class OrderIntakeService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(self, user_id: UUID, order_request: CreateOrderRequestModel) -> OrderTicketResponseModel:
+        ticket = OrderTicket(user_id=user_id, request=jsonable_encoder(order_request), status=QUEUED, attempts=0)
+        self.db.add(ticket)
+        self.db.flush()
+        response = OrderTicketResponseModel.from_orm(ticket)
+        self.db.commit()
+        return response
+
+    def get_ticket(self, ticket_id: UUID, current_user: User) -> OrderTicketResponseModel:
+        ticket = self.db.get(OrderTicket, ticket_id)
+        if not ticket:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+        if not current_user.is_admin and str(ticket.user_id) != str(current_user.id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. You can only view your own tickets.")
+        return OrderTicketResponseModel.from_orm(ticket)
+
+    def get_backlog(self) -> dict:
+        queued_count, oldest_queued = (
+            self.db.query(func.count(OrderTicket.id), func.min(OrderTicket.created_at))
+            .filter(OrderTicket.status == QUEUED)
+            .one()
+        )
+        lag = datetime.utcnow() - oldest_queued if oldest_queued else timedelta(0)
+        return {
+            "queued": queued_count,
+            "lag_seconds": max(lag.total_seconds(), 0.0),
+        }
+
+    def process_batch(
+        self, batch_size: int, max_attempts: int, max_lock_seconds: float = settings.ORDER_INTAKE_MAX_LOCK_SECONDS
+    ) -> dict:
+        now = datetime.utcnow()
+        tickets = (
+            self.db.query(OrderTicket)
+            .filter(
+                OrderTicket.status == QUEUED,
+                or_(OrderTicket.next_attempt_at.is_(None), OrderTicket.next_attempt_at <= now),
+            )
+            .order_by(OrderTicket.created_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not tickets:
+            self.db.commit()
+            return {"claimed": 0, "completed": 0, "failed": 0, "lags": []}
+
+        requests = {ticket.id: CreateOrderRequestModel.parse_obj(ticket.request) for ticket in tickets}
+        product_ids = {item.product_id for request in requests.values() for item in request.products}
+        product_ids -= InventoryService(self.db).get_available_stock(list(product_ids)).keys()
+        locked_stock = dict(self.db.execute(
+            select(Product.id, Product.stock).where(Product.id.in_(product_ids)).order_by(Product.id).with_for_update()
+        ).all())
+        locked_at = time.monotonic()
+
+        order_service = OrderService(self.db)
+        stock_ledger = dict(locked_stock)
+        placed, completed, failed, lags = [], 0, 0, []
+        for position, ticket in enumerate(tickets):
+            if position and time.monotonic() - locked_at > max_lock_seconds:
+                break
+            order_request = requests[ticket.id]
+            ledger_before = dict(stock_ledger)
+            try:
+                with self.db.begin_nested():
+                    order = order_service.place_order(ticket.user_id, order_request, stock_ledger)
+            except HTTPException as error:
+                stock_ledger = ledger_before
+                # Rejected the same way a synchronous checkout would have been
+                ticket.status, ticket.error_status, ticket.error = FAILED, error.status_code, str(error.detail)
+            except Exception as error:
+                stock_ledger = ledger_before
+                logger.exception("order ticket failed", extra={"ticket_id": str(ticket.id), "attempt": ticket.attempts + 1})
+                ticket.attempts += 1
+                if ticket.attempts < max_attempts:
+                    ticket.next_attempt_at = datetime.utcnow() + self._backoff(ticket.attempts)
+                    continue
+                ticket.status, ticket.error_status, ticket.error = FAILED, 500, str(error)[:1000]
+            else:
+                ticket.status, ticket.order_id = COMPLETED, order.id
+                placed.append((order.id, order.created_at, order_request))
+
+            ticket.processed_at = datetime.utcnow()
+            lags.append((ticket.processed_at - ticket.created_at).total_seconds())
+            if ticket.status == COMPLETED:
+                completed += 1
+            else:
+                failed += 1
+
+        order_service.take_stock({
+            product_id: stock - stock_ledger[product_id] for product_id, stock in locked_stock.items()
+        })
+        self.db.commit()
+        for order_id, created_at, order_request in placed:
+            order_service.record_placed_sales(order_id, created_at, order_request)
+        return {"claimed": len(tickets), "completed": completed, "failed": failed, "lags": lags}
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        # With jitter, so tickets that failed together don't all retry together
+        delay = settings.ORDER_INTAKE_RETRY_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
@@ -1,39 +1,118 @@
+import logging
+from collections import defaultdict
+from typing import NamedTuple
 from uuid import UUID
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session,joinedload
-from app.models import Order,Product,Status,OrderProduct
-from app.schemas import CreateOrderRequestModel, CreateOrderResponseModel, GetOrderResponseModel, OrderProductBaseModel, UpdateOrderStatusResponseModel
+from sqlalchemy import Integer, column, exists, func, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+from app.models import Order,Product,Status,OrderProduct,StockReservation
+from app.cache import LRUCache
+from app.db_errors import require_version, translate_stale_data
+from app.events import publish_after_commit
+from app.fields import sparse_rows
+from app.metrics import ORDERS_CANCELED, ORDERS_CREATED, STOCK_OUTS
+from app.ranking import sales_ranking
+from app.schemas import CreateOrderRequestModel, CreateOrderResponseModel, GetOrderResponseModel, OrderBatchItemModel, OrderProductDetailModel, OrderProductSummaryModel, UpdateOrderStatusResponseModel
+from app.services.inventory_service import InventoryService
+from app.services.order_stats_service import OrderStatsService
+from app.services.outbox_service import ORDER_CANCELED, ORDER_CREATED, ORDER_STATUS_CHANGED, OutboxService
+from app.services.status_service import get_status_id
+from app.settings import settings
+from app.tracing import traced_service
 
+logger = logging.getLogger(__name__)
 
+# Stale orders are canceled in chunks so row locks are held only briefly
+BULK_CANCEL_CHUNK_SIZE = 500
+
+
+# The parts of an order that never change after checkout
+class OrderSnapshot(NamedTuple):
+    user_id: UUID
+    total_price: Decimal
+    created_at: datetime
+    line_items: tuple[tuple[UUID, int, Decimal | None, Decimal | None], ...]
+
+
+order_snapshot_cache = LRUCache(settings.ORDER_SNAPSHOT_CACHE_SIZE)
+
+
+def _cache_order_snapshot(order_id: UUID, snapshot: OrderSnapshot) -> None:
+    # Lines from before prices were captured get them from the backfill job, so
+    # they are only cached once the backfill has reached them
+    if all(line_item[2] is not None for line_item in snapshot.line_items):
+        order_snapshot_cache.set(order_id, snapshot)
+
+
+@traced_service(include=("_validate_products",))
 class OrderService:
     def __init__(self, db: Session):
         self.db = db
+        self.outbox = OutboxService(db)
+        self.inventory = InventoryService(db)
+        self.stats = OrderStatsService(db)
 
     def create_order(self, user_id: UUID, order_request: CreateOrderRequestModel) -> CreateOrderResponseModel:
+        new_order = self.place_order(user_id, order_request)
+        self.db.commit()
+        self.record_placed_sales(new_order.id, new_order.created_at, order_request)
+        response = self.created_order_response(new_order)
+        logger.info("order placed", extra={"order_id": str(response.id), "total_price": str(response.total_price)})
+        return response
+
+    def place_order(
+        self, user_id: UUID, order_request: CreateOrderRequestModel, stock_ledger: dict[UUID, int] | None = None
+    ) -> Order:
+        # Stages the order in the caller's transaction; the caller commits.
+        # With a stock_ledger (remaining stock of products the caller has locked),
+        # stock is checked and taken from the ledger, and the caller writes the
+        # total back with take_stock() instead of one UPDATE per order line.
         # Step 1: Get pending status
         pending_status = self._get_pending_status()
 
         # Step 2: Fetch and validate products
-        product_map, total_price = self._validate_products(order_request.products)
+        product_map, total_price, hot_stock = self._validate_products(order_request.products, stock_ledger)
+        logger.debug("order validated", extra={"lines": len(order_request.products), "hot_lines": len(hot_stock)})
 
         # Step 3: Create new order
         new_order = self._create_new_order(user_id, pending_status.id, total_price)
 
         # Step 4: Create order products and update stock
-        self._create_order_products(new_order.id, order_request.products, product_map)
-
-        # Step 5: Create response model
-        response_data = CreateOrderResponseModel(
-            id=new_order.id,
-            user_id=new_order.user_id,
-            status=pending_status.name,
-            total_price=new_order.total_price,
-            created_at=new_order.created_at
-        )
+        self._create_order_products(new_order, order_request.products, product_map, hot_stock, stock_ledger)
+        self.stats.record_order(user_id, new_order.total_price, new_order.created_at)
+
+        # Step 5: Record the event in the same transaction
+        self.outbox.add_event(ORDER_CREATED, new_order.id, {
+            "order_id": new_order.id,
+            "user_id": user_id,
+            "status": pending_status.name,
+            "total_price": new_order.total_price,
+            "products": [
+                {"product_id": item.product_id, "quantity": item.quantity}
+                for item in order_request.products
+            ],
+        })
+        return new_order
 
-        return response_data
+    def record_placed_sales(self, order_id: UUID, created_at: datetime, order_request: CreateOrderRequestModel) -> None:
+        # Call once the order is committed
+        ORDERS_CREATED.inc()
+        if settings.RANKING_ENABLED:
+            sales_ranking.record(
+                [(item.product_id, item.quantity) for item in order_request.products], created_at, order_id=order_id
+            )
+
+    def created_order_response(self, order: Order) -> CreateOrderResponseModel:
+        return CreateOrderResponseModel(
+            id=order.id,
+            user_id=order.user_id,
+            status="Pending",
+            total_price=order.total_price,
+            created_at=order.created_at
+        )
 
     def _get_pending_status(self):
         pending_status = self.db.query(Status).filter(Status.name == "Pending").first()
@@ -41,7 +120,7 @@ class OrderService:
             raise HTTPException(status_code=400, detail="Pending status not found")
         return pending_status
 
-    def _validate_products(self, order_products):
+    def _validate_products(self, order_products, stock_ledger: dict[UUID, int] | None = None):
         total_price = Decimal('0.00')
         product_ids = [item.product_id for item in order_products]
         db_products = self.db.query(Product).filter(Product.id.in_(product_ids)).all()
@@ -49,6 +128,9 @@ class OrderService:
         # Create a dictionary for quick lookup
         product_map = {str(product.id): product for product in db_products}
 
+        # Hot products sell from their stock slices, not from products.stock
+        hot_stock = self.inventory.get_available_stock(product_ids)
+
         for item in order_products:
             product_id = str(item.product_id)
             product = product_map.get(product_id)
@@ -56,16 +138,20 @@ class OrderService:
             if not product:
                 raise HTTPException(status_code=400, detail=f"Product with id {product_id} not found")
 
-            if product.stock < item.quantity:
+            # Stock held by a reservation is checked when the reservation is confirmed
+            available = product.stock if stock_ledger is None else stock_ledger.get(product.id, product.stock)
+            available = hot_stock.get(product.id, available)
+            if item.reservation_token is None and available < item.quantity:
+                STOCK_OUTS.inc()
                 raise HTTPException(
                     status_code=400,
-                    detail=f"Insufficient stock for product {product.name}. Available: {product.stock}, Requested: {item.quantity}"
+                    detail=f"Insufficient stock for product {product.name}. Available: {available}, Requested: {item.quantity}"
                 )
 
             item_price = product.price * item.quantity
             total_price += item_price
 
-        return product_map, total_price
+        return product_map, total_price, hot_stock
 
     def _create_new_order(self, user_id: UUID, status_id: UUID, total_price: Decimal):
         new_order = Order(
@@ -75,109 +161,436 @@ class OrderService:
             created_at=datetime.now(timezone.utc)
         )
         self.db.add(new_order)
-        self.db.commit()  # Commit to get the new order ID
+        self.db.flush()  # Flush to get the new order ID without ending the transaction
         return new_order
 
-    def _create_order_products(self, order_id: UUID, order_products, product_map):
+    def _create_order_products(self, order: Order, order_products, product_map, hot_stock, stock_ledger=None):
         order_products_list = []
 
-        for item in order_products:
+        # Take stock in product id order so concurrent checkouts lock rows in the same order
+        for item in sorted(order_products, key=lambda item: str(item.product_id)):
             product_id = str(item.product_id)
             product = product_map[product_id]
 
-            # Create the order product instance
+            # Create the order product instance with the price paid
             order_product = OrderProduct(
-                order_id=order_id,  # Set the order ID here
+                order_id=order.id,  # Set the order ID here
                 product_id=product.id,
                 quantity=item.quantity,
-                created_at=datetime.now(timezone.utc)
+                unit_price=product.price,
+                line_total=product.price * item.quantity,
+                created_at=order.created_at  # Same as the order, so both land in the same partition
             )
             order_products_list.append(order_product)
 
             # Update product stock
-            product.stock -= item.quantity
+            if item.reservation_token is not None:
+                self.inventory.confirm(item.reservation_token, order.user_id, product.id, item.quantity, order.id)
+            elif product.id in hot_stock:
+                if not self.inventory.reserve(product.id, item.quantity, user_id=order.user_id, order_id=order.id):
+                    self._raise_insufficient_stock(product, item.quantity)
+            elif stock_ledger is not None and product.id in stock_ledger:
+                if stock_ledger[product.id] < item.quantity:
+                    self._raise_insufficient_stock(product, item.quantity)
+                stock_ledger[product.id] -= item.quantity
+            else:
+                # Check and decrement in one statement so concurrent checkouts can't oversell
+                updated = self.db.execute(
+                    update(Product)
+                    .where(Product.id == product.id, Product.stock >= item.quantity)
+                    .values(stock=Product.stock - item.quantity)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if not updated:
+                    self._raise_insufficient_stock(product, item.quantity)
 
-        # Update the total price of the order
-        total_price = sum(product.price * item.quantity for item in order_products)
         self.db.add_all(order_products_list)
-        self.db.commit()  # Commit the order products
 
-        return total_price
+    def take_stock(self, quantities: dict[UUID, int]) -> None:
+        # One UPDATE ... FROM (VALUES ...) for the stock taken by a batch of orders
+        # through a stock ledger. The caller holds the rows' locks, so no check is needed.
+        rows = [
+            (product_id, quantity)
+            for product_id, quantity in sorted(quantities.items(), key=lambda item: str(item[0]))
+            if quantity
+        ]
+        if not rows:
+            return
+        taken = values(column("product_id", PG_UUID(as_uuid=True)), column("quantity", Integer), name="taken").data(rows)
+        self.db.execute(
+            update(Product)
+            .where(Product.id == taken.c.product_id)
+            .values(stock=Product.stock - taken.c.quantity)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _raise_insufficient_stock(self, product: Product, quantity: int):
+        STOCK_OUTS.inc()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient stock for product {product.name}. Requested: {quantity}"
+        )
 
 
-    def update_order_status(self, order_id: UUID, new_status: str) -> UpdateOrderStatusResponseModel:
-        order = self.db.query(Order).get(order_id)
+    def update_order_status(
+        self, order_id: UUID, new_status: str, expected_version: int | None = None
+    ) -> UpdateOrderStatusResponseModel:
+        order = self.db.query(Order).filter(Order.id == order_id).first()
         if not order:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        require_version(order.version, expected_version, "Order")
 
         new_status_obj = self.db.query(Status).filter(Status.name == new_status).first()
         if not new_status_obj:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status provided")
 
+        previous_status = order.status.name
         order.status_id = new_status_obj.id
         order.updated_at = datetime.now(timezone.utc)
 
-        
-        self.db.commit()
+        event = {
+            "order_id": order.id,
+            "user_id": order.user_id,
+            "previous_status": previous_status,
+            "status": new_status_obj.name,
+        }
+        if new_status_obj.name == "Canceled" and previous_status != "Canceled":
+            self.stats.record_cancellations([(order.user_id, order.total_price)])
+        elif previous_status == "Canceled" and new_status_obj.name != "Canceled":
+            self.stats.record_reinstatements([(order.user_id, order.total_price)])
+
+        self.outbox.add_event(ORDER_STATUS_CHANGED, order.id, event)
+        publish_after_commit(self.db, {"type": ORDER_STATUS_CHANGED, **event, "updated_at": order.updated_at})
+        # The UPDATE is conditional on the version read above; a concurrent change makes it a 409
+        with translate_stale_data(self.db, "Order"):
+            self.db.commit()
         self.db.refresh(order)
+        logger.info(
+            "order status changed",
+            extra={"order_id": str(order_id), "previous_status": previous_status, "status": new_status_obj.name},
+        )
+
+        if new_status_obj.name == "Canceled" and previous_status != "Canceled":
+            self._record_sales([(order.id, order.created_at)], -1)
+        elif previous_status == "Canceled" and new_status_obj.name != "Canceled":
+            self._record_sales([(order.id, order.created_at)], 1)
 
         response_data =  UpdateOrderStatusResponseModel(
             id=order.id,
             user_id=order.user_id,
             status=new_status_obj.name,  # Ensure status is a string
             total_price=order.total_price,
-            created_at=order.created_at
+            created_at=order.created_at,
+            updated_at=order.updated_at,
+            version=order.version,
             )
         
         return response_data
 
-    def get_order_details(self, order_id: UUID) -> GetOrderResponseModel :
-     order = self.db.query(Order).options(
-         joinedload(Order.status),
-        joinedload(Order.order_products).joinedload(OrderProduct.product)
-        ).get(order_id)
-
-     if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
-     return GetOrderResponseModel(
-        id=order.id,  # Use order.id instead of order_id
-        user_id=order.user_id,
-        status=order.status.name,  # Ensure status is the name of the status
-        total_price=order.total_price,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        products=[OrderProductBaseModel(
-            product_id=op.product_id,
-            quantity=op.quantity
-        ) for op in order.order_products]  # Create a list of OrderProductBaseModel
-    )
-     
-    def cancel_order(self, order_id: UUID, user_id: UUID):
-        order = self.db.query(Order).get(order_id)
+    def get_order_details(
+        self, order_id: UUID, expand_products: bool = False, fields: tuple[str, ...] | None = None
+    ) -> GetOrderResponseModel:
+        if fields and "products" not in fields:
+            return self._get_order_header(order_id, fields)
+        if fields:
+            return sparse_rows([self.get_order_details(order_id, expand_products)], GetOrderResponseModel, fields)[0]
+
+        snapshot = order_snapshot_cache.get(order_id)
+
+        if snapshot is None:
+            # Cache miss: read the header and the line items as plain column projections
+            order = self.db.execute(
+                select(Order.user_id, Order.total_price, Order.created_at, Order.updated_at, Order.version, Status.name.label("status"))
+                .join(Status, Order.status_id == Status.id)
+                .where(Order.id == order_id)
+            ).first()
+            if not order:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+
+            # Lines are never older than their order, which lets Postgres prune older partitions
+            line_items = self.db.execute(
+                select(OrderProduct.product_id, OrderProduct.quantity, OrderProduct.unit_price, OrderProduct.line_total)
+                .where(OrderProduct.order_id == order_id, OrderProduct.created_at >= order.created_at)
+            ).all()
+            snapshot = OrderSnapshot(
+                user_id=order.user_id,
+                total_price=order.total_price,
+                created_at=order.created_at,
+                line_items=tuple(
+                    (item.product_id, item.quantity, item.unit_price, item.line_total) for item in line_items
+                ),
+            )
+            _cache_order_snapshot(order_id, snapshot)
+        else:
+            # Cache hit: only the mutable status, updated_at and version need a fresh read
+            order = self.db.execute(
+                select(Order.updated_at, Order.version, Status.name.label("status"))
+                .join(Status, Order.status_id == Status.id)
+                .where(Order.id == order_id)
+            ).first()
+            if not order:
+                order_snapshot_cache.pop(order_id)
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+
+        product_summaries = {}
+        if expand_products and snapshot.line_items:
+            product_summaries = self._get_product_summaries(
+                {line_item[0] for line_item in snapshot.line_items}
+            )
+
+        return self._order_response(order_id, snapshot, order, product_summaries)
+
+    def _get_order_header(self, order_id: UUID, fields: tuple[str, ...]) -> GetOrderResponseModel:
+        # Without line items only the requested header columns are read
+        columns = {
+            "id": Order.id,
+            "user_id": Order.user_id,
+            "status": Status.name,
+            "total_price": Order.total_price,
+            "created_at": Order.created_at,
+            "updated_at": Order.updated_at,
+            "version": Order.version,
+        }
+        query = select(*(columns[name].label(name) for name in fields)).where(Order.id == order_id)
+        if "status" in fields:
+            query = query.join(Status, Order.status_id == Status.id)
+        order = self.db.execute(query).first()
+        if not order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        return sparse_rows([order], GetOrderResponseModel, fields)[0]
+
+    def get_orders_by_ids(
+        self, order_ids: list[UUID], user_id: UUID | None, expand_products: bool = False
+    ) -> list[OrderBatchItemModel]:
+        # user_id restricts the lookup to that user's orders; admins pass None.
+        # Other users' orders are reported as not found rather than forbidden.
+        query = (
+            select(Order.id, Order.user_id, Order.total_price, Order.created_at, Order.updated_at, Order.version, Status.name.label("status"))
+            .join(Status, Order.status_id == Status.id)
+            .where(Order.id.in_(set(order_ids)))
+        )
+        if user_id is not None:
+            query = query.where(Order.user_id == user_id)
+        headers = {row.id: row for row in self.db.execute(query)}
+
+        # Line items only need reading for orders that aren't cached yet
+        snapshots = {order_id: order_snapshot_cache.get(order_id) for order_id in headers}
+        uncached = [order_id for order_id, snapshot in snapshots.items() if snapshot is None]
+        if uncached:
+            line_items = defaultdict(list)
+            rows = self.db.execute(
+                select(OrderProduct.order_id, OrderProduct.product_id, OrderProduct.quantity, OrderProduct.unit_price, OrderProduct.line_total)
+                .where(
+                    OrderProduct.order_id.in_(uncached),
+                    OrderProduct.created_at >= min(headers[order_id].created_at for order_id in uncached),
+                )
+            )
+            for row in rows:
+                line_items[row.order_id].append((row.product_id, row.quantity, row.unit_price, row.line_total))
+            for order_id in uncached:
+                header = headers[order_id]
+                snapshots[order_id] = OrderSnapshot(
+                    user_id=header.user_id,
+                    total_price=header.total_price,
+                    created_at=header.created_at,
+                    line_items=tuple(line_items[order_id]),
+                )
+                _cache_order_snapshot(order_id, snapshots[order_id])
+
+        product_summaries = {}
+        if expand_products:
+            product_ids = {line_item[0] for snapshot in snapshots.values() for line_item in snapshot.line_items}
+            if product_ids:
+                product_summaries = self._get_product_summaries(product_ids)
+
+        orders = {
+            order_id: self._order_response(order_id, snapshots[order_id], header, product_summaries)
+            for order_id, header in headers.items()
+        }
+        return [
+            OrderBatchItemModel(id=order_id, found=order_id in orders, order=orders.get(order_id))
+            for order_id in order_ids
+        ]
+
+    def _order_response(
+        self,
+        order_id: UUID,
+        snapshot: OrderSnapshot,
+        header,
+        product_summaries: dict[UUID, OrderProductSummaryModel],
+    ) -> GetOrderResponseModel:
+        # header is a row with the order's current status, updated_at and version
+        return GetOrderResponseModel(
+            id=order_id,
+            user_id=snapshot.user_id,
+            status=header.status,
+            total_price=snapshot.total_price,
+            created_at=snapshot.created_at,
+            updated_at=header.updated_at,
+            version=header.version,
+            products=[OrderProductDetailModel(
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                line_total=line_total,
+                product=product_summaries.get(product_id)
+            ) for product_id, quantity, unit_price, line_total in snapshot.line_items]
+        )
+
+    def _get_product_summaries(self, product_ids: set[UUID]) -> dict[UUID, OrderProductSummaryModel]:
+        rows = self.db.execute(
+            select(Product.id, Product.name, Product.price).where(Product.id.in_(product_ids))
+        ).all()
+        return {row.id: OrderProductSummaryModel(name=row.name, price=row.price) for row in rows}
+
+    def cancel_order(self, order_id: UUID, user_id: UUID, expected_version: int | None = None):
+        # No row lock: if a concurrent cancel or status change commits first, the
+        # versioned UPDATE at commit matches nothing and the stock restore rolls back
+        order = self.db.query(Order).filter(Order.id == order_id).first()
         if not order:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
         if str(order.user_id) != str(user_id):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have permission to cancel this order")
 
-        if order.status.name.lower() != "pending":
+        require_version(order.version, expected_version, "Order")
+
+        if order.status_id != get_status_id(self.db, "Pending"):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only pending orders can be canceled")
 
-        canceled_status = self.db.query(Status).filter(Status.name == "Canceled").first()
-        if not canceled_status:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Canceled status not found in the system")
+        canceled_status_id = self._get_canceled_status_id()
 
-        order.status_id = canceled_status.id
+        order.status_id = canceled_status_id
         order.updated_at = datetime.now(timezone.utc)
 
         # Restore product stock
-        for order_product in order.order_products:
-            product = order_product.product
-            product.stock += order_product.quantity
-
-        
-        self.db.commit()
-        self.db.refresh(order)
+        self._restore_stock([order.id], order.created_at)
+
+        event = {
+            "order_id": order.id,
+            "user_id": order.user_id,
+            "status": "Canceled",
+        }
+        self.stats.record_cancellations([(order.user_id, order.total_price)])
+        self.outbox.add_event(ORDER_CANCELED, order.id, event)
+        publish_after_commit(self.db, {"type": ORDER_CANCELED, **event, "updated_at": order.updated_at})
+        canceled_order = (order.id, order.created_at)
+        with translate_stale_data(self.db, "Order"):
+            self.db.commit()
+        self._record_sales([canceled_order], -1)
+        ORDERS_CANCELED.labels("customer").inc()
+        logger.info("order canceled", extra={"order_id": str(order_id)})
+
+        return order
+
+    def cancel_stale_orders(self, older_than_minutes: int, limit: int) -> list[UUID]:
+        pending_status_id = get_status_id(self.db, "Pending")
+        canceled_status_id = self._get_canceled_status_id()
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)
+
+        canceled_ids = []
+        while len(canceled_ids) < limit:
+            # SKIP LOCKED leaves orders that someone is touching right now for the next run
+            rows = self.db.execute(
+                select(Order.id, Order.user_id, Order.total_price, Order.created_at)
+                .where(Order.status_id == pending_status_id, Order.created_at < cutoff)
+                .order_by(Order.created_at)
+                .limit(min(BULK_CANCEL_CHUNK_SIZE, limit - len(canceled_ids)))
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                break
+
+            order_ids = [row.id for row in rows]
+            self._restore_stock(order_ids, min(row.created_at for row in rows))
+            updated_at = datetime.now(timezone.utc)
+            self.db.execute(
+                update(Order)
+                .where(Order.id.in_(order_ids))
+                .values(status_id=canceled_status_id, updated_at=updated_at, version=Order.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            self.stats.record_cancellations([(row.user_id, row.total_price) for row in rows])
+            self.outbox.add_events([
+                (ORDER_CANCELED, row.id, {"order_id": row.id, "user_id": row.user_id, "status": "Canceled"})
+                for row in rows
+            ])
+            for row in rows:
+                publish_after_commit(self.db, {
+                    "type": ORDER_CANCELED,
+                    "order_id": row.id,
+                    "user_id": row.user_id,
+                    "status": "Canceled",
+                    "updated_at": updated_at,
+                })
+            self.db.commit()
+            self._record_sales([(row.id, row.created_at) for row in rows], -1)
+            ORDERS_CANCELED.labels("stale").inc(len(rows))
+            canceled_ids.extend(order_ids)
+
+        logger.info("stale orders canceled", extra={"count": len(canceled_ids), "older_than_minutes": older_than_minutes})
+        return canceled_ids
+
+    def _record_sales(self, orders: list[tuple[UUID, datetime]], sign: int) -> None:
+        # Feeds committed cancellations (sign -1) and reinstatements (+1) to the
+        # in-memory ranking, at the time each order was placed
+        if not settings.RANKING_ENABLED or not orders:
+            return
+
+        line_items, uncached = {}, []
+        for order_id, _ in orders:
+            snapshot = order_snapshot_cache.get(order_id)
+            if snapshot is not None:
+                line_items[order_id] = [(line_item[0], line_item[1]) for line_item in snapshot.line_items]
+            else:
+                uncached.append(order_id)
+        if uncached:
+            created_at = {order_id: order_created_at for order_id, order_created_at in orders}
+            rows = self.db.execute(
+                select(OrderProduct.order_id, OrderProduct.product_id, OrderProduct.quantity)
+                .where(
+                    OrderProduct.order_id.in_(uncached),
+                    OrderProduct.created_at >= min(created_at[order_id] for order_id in uncached),
+                )
+            ).all()
+            for row in rows:
+                line_items.setdefault(row.order_id, []).append((row.product_id, row.quantity))
+
+        for order_id, order_created_at in orders:
+            sales_ranking.record(
+                [(product_id, sign * quantity) for product_id, quantity in line_items.get(order_id, ())],
+                order_created_at,
+                order_id=order_id,
+            )
 
-        return order
\ No newline at end of file
+    def _get_canceled_status_id(self) -> UUID:
+        canceled_status_id = get_status_id(self.db, "Canceled")
+        if not canceled_status_id:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Canceled status not found in the system")
+        return canceled_status_id
+
+    def _restore_stock(self, order_ids: list[UUID], created_after: datetime):
+        # Lines sold from hot product slices go back through their reservations
+        self.inventory.release_for_orders(order_ids)
+
+        # One UPDATE ... FROM for all other lines of all given orders. Quantities are summed
+        # per product first, since UPDATE ... FROM applies only one joined row per target row.
+        restored = (
+            select(OrderProduct.product_id, func.sum(OrderProduct.quantity).label("quantity"))
+            .where(
+                OrderProduct.order_id.in_(order_ids),
+                OrderProduct.created_at >= created_after,
+                ~exists().where(
+                    StockReservation.order_id == OrderProduct.order_id,
+                    StockReservation.product_id == OrderProduct.product_id,
+                ),
+            )
+            .group_by(OrderProduct.product_id)
+            .subquery()
+        )
+        self.db.execute(
+            update(Product)
+            .where(Product.id == restored.c.product_id)
+            .values(stock=Product.stock + restored.c.quantity)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,141 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import Order, Status, User, UserOrderStats
+from app.schemas import UserOrderSummaryModel
+
+# user_order_stats holds running totals per user so profile summaries are a
+# primary-key read. OrderService applies deltas in the order's own transaction;
+# reconcile() recomputes rows from orders to repair any drift.
+
+
+class OrderStatsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_order(self, user_id: UUID, total_price: Decimal, created_at: datetime) -> None:
+        self._apply({user_id: (1, 0, total_price, created_at)})
+
+    def record_cancellations(self, orders: list[tuple[UUID, Decimal]]) -> None:
+        # orders is (user_id, total_price) per canceled order
+        self._apply(self._group(orders, canceled=1))
+
+    def record_reinstatements(self, orders: list[tuple[UUID, Decimal]]) -> None:
+        # An order moved out of Canceled counts towards spend again
+        self._apply(self._group(orders, canceled=-1))
+
+    @staticmethod
+    def _group(orders: list[tuple[UUID, Decimal]], canceled: int) -> dict:
+        deltas = defaultdict(lambda: [0, 0, Decimal("0"), None])
+        for user_id, total_price in orders:
+            deltas[user_id][1] += canceled
+            deltas[user_id][2] -= canceled * total_price
+        return {user_id: tuple(delta) for user_id, delta in deltas.items()}
+
+    def _apply(self, deltas: dict[UUID, tuple[int, int, Decimal, datetime | None]]) -> None:
+        # Sorted so concurrent transactions lock users' rows in the same order
+        for user_id, (orders, canceled, spend, last_order_at) in sorted(deltas.items(), key=lambda item: str(item[0])):
+            statement = insert(UserOrderStats).values(
+                user_id=user_id,
+                order_count=orders,
+                canceled_count=canceled,
+                lifetime_spend=spend,
+                last_order_at=last_order_at,
+                updated_at=datetime.utcnow(),
+            )
+            self.db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[UserOrderStats.user_id],
+                    set_={
+                        "order_count": UserOrderStats.order_count + statement.excluded.order_count,
+                        "canceled_count": UserOrderStats.canceled_count + statement.excluded.canceled_count,
+                        "lifetime_spend": UserOrderStats.lifetime_spend + statement.excluded.lifetime_spend,
+                        "last_order_at": func.greatest(UserOrderStats.last_order_at, statement.excluded.last_order_at),
+                        "updated_at": statement.excluded.updated_at,
+                    },
+                )
+            )
+
+    def get_summary(self, user_id: UUID) -> UserOrderSummaryModel:
+        stats = self.db.get(UserOrderStats, user_id)
+        if stats is not None:
+            return UserOrderSummaryModel.from_orm(stats)
+
+        # No row yet: either the user has no orders or doesn't exist
+        if not self.db.query(User.id).filter(User.id == user_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return UserOrderSummaryModel(user_id=user_id, order_count=0, canceled_count=0, lifetime_spend=Decimal("0"))
+
+    def reconcile(self, batch_size: int = 1000) -> int:
+        # Walks users in id order, one transaction per batch. Every user in the
+        # batch gets a stats row first (a zero row if there was none), and all of
+        # them are locked before the totals are read, so a concurrent checkout's
+        # increment either commits before the read or waits and lands on top of
+        # the recomputed values. Without the zero rows, a first order committed
+        # between the read and the upsert would be overwritten.
+        canceled_status_id = self.db.query(Status.id).filter(Status.name == "Canceled").scalar()
+        is_canceled = Order.status_id == canceled_status_id
+        last_user_id, rebuilt = None, 0
+
+        while True:
+            query = select(User.id).order_by(User.id).limit(batch_size)
+            if last_user_id is not None:
+                query = query.where(User.id > last_user_id)
+            user_ids = self.db.execute(query).scalars().all()
+            if not user_ids:
+                break
+
+            now = datetime.utcnow()
+            self.db.execute(
+                insert(UserOrderStats)
+                .values([
+                    {"user_id": user_id, "order_count": 0, "canceled_count": 0, "lifetime_spend": 0, "updated_at": now}
+                    for user_id in user_ids
+                ])
+                .on_conflict_do_nothing(index_elements=[UserOrderStats.user_id])
+            )
+            self.db.execute(
+                select(UserOrderStats.user_id)
+                .where(UserOrderStats.user_id.in_(user_ids))
+                .order_by(UserOrderStats.user_id)
+                .with_for_update()
+            ).all()
+            totals = self.db.execute(
+                select(
+                    User.id.label("user_id"),
+                    func.count(Order.id).label("order_count"),
+                    func.count(case((is_canceled, 1))).label("canceled_count"),
+                    func.coalesce(func.sum(case((is_canceled, 0), else_=Order.total_price)), 0).label("lifetime_spend"),
+                    func.max(Order.created_at).label("last_order_at"),
+                )
+                .outerjoin(Order, Order.user_id == User.id)
+                .where(User.id.in_(user_ids))
+                .group_by(User.id)
+            ).all()
+
+            statement = insert(UserOrderStats).values([
+                {**row._asdict(), "updated_at": now} for row in totals
+            ])
+            self.db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[UserOrderStats.user_id],
+                    set_={
+                        "order_count": statement.excluded.order_count,
+                        "canceled_count": statement.excluded.canceled_count,
+                        "lifetime_spend": statement.excluded.lifetime_spend,
+                        "last_order_at": statement.excluded.last_order_at,
+                        "updated_at": statement.excluded.updated_at,
+                    },
+                )
+            )
+            self.db.commit()
+
+            rebuilt += len(totals)
+            last_user_id = user_ids[-1]
+
+        return rebuilt
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from uuid import UUID
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import OutboxEvent
+
+ORDER_CREATED = "order.created"
+ORDER_CANCELED = "order.canceled"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+
+class OutboxService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add_event(self, event_type: str, aggregate_id: UUID, payload: dict) -> OutboxEvent:
+        # The event is only staged on the caller's session, so it is committed
+        # (or rolled back) in the same transaction as the change it describes.
+        event = OutboxEvent(
+            event_type=event_type,
+            aggregate_id=aggregate_id,
+            payload=jsonable_encoder(payload),
+        )
+        self.db.add(event)
+        return event
+
+    def add_events(self, events: list[tuple[str, UUID, dict]]) -> None:
+        self.db.add_all(
+            OutboxEvent(
+                event_type=event_type,
+                aggregate_id=aggregate_id,
+                payload=jsonable_encoder(payload),
+            )
+            for event_type, aggregate_id, payload in events
+        )
+
+    def get_backlog(self) -> dict:
+        pending_count, oldest_pending = (
+            self.db.query(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at))
+            .filter(OutboxEvent.processed_at.is_(None), OutboxEvent.failed_at.is_(None))
+            .one()
+        )
+        failed_count = (
+            self.db.query(func.count(OutboxEvent.id))
+            .filter(OutboxEvent.failed_at.isnot(None))
+            .scalar()
+        )
+        lag = datetime.utcnow() - oldest_pending if oldest_pending else timedelta(0)
+
+        return {
+            "pending": pending_count,
+            "failed": failed_count,
+            "lag_seconds": max(lag.total_seconds(), 0.0),
+        }
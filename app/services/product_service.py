@@ -1,98 +1,227 @@
 from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
 import math
 from uuid import UUID
-from sqlalchemy import asc, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import Numeric, asc, cast, delete, desc, func, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, array, insert
+from sqlalchemy.orm import Session, load_only
 from fastapi import HTTPException, status
-from app.models import OrderProduct, Product
+from app.db_errors import (
+    FOREIGN_KEY_VIOLATION,
+    require_version,
+    translate_integrity_errors,
+    translate_stale_data,
+)
+from app.cache import LRUCache
+from app.models import CatalogVersion, Product
+from app.ranking import sales_ranking
+from app.services.inventory_service import InventoryService
+from app.suggest import product_suggest
 from app.schemas import (
+    AdjustProductStockRequestModel,
     CreateProductRequestModel,
     GetProductBySearchResponseModel,
+    GetProductResponseModel,
+    PriceBucketModel,
+    ProductBatchItemModel,
+    ProductStockResponseModel,
+    ProductSuggestionModel,
+    SearchFacetsModel,
     SearchRequest,
     SearchResult,
+    TopProductModel,
     UpdatedProductRequestModel,
 )
+from app.settings import settings
+from app.tracing import traced_service
+
+# (catalog version, normalized filters, price breaks) -> (matching products, facets)
+facet_cache = LRUCache(settings.FACET_CACHE_SIZE)
 
 
+def parse_price_breaks(value: str | None) -> tuple[Decimal, ...]:
+    if value is None:
+        return tuple(Decimal(str(price)) for price in settings.FACET_PRICE_BREAKS)
+    try:
+        breaks = tuple(Decimal(price.strip()) for price in value.split(","))
+    except InvalidOperation:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="price_breaks must be comma-separated prices")
+    if len(breaks) > settings.FACET_MAX_PRICE_BREAKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.FACET_MAX_PRICE_BREAKS} price breaks are allowed",
+        )
+    if not all(price.is_finite() for price in breaks) or any(not low < high for low, high in zip(breaks, breaks[1:])):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="price_breaks must be finite prices in ascending order")
+    return breaks
+
+
+@traced_service
 class ProductService:
     def __init__(self, db: Session):
         self.db = db
 
     def create_product(self, product: CreateProductRequestModel) -> Product:
-        # Check for unique name
-        if self.db.query(Product).filter(Product.name.ilike(product.name)).first():
+        # Names are unique case-insensitively (uq_products_name_lower)
+        new_product = self.db.execute(
+            insert(Product)
+            .values(**product.dict())
+            .on_conflict_do_nothing(index_elements=[func.lower(Product.name)])
+            .returning(Product)
+        ).scalar()
+        if new_product is None:
+            self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Product name '{product.name}' already exists. Please use a unique name.",
             )
 
-        new_product = Product(**product.dict())
-        self.db.add(new_product)
+        # Keep the RETURNING values instead of reloading them after commit
+        self.db.expunge(new_product)
         self.db.commit()
-        self.db.refresh(new_product)
+        if settings.SUGGEST_ENABLED:
+            product_suggest.upsert(new_product.id, new_product.name)
         return new_product
 
     def update_product(
-        self, product_id: UUID, product_update: UpdatedProductRequestModel
+        self, product_id: UUID, product_update: UpdatedProductRequestModel, expected_version: int | None = None
     ) -> Product:
         product = self.db.query(Product).filter(Product.id == product_id).first()
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
             )
+        require_version(product.version, expected_version, "Product")
 
         update_data = product_update.dict(exclude_unset=True)
 
-        # Check for unique name if it's being updated
-        if "name" in update_data:
-            existing_product = (
-                self.db.query(Product)
-                .filter(
-                    Product.name.ilike(update_data["name"]), Product.id != product_id
-                )
-                .first()
+        if "stock" in update_data and InventoryService(self.db).is_hot(product_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock of a hot product is managed by its stock slices. Disable hot mode first.",
             )
-            if existing_product:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Product name '{update_data['name']}' already exists. Please use a unique name.",
-                )
 
         for key, value in update_data.items():
             setattr(product, key, value)
 
         product.updated_at = datetime.now(timezone.utc)
-        self.db.commit()
+        with translate_integrity_errors(self.db, {
+            "uq_products_name_lower": (
+                status.HTTP_400_BAD_REQUEST,
+                f"Product name '{update_data.get('name')}' already exists. Please use a unique name.",
+            ),
+        }), translate_stale_data(self.db, "Product"):
+            self.db.commit()
         self.db.refresh(product)
+        if settings.SUGGEST_ENABLED and "name" in update_data:
+            product_suggest.upsert(product.id, product.name)
         return product
 
-    def delete_product(self, product_id: UUID):
-        product = self.db.query(Product).filter(Product.id == product_id).first()
-        if not product:
+    def adjust_stock(self, product_id: UUID, adjustment: AdjustProductStockRequestModel) -> ProductStockResponseModel:
+        # Relative to the current stock, so sales made since the admin last read the
+        # product are kept. Stock isn't versioned, so no If-Match is needed.
+        if InventoryService(self.db).is_hot(product_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock of a hot product is managed by its stock slices. Disable hot mode first.",
+            )
+
+        stock = self.db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock + adjustment.delta >= 0)
+            .values(stock=Product.stock + adjustment.delta)
+            .returning(Product.stock)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if stock is None:
+            self.db.rollback()
+            if self.db.query(Product.id).filter(Product.id == product_id).first() is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Product with ID {product_id} not found.",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock to take away {-adjustment.delta} units.",
+            )
+        self.db.commit()
+        return ProductStockResponseModel(product_id=product_id, stock=stock)
+
+    def delete_product(self, product_id: UUID, expected_version: int | None = None):
+        # Products that are referenced anywhere are protected by foreign keys
+        with translate_integrity_errors(self.db, {
+            "product_stock_slices_product_id_fkey": (
+                status.HTTP_409_CONFLICT,
+                "Cannot delete a product in hot mode. Disable hot mode first.",
+            ),
+            "stock_reservations_product_id_fkey": (
+                status.HTTP_409_CONFLICT,
+                "Cannot delete product because it has stock reservations.",
+            ),
+            FOREIGN_KEY_VIOLATION: (
+                status.HTTP_409_CONFLICT,
+                "Cannot delete product because it is associated with an existing order.",
+            ),
+        }):
+            query = delete(Product).where(Product.id == product_id)
+            if expected_version is not None:
+                query = query.where(Product.version == expected_version)
+            deleted = self.db.execute(query).rowcount
+            self.db.commit()
+        if deleted and settings.SUGGEST_ENABLED:
+            product_suggest.remove(product_id)
+
+        if not deleted:
+            if expected_version is not None:
+                current = self.db.query(Product.version).filter(Product.id == product_id).scalar()
+                if current is not None:
+                    require_version(current, expected_version, "Product")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Product with ID {product_id} not found.",
             )
-            
-        # Step 2: Check if the product is associated with any orders
-        is_product_in_order = self.db.query(OrderProduct).filter(
-         OrderProduct.product_id == product_id
-        ).first()
-
-        if is_product_in_order:
-         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Cannot delete product because it is associated with an existing order.",
+
+    def get_all_products(self, fields: tuple[str, ...] | None = None):
+        return self._query(fields).all()
+
+    def get_products_by_ids(self, product_ids: list[UUID]) -> list[ProductBatchItemModel]:
+        products = {
+            product.id: GetProductResponseModel.from_orm(product)
+            for product in self.db.query(Product).filter(Product.id.in_(set(product_ids)))
+        }
+        return [
+            ProductBatchItemModel(id=product_id, found=product_id in products, product=products.get(product_id))
+            for product_id in product_ids
+        ]
+
+    def get_top_products(self, window: str, limit: int) -> list[TopProductModel]:
+        ranked = sales_ranking.top(window, limit)
+        if not ranked:
+            return []
+        names = dict(
+            self.db.query(Product.id, Product.name).filter(Product.id.in_([product_id for product_id, _ in ranked]))
         )
-            
-        self.db.delete(product)
-        self.db.commit()
+        # Products deleted since they sold drop out of the list
+        return [
+            TopProductModel(product_id=product_id, name=names[product_id], units_sold=units)
+            for product_id, units in ranked
+            if product_id in names
+        ]
 
-    def get_all_products(self):
-        return self.db.query(Product).all()
+    def suggest_products(self, query: str, limit: int) -> list[ProductSuggestionModel]:
+        if not product_suggest.ready:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Product suggestions are not available yet",
+                headers={"Retry-After": "5"},
+            )
+        return [
+            ProductSuggestionModel(product_id=product_id, name=name)
+            for product_id, name in product_suggest.suggest(query, limit)
+        ]
 
-    def get_product(self, product_id: UUID) -> Product:
-        product = self.db.query(Product).filter(Product.id == product_id).first()
+    def get_product(self, product_id: UUID, fields: tuple[str, ...] | None = None) -> Product:
+        product = self._query(fields).filter(Product.id == product_id).first()
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -100,18 +229,22 @@ class ProductService:
             )
         return product
 
-    def search_products(self, search_request: SearchRequest) -> SearchResult:
-        query = self.db.query(Product)
+    def search_products(
+        self, search_request: SearchRequest, price_breaks: tuple[Decimal, ...] | None = None
+    ) -> SearchResult:
+        page, products = self.search_page(search_request, price_breaks=price_breaks)
+        return SearchResult(
+            **page,
+            products=[GetProductBySearchResponseModel.from_orm(p) for p in products],
+        )
 
-        # Apply filters based on search parameters
-        if search_request.name:
-            query = query.filter(Product.name.ilike(f"%{search_request.name}%"))
-        if search_request.min_price is not None:
-            query = query.filter(Product.price >= search_request.min_price)
-        if search_request.max_price is not None:
-            query = query.filter(Product.price <= search_request.max_price)
-        if search_request.isAvailable is not None:
-            query = query.filter(Product.isAvailable == search_request.isAvailable)
+    def search_page(
+        self,
+        search_request: SearchRequest,
+        fields: tuple[str, ...] | None = None,
+        price_breaks: tuple[Decimal, ...] | None = None,
+    ) -> tuple[dict, list[Product]]:
+        query = self._query(fields).filter(*self._search_filters(search_request))
 
         # Apply sorting
         sort_column = (
@@ -124,8 +257,12 @@ class ProductService:
         )
         query = query.order_by(order)
 
-        # Paginate results
-        total_products = query.count()
+        # Facets count the matching products too, so the page doesn't need its own count
+        facets = None
+        if price_breaks is not None:
+            total_products, facets = self._search_facets(search_request, price_breaks)
+        else:
+            total_products = query.count()
         total_pages = math.ceil(total_products / search_request.page_size)
         products = (
             query.offset((search_request.page - 1) * search_request.page_size)
@@ -133,11 +270,96 @@ class ProductService:
             .all()
         )
 
-        # Create the SearchResult response
-        return SearchResult(
-            page=search_request.page,
-            total_pages=total_pages,
-            products_per_page=search_request.page_size,
-            total_products=total_products,
-            products=[GetProductBySearchResponseModel.from_orm(p) for p in products],
+        page = {
+            "page": search_request.page,
+            "total_pages": total_pages,
+            "products_per_page": search_request.page_size,
+            "total_products": total_products,
+        }
+        if facets is not None:
+            page["facets"] = facets
+        return page, products
+
+    def _search_filters(self, search_request: SearchRequest) -> list:
+        filters = []
+        if search_request.name:
+            filters.append(Product.name.ilike(f"%{search_request.name}%"))
+        if search_request.min_price is not None:
+            filters.append(Product.price >= search_request.min_price)
+        if search_request.max_price is not None:
+            filters.append(Product.price <= search_request.max_price)
+        if search_request.isAvailable is not None:
+            filters.append(Product.isAvailable == search_request.isAvailable)
+        return filters
+
+    def _search_facets(
+        self, search_request: SearchRequest, price_breaks: tuple[Decimal, ...]
+    ) -> tuple[int, SearchFacetsModel]:
+        # Paging and sorting don't change facets, and name matching ignores case
+        catalog_version = self.db.execute(select(CatalogVersion.version)).scalar()
+        key = (
+            catalog_version,
+            (search_request.name or "").lower(),
+            search_request.min_price,
+            search_request.max_price,
+            search_request.isAvailable,
+            price_breaks,
         )
+        cached = facet_cache.get(key)
+        if cached is not None:
+            return cached
+
+        matching = (
+            select(
+                Product.isAvailable.label("available"),
+                Product.price,
+                func.width_bucket(Product.price, cast(array(price_breaks), ARRAY(Numeric))).label("bucket"),
+            )
+            .where(*self._search_filters(search_request))
+            .subquery()
+        )
+        # One pass over the matching rows: per availability, per price bucket, and overall.
+        # GROUPING() tells the sets apart: 1 = by availability, 2 = by bucket, 3 = overall.
+        rows = self.db.execute(
+            select(
+                func.grouping(matching.c.available, matching.c.bucket).label("grouping_set"),
+                matching.c.available,
+                matching.c.bucket,
+                func.count().label("count"),
+                func.min(matching.c.price).label("min_price"),
+                func.max(matching.c.price).label("max_price"),
+            ).group_by(func.grouping_sets(matching.c.available, matching.c.bucket, text("()")))
+        ).all()
+
+        total, available, min_price, max_price = 0, 0, None, None
+        bucket_counts = [0] * (len(price_breaks) + 1)
+        for row in rows:
+            if row.grouping_set == 3:
+                total, min_price, max_price = row.count, row.min_price, row.max_price
+            elif row.grouping_set == 1 and row.available:
+                available = row.count
+            elif row.grouping_set == 2 and row.bucket is not None:
+                bucket_counts[row.bucket] = row.count
+
+        # width_bucket returns 0 below the first break and len(price_breaks) from the last one up
+        bounds = (None, *price_breaks, None)
+        facets = SearchFacetsModel(
+            available=available,
+            unavailable=total - available,
+            min_price=min_price,
+            max_price=max_price,
+            price_buckets=[
+                PriceBucketModel(min_price=bounds[index], max_price=bounds[index + 1], count=count)
+                for index, count in enumerate(bucket_counts)
+            ],
+        )
+        facet_cache.set(key, (total, facets))
+        return total, facets
+
+    def _query(self, fields: tuple[str, ...] | None):
+        # Only the requested columns are fetched (the primary key always is, and
+        # the version too since it's the ETag)
+        query = self.db.query(Product)
+        if fields:
+            query = query.options(load_only(*(getattr(Product, name) for name in fields), Product.version))
+        return query
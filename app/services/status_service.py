@@ -1,27 +1,52 @@
 from datetime import datetime, timezone
 from uuid import UUID
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status as http_status
-from app.models import Order, Status
+from app.db_errors import FOREIGN_KEY_VIOLATION, UNIQUE_VIOLATION, translate_integrity_errors
+from app.models import Status
 from app.schemas import CreateStatusRequestModel, UpdateStatusRequestModel
+from app.tracing import traced_service
 
+# Statuses are a handful of rows that almost never change, so their ids are
+# cached per process and hot paths can compare status_id without a lookup.
+_status_id_cache: dict[str, UUID] = {}
 
+
+def get_status_id(db: Session, name: str) -> UUID | None:
+    status_id = _status_id_cache.get(name)
+    if status_id is None:
+        status_id = db.query(Status.id).filter(Status.name == name).scalar()
+        if status_id is not None:
+            _status_id_cache[name] = status_id
+    return status_id
+
+
+def clear_status_id_cache() -> None:
+    _status_id_cache.clear()
+
+
+@traced_service
 class StatusService:
     def __init__(self, db: Session):
         self.db = db
 
     def create_status(self, status: CreateStatusRequestModel) -> Status:
-        # Check for unique name
-        if self.db.query(Status).filter(Status.name.ilike(status.name)).first():
+        # Names are unique case-insensitively (uq_statuses_name_lower)
+        new_status = self.db.execute(
+            insert(Status).values(name=status.name).on_conflict_do_nothing().returning(Status)
+        ).scalar()
+        if new_status is None:
+            self.db.rollback()
             raise HTTPException(
                 status_code=http_status.HTTP_400_BAD_REQUEST,
                 detail="Status name already exists",
             )
 
-        new_status = Status(name=status.name)
-        self.db.add(new_status)
+        # Keep the RETURNING values instead of reloading them after commit
+        self.db.expunge(new_status)
         self.db.commit()
-        self.db.refresh(new_status)
         return new_status
 
     def get_status(self, status_id: UUID) -> Status:
@@ -41,41 +66,33 @@ class StatusService:
                 status_code=http_status.HTTP_404_NOT_FOUND, detail="Status not found"
             )
 
-        # Check for unique name
-        existing_status = (
-            self.db.query(Status)
-            .filter(Status.name.ilike(status_update.name), Status.id != status_id)
-            .first()
-        )
-        if existing_status:
-            raise HTTPException(
-                status_code=http_status.HTTP_400_BAD_REQUEST,
-                detail=f"Status with name '{status_update.name}' already exists",
-            )
-
         status.name = status_update.name
         status.updated_at = datetime.now(timezone.utc)
-        self.db.commit()
+        with translate_integrity_errors(self.db, {
+            UNIQUE_VIOLATION: (
+                http_status.HTTP_400_BAD_REQUEST,
+                f"Status with name '{status_update.name}' already exists",
+            ),
+        }):
+            self.db.commit()
+        clear_status_id_cache()
         self.db.refresh(status)
         return status
 
     def remove_status(self, status_id: UUID):
-        # Check if the status exists
-        status = self.db.query(Status).get(status_id)
-        if not status:
+        # Statuses used by orders are protected by the orders.status_id foreign key
+        with translate_integrity_errors(self.db, {
+            FOREIGN_KEY_VIOLATION: (
+                http_status.HTTP_400_BAD_REQUEST,
+                "Can't delete status. It is used in an order. Consider creating a new status for obsolete items.",
+            ),
+        }):
+            deleted = self.db.execute(delete(Status).where(Status.id == status_id)).rowcount
+            self.db.commit()
+        clear_status_id_cache()
+
+        if not deleted:
             raise HTTPException(
                 status_code=http_status.HTTP_404_NOT_FOUND,
                 detail="Status not found"
             )
-
-        # Check if the status is associated with any orders
-        associated_orders = self.db.query(Order).filter(Order.status_id == status_id).first()
-        if associated_orders:
-            raise HTTPException(
-                status_code=http_status.HTTP_400_BAD_REQUEST,
-                detail="Can't delete status. It is used in an order. Consider creating a new status for obsolete items."
-            )
-
-        # If no issues, delete the status
-        self.db.delete(status)
-        self.db.commit()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from fastapi import HTTPException, status
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from app.models import RefreshToken
+from app.schemas import Token
+from app.settings import settings
+from app.utils import create_access_token
+
+logger = logging.getLogger(__name__)
+
+# Refresh tokens are random 256-bit strings, so a keyed SHA-256 is enough to
+# store them safely; unlike bcrypt it costs microseconds. Each refresh marks
+# the presented token used and issues the next one in the same family. A used
+# token coming back means it leaked, so the whole family is revoked.
+
+
+def hash_refresh_token(token: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+def _invalid_refresh_token(detail: str = "Invalid refresh token") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class TokenService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def issue_tokens(self, user_id: UUID, family_id: UUID | None = None) -> Token:
+        refresh_token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        self.db.add(
+            RefreshToken(
+                token_hash=hash_refresh_token(refresh_token),
+                family_id=family_id or uuid4(),
+                user_id=user_id,
+                created_at=now,
+                expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+            )
+        )
+        self.db.commit()
+
+        access_token = create_access_token(
+            data={"sub": str(user_id)},
+            expires_delta=timedelta(minutes=int(settings.ACCESS_TOKEN_EXPIRE_MINUTES)),
+        )
+        return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+    def refresh(self, refresh_token: str) -> Token:
+        token_hash = hash_refresh_token(refresh_token)
+        now = datetime.utcnow()
+
+        # One indexed update claims the token; concurrent refreshes can't both win
+        claimed = self.db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(used_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if claimed:
+            return self.issue_tokens(claimed.user_id, claimed.family_id)
+
+        known = self.db.execute(
+            select(RefreshToken.family_id, RefreshToken.used_at).where(RefreshToken.token_hash == token_hash)
+        ).first()
+        if known and known.used_at is not None:
+            self._revoke(RefreshToken.family_id == known.family_id)
+            self.db.commit()
+            logger.warning("refresh token reuse, family revoked", extra={"family_id": str(known.family_id)})
+            raise _invalid_refresh_token("Refresh token reuse detected, please log in again")
+
+        self.db.rollback()
+        raise _invalid_refresh_token()
+
+    def revoke(self, refresh_token: str) -> None:
+        # Logging out ends the whole family, not just the latest token
+        family_id = self.db.execute(
+            select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_refresh_token(refresh_token))
+        ).scalar()
+        if family_id is None:
+            raise _invalid_refresh_token()
+        self._revoke(RefreshToken.family_id == family_id)
+        self.db.commit()
+
+    def revoke_all_for_user(self, user_id: UUID) -> None:
+        # Staged only; callers commit together with their own change
+        self._revoke(RefreshToken.user_id == user_id)
+
+    def purge_expired(self) -> int:
+        now = datetime.utcnow()
+        result = self.db.execute(
+            delete(RefreshToken).where(
+                or_(RefreshToken.expires_at < now, RefreshToken.revoked_at < now - timedelta(days=1))
+            )
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def _revoke(self, condition) -> None:
+        self.db.execute(
+            update(RefreshToken)
+            .where(condition, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
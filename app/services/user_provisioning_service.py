@@ -0,0 +1,134 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import User
+from app.schemas import ProvisionedUserModel, ProvisioningSummaryModel, UserCreateRequestModel
+from app.settings import settings
+from app.utils import get_password_hash
+
+# Creates accounts in bulk (POST /users/bulk and app/jobs/provision_users.py).
+# Input rows are validated as they are read and handled a chunk at a time: one
+# query finds the chunk's emails that are already registered, bcrypt runs on a
+# pool of processes so every core hashes, and the chunk is inserted with one
+# INSERT ... ON CONFLICT DO NOTHING, which also catches emails registered by
+# someone else in the meantime. Each row gets an outcome.
+
+HASH_WORKERS = settings.PROVISION_HASH_WORKERS or os.cpu_count() or 1
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # spawn, not fork: the API process has threads (log listener, workers)
+            _hash_pool = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown()
+            _hash_pool = None
+
+
+def _validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+class UserProvisioningService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.counts: Counter = Counter()
+        self.started = time.perf_counter()
+
+    def provision(
+        self, records: Iterable[tuple[int, Any]], chunk_size: int = settings.PROVISION_CHUNK_SIZE
+    ) -> Iterator[ProvisionedUserModel]:
+        # records are (line number, row), a row being a dict or a line of JSON
+        self.started = time.perf_counter()
+        seen_emails: set[str] = set()
+        chunk: list[tuple[int, UserCreateRequestModel]] = []
+        for line, record in records:
+            try:
+                user = UserCreateRequestModel.parse_obj(json.loads(record) if isinstance(record, str) else record)
+            except json.JSONDecodeError as error:
+                yield self._outcome(line, "invalid", error=f"not JSON: {error.msg}")
+                continue
+            except ValidationError as error:
+                yield self._outcome(line, "invalid", error=_validation_error(error))
+                continue
+
+            if user.email in seen_emails:
+                yield self._outcome(line, "duplicate", email=user.email, error="Email appears earlier in the input")
+                continue
+            seen_emails.add(user.email)
+
+            chunk.append((line, user))
+            if len(chunk) == chunk_size:
+                yield from self._create_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._create_chunk(chunk)
+
+    def _create_chunk(self, chunk: list[tuple[int, UserCreateRequestModel]]) -> Iterator[ProvisionedUserModel]:
+        registered = set(self.db.scalars(select(User.email).where(User.email.in_([user.email for _, user in chunk]))))
+        new = [(line, user) for line, user in chunk if user.email not in registered]
+        for line, user in chunk:
+            if user.email in registered:
+                yield self._outcome(line, "exists", email=user.email, error="Email already registered")
+        if not new:
+            return
+
+        passwords = [user.password for _, user in new]
+        hashes = list(_get_hash_pool().map(
+            get_password_hash, passwords, chunksize=max(1, len(passwords) // (HASH_WORKERS * 4))
+        ))
+
+        created = dict(self.db.execute(
+            insert(User)
+            .values([
+                {"username": user.username, "email": user.email, "hashed_password": hashed}
+                for (_, user), hashed in zip(new, hashes)
+            ])
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User.email, User.id)
+        ).all())
+        self.db.commit()
+
+        for line, user in new:
+            if user.email in created:
+                yield self._outcome(line, "created", email=user.email, id=created[user.email])
+            else:
+                yield self._outcome(line, "exists", email=user.email, error="Email already registered")
+
+    def _outcome(self, line: int, status: str, **fields) -> ProvisionedUserModel:
+        self.counts[status] += 1
+        return ProvisionedUserModel(line=line, status=status, **fields)
+
+    def summary(self) -> ProvisioningSummaryModel:
+        seconds = time.perf_counter() - self.started
+        return ProvisioningSummaryModel(
+            total=sum(self.counts.values()),
+            created=self.counts["created"],
+            exists=self.counts["exists"],
+            duplicate=self.counts["duplicate"],
+            invalid=self.counts["invalid"],
+            seconds=round(seconds, 3),
+            users_per_second=round(self.counts["created"] / seconds, 1) if seconds else 0.0,
+        )
@@ -1,51 +1,163 @@
 
+import base64
+import json
 from datetime import datetime, timezone
 from operator import or_
 from uuid import UUID
 from fastapi import HTTPException,status
+from app.db_errors import translate_integrity_errors
+from app.fields import sparse_rows
 from app.models import Order, User
-from app.schemas import ChangeRoleRequestModel, CreateUserResponseModel, GetOrderToUserResponseModel, GetUserResponseModel, UpdateUserRequestModel, UpdatedUserResponseModel, UserCreateRequestModel
-from sqlalchemy.orm import Session,joinedload
+from app.schemas import ChangeRoleRequestModel, CreateUserResponseModel, GetOrderToUserResponseModel, GetUserResponseModel, UpdateUserRequestModel, UpdatedUserResponseModel, UserBatchItemModel, UserCreateRequestModel, UserSearchRequest, UserSearchResult
+from sqlalchemy import asc, desc, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Query, Session,joinedload, load_only
 
+from app.services.token_service import TokenService
 from app.utils import get_password_hash  
+from app.tracing import traced_service
 
 
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _encode_cursor(sort_value, user_id: UUID) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, str(user_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str, sort_by: str):
+    try:
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_by == "created_at":
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, UUID(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@traced_service
 class UserService:
     def __init__(self, db: Session):
      self.db = db
 
     def create_user(self, user: UserCreateRequestModel) -> CreateUserResponseModel:
-        if self.db.query(User).filter(User.email == user.email).first():
+        # Bcrypt is the slow part, so a taken email is turned away before hashing.
+        # ix_users_email is unique, so one taken in the meantime inserts nothing.
+        if self.db.query(User.id).filter(User.email == user.email).first() is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Email already registered"
+                )
+        new_user = self.db.execute(
+            insert(User)
+            .values(
+                username=user.username,
+                email=user.email,
+                hashed_password=get_password_hash(user.password)
+            )
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
+        ).scalar()
+        if new_user is None:
+            self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Email already registered"
                 )
 
-        new_user = User(
-            username=user.username,
-            email=user.email,
-            hashed_password=get_password_hash(user.password)
-        )
-
-        
-        self.db.add(new_user)
+        response = CreateUserResponseModel.from_orm(new_user)
         self.db.commit()
-        self.db.refresh(new_user)
-        return CreateUserResponseModel.from_orm(new_user)
-        
-            
-            
-    def get_user_by_id(self, user_id: UUID) -> GetUserResponseModel:
-            user = self.db.query(User).filter(User.id == user_id).first()
+        return response
+
+    def get_user_by_id(self, user_id: UUID, fields: tuple[str, ...] | None = None) -> GetUserResponseModel:
+            user = self._query(fields).filter(User.id == user_id).first()
             if not user:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            if fields:
+                return sparse_rows([user], GetUserResponseModel, fields)[0]
             return GetUserResponseModel.from_orm(user)
         
         
             
-    def get_all_users(self) -> list[GetUserResponseModel]:
-            users = self.db.query(User).all()
+    def get_all_users(self, fields: tuple[str, ...] | None = None) -> list[GetUserResponseModel]:
+            users = self._query(fields).all()
+            if fields:
+                return sparse_rows(users, GetUserResponseModel, fields)
             return [GetUserResponseModel.from_orm(user) for user in users]
+
+    def _query(self, fields: tuple[str, ...] | None) -> Query:
+        # Only the requested columns are fetched (the primary key always is)
+        query = self.db.query(User)
+        if fields:
+            query = query.options(load_only(*(getattr(User, name) for name in fields)))
+        return query
+
+
+    def get_users_by_ids(self, user_ids: list[UUID]) -> list[UserBatchItemModel]:
+            users = {
+                user.id: GetUserResponseModel.from_orm(user)
+                for user in self.db.query(User).filter(User.id.in_(set(user_ids)))
+            }
+            return [
+                UserBatchItemModel(id=user_id, found=user_id in users, user=users.get(user_id))
+                for user_id in user_ids
+            ]
+
+
+    def search_users(self, search: UserSearchRequest) -> UserSearchResult:
+        query = self.db.query(User)
+
+        # Apply filters; each one is backed by an index (see app/migrations.py)
+        if search.email_prefix:
+            query = query.filter(
+                func.lower(User.email).like(_escape_like(search.email_prefix.lower()) + "%", escape="\\")
+            )
+        if search.username:
+            query = query.filter(User.username.ilike(f"%{_escape_like(search.username)}%", escape="\\"))
+        if search.is_admin is not None:
+            query = query.filter(User.is_admin == search.is_admin)
+        if search.is_active is not None:
+            query = query.filter(User.is_active == search.is_active)
+        if search.created_from is not None:
+            query = query.filter(User.created_at >= search.created_from)
+        if search.created_to is not None:
+            query = query.filter(User.created_at <= search.created_to)
+
+        estimated_total = self._estimate_count(query)
+
+        # Keyset pagination: continue after the (sort value, id) of the previous page
+        sort_column = getattr(User, search.sort_by)
+        descending = search.sort_order == "desc"
+        if search.cursor:
+            position = tuple_(sort_column, User.id)
+            last_position = _decode_cursor(search.cursor, search.sort_by)
+            query = query.filter(position < last_position if descending else position > last_position)
+
+        order = desc if descending else asc
+        users = query.order_by(order(sort_column), order(User.id)).limit(search.limit + 1).all()
+
+        next_cursor = None
+        if len(users) > search.limit:
+            users = users[:search.limit]
+            next_cursor = _encode_cursor(getattr(users[-1], search.sort_by), users[-1].id)
+
+        return UserSearchResult(
+            users=[GetUserResponseModel.from_orm(user) for user in users],
+            next_cursor=next_cursor,
+            estimated_total=estimated_total,
+        )
+
+    def _estimate_count(self, query: Query) -> int:
+        # The planner's row estimate avoids a COUNT(*) over millions of users
+        statement = query.statement.compile(dialect=self.db.get_bind().dialect)
+        plan = self.db.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", statement.params
+        ).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
         
      
      
@@ -59,17 +171,11 @@ class UserService:
             # Step 2: Update user data
             update_data = user_update.dict(exclude_unset=True)
 
-            # Check if the email is being updated and if it's unique
-            if 'email' in update_data:
-                email_exists = self.db.query(User).filter(User.email == update_data['email']).first()
-                if email_exists and email_exists.id != user_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT, detail="Email already registered"
-                    )
-
             # Step 3: Hash password if being updated
             if "password" in update_data:
                 db_user.hashed_password = get_password_hash(update_data.pop("password"))
+                # Sessions opened with the old password stop refreshing
+                TokenService(self.db).revoke_all_for_user(user_id)
 
             # Update other fields
             for field, value in update_data.items():
@@ -78,8 +184,11 @@ class UserService:
             # Step 4: Update the 'updated_at' timestamp
             db_user.updated_at = datetime.now(timezone.utc)
 
-            # Step 5: Commit changes to the database
-            self.db.commit()
+            # Step 5: Commit changes to the database; ix_users_email rejects taken emails
+            with translate_integrity_errors(self.db, {
+                "ix_users_email": (status.HTTP_409_CONFLICT, "Email already registered"),
+            }):
+                self.db.commit()
             self.db.refresh(db_user)
 
             # Step 6: Return updated user data
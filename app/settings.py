@@ -5,6 +5,122 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     SQLALCHEMY_DATABASE_URL: str
 
+    # JSON logs, written by a background thread (see app/logs.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01
+    LOG_DROP_REPORT_SECONDS: float = 60
+
+    # OpenTelemetry tracing (see app/tracing.py). TRACING_EXPORTER is "otlp", "console"
+    # or "file"; the sample ratio applies to traces that don't arrive with a sampled parent
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "otlp"
+    TRACING_FILE_PATH: str = "traces.ndjson"
+    TRACING_SAMPLE_RATIO: float = 0.01
+    TRACING_SERVICE_NAME: str = "orders-api"
+
+    # Prometheus metrics at /metrics (see app/metrics.py)
+    METRICS_ENABLED: bool = False
+
+    # Transactional outbox worker
+    OUTBOX_WORKER_ENABLED: bool = False
+    OUTBOX_WORKER_THREADS: int = 1
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_SINK_PATH: str | None = None
+
+    # Primary key generator per table, "uuid4" or "uuid7" (see app/ids.py). Overrides are
+    # keyed by table name and given as JSON, e.g. ID_GENERATOR_OVERRIDES='{"users": "uuid7"}',
+    # and are merged over the per-table defaults in app/ids.py rather than replacing them
+    ID_GENERATOR: str = "uuid4"
+    ID_GENERATOR_OVERRIDES: dict[str, str] = {}
+
+    # Order intake: "sync" places orders in the request, "async" queues them and
+    # answers 202 with a ticket (see app/jobs/order_intake_worker.py)
+    ORDER_INTAKE_MODE: str = "sync"
+    ORDER_INTAKE_WORKER_ENABLED: bool = False
+    ORDER_INTAKE_WORKER_THREADS: int = 2
+    ORDER_INTAKE_BATCH_SIZE: int = 50
+    ORDER_INTAKE_POLL_INTERVAL_SECONDS: float = 0.2
+    ORDER_INTAKE_MAX_ATTEMPTS: int = 3
+    # A ticket that fails unexpectedly is retried after this many seconds, doubled per attempt
+    ORDER_INTAKE_RETRY_SECONDS: float = 1.0
+    # A batch stops taking tickets after holding its product row locks this long
+    ORDER_INTAKE_MAX_LOCK_SECONDS: float = 0.25
+
+    # Per-process cache of immutable order data (line items, totals)
+    ORDER_SNAPSHOT_CACHE_SIZE: int = 10000
+
+    # Rebuild user_order_stats from orders (see app/jobs/reconcile_user_order_stats.py)
+    USER_STATS_RECONCILE_ENABLED: bool = False
+    USER_STATS_RECONCILE_INTERVAL_SECONDS: float = 24 * 60 * 60
+    USER_STATS_RECONCILE_BATCH_SIZE: int = 1000
+
+    # In-memory best-seller ranking behind /products/top (see app/ranking.py)
+    RANKING_ENABLED: bool = True
+    RANKING_REFRESH_SECONDS: float = 1.0
+    RANKING_RESYNC_SECONDS: float = 300.0
+    RANKING_MAX_TOP: int = 100
+
+    # Facets for /products/search?facets=true, cached per filter set until the catalog
+    # changes. Price breaks are the default histogram bucket boundaries
+    FACET_CACHE_SIZE: int = 1024
+    FACET_PRICE_BREAKS: list[float] = [10, 25, 50, 100, 250, 500]
+    FACET_MAX_PRICE_BREAKS: int = 50
+
+    # Product name autocomplete behind /products/suggest (see app/suggest.py)
+    SUGGEST_ENABLED: bool = True
+    SUGGEST_SYNC_SECONDS: float = 30.0
+    SUGGEST_MAX_WORDS: int = 4
+    SUGGEST_SCAN_LIMIT: int = 256
+    SUGGEST_MAX_LIMIT: int = 20
+    SUGGEST_POPULAR_SIZE: int = 10000
+    SUGGEST_CACHE_SIZE: int = 4096
+
+    # Login password checks run on BCRYPT_THREADS threads (one per CPU when unset)
+    # instead of on the event loop; checks beyond that wait in a queue
+    BCRYPT_THREADS: int | None = None
+
+    # Bulk user provisioning (POST /users/bulk, python -m app.jobs.provision_users).
+    # Passwords are hashed by PROVISION_HASH_WORKERS processes, one per CPU when unset;
+    # uploads larger than PROVISION_MAX_BYTES are refused with 413
+    PROVISION_CHUNK_SIZE: int = 1000
+    PROVISION_HASH_WORKERS: int | None = None
+    PROVISION_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Most ids accepted by one multi-get request (/products?ids=..., /orders?ids=..., /users?ids=...)
+    MULTI_GET_MAX_IDS: int = 100
+
+    # Monthly partitions of orders/order_products (see app/jobs/partitions.py)
+    PARTITION_MAINTENANCE_ENABLED: bool = False
+    PARTITION_MONTHS_AHEAD: int = 3
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_MONTHS: int = 12
+    ARCHIVE_MODE: str = "table"  # "table" moves to the archive schema, "ndjson" exports and drops
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_TABLESPACE: str | None = None
+
+    # Stock slices for hot products (see app/services/inventory_service.py)
+    INVENTORY_DEFAULT_SLICES: int = 16
+    INVENTORY_RESERVATION_TTL_SECONDS: int = 600
+    INVENTORY_FLUSH_ENABLED: bool = True
+    INVENTORY_FLUSH_INTERVAL_SECONDS: float = 1.0
+
+    # Refresh tokens
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+
+    # Live order events: "memory" (single worker) or "postgres" (LISTEN/NOTIFY across workers)
+    EVENTS_BACKEND: str = "memory"
+    EVENTS_QUEUE_SIZE: int = 64
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+
+    # Response compression (gzip, or brotli when installed)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
     class Config:
         env_file = ".env"  # Specify the .env file to load environment variables from
 
@@ -0,0 +1,221 @@
+# app/suggest.py
+#
+# Product name autocomplete for /products/suggest, from an in-memory prefix
+# index instead of an ilike scan per keystroke. Names are normalized (accents
+# stripped, case folded, whitespace collapsed) and stored in one sorted list
+# together with the tail starting at each later word, up to SUGGEST_MAX_WORDS,
+# so "jui" finds "Apple Juice". A prefix lookup is two bisects into that list.
+#
+# Matches are ranked by units sold over the last 7 days (from app/ranking.py),
+# then in index order. When a prefix matches more than SUGGEST_SCAN_LIMIT
+# entries ("a"), only the SUGGEST_POPULAR_SIZE best sellers are checked for
+# sales before filling up in index order, and the result is cached until the
+# index or the popularity changes.
+#
+# ProductService keeps the index current as products are created, renamed and
+# deleted in this process. The sync job rebuilds it when names_version (see
+# catalog_version in app/migrations.py) shows products were added, removed or
+# renamed by other workers, and refreshes popularity from the sales ranking.
+# Price and availability changes don't touch names_version.
+
+import bisect
+import heapq
+import operator
+import threading
+import unicodedata
+from typing import Iterable
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.cache import LRUCache
+from app.models import CatalogVersion, Product
+from app.ranking import sales_ranking
+from app.settings import settings
+
+# Sorts after any character a normalized name can contain
+_PREFIX_END = "\U0010ffff"
+
+
+def normalize(name: str) -> str:
+    if not name.isascii():
+        decomposed = unicodedata.normalize("NFKD", name)
+        name = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(name.casefold().split())
+
+
+def _keys(name: str, max_words: int) -> list[str]:
+    normalized = normalize(name)
+    if not normalized:
+        return []
+    keys = [normalized]
+    start = normalized.find(" ")
+    while start != -1 and len(keys) < max_words:
+        keys.append(normalized[start + 1:])
+        start = normalized.find(" ", start + 1)
+    return keys
+
+
+class ProductNameIndex:
+    def __init__(
+        self,
+        max_words: int = 4,
+        scan_limit: int = 256,
+        max_limit: int = 20,
+        popular_size: int = 10_000,
+        cache_size: int = 4096,
+    ):
+        self.max_words = max_words
+        self.scan_limit = scan_limit
+        self.max_limit = max_limit
+        self.popular_size = popular_size
+        self.names_version: int | None = None
+        self._keys: list[str] = []
+        self._ids: list[UUID] = []
+        self._names: dict[UUID, str] = {}
+        self._popularity: dict[UUID, int] = {}
+        # Best sellers first, with their normalized names after a space, so one
+        # substring test finds a prefix of any word
+        self._popular: list[tuple[UUID, str]] = []
+        self._ranked = LRUCache(cache_size)
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.names_version is not None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def suggest(self, query: str, limit: int) -> list[tuple[UUID, str]]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            low = bisect.bisect_left(self._keys, prefix)
+            high = bisect.bisect_left(self._keys, prefix + _PREFIX_END, low)
+            if high - low <= self.scan_limit:
+                ranked = self._rank(low, high, limit)
+            else:
+                ranked = self._ranked.get(prefix)
+                if ranked is None:
+                    ranked = self._rank_popular(prefix, low, high, self.max_limit)
+                    self._ranked.set(prefix, ranked)
+            return [(product_id, self._names[product_id]) for product_id in ranked[:limit]]
+
+    def _rank(self, low: int, high: int, limit: int) -> list[UUID]:
+        # A product can match through more than one of its words; the sort is
+        # stable, so products with equal sales stay in index order
+        matches = list(dict.fromkeys(self._ids[low:high]))
+        popularity = self._popularity
+        matches.sort(key=lambda product_id: -popularity.get(product_id, 0))
+        return matches[:limit]
+
+    def _rank_popular(self, prefix: str, low: int, high: int, limit: int) -> list[UUID]:
+        ranked = []
+        word_prefix = " " + prefix
+        for product_id, words in self._popular:
+            if word_prefix in words:
+                ranked.append(product_id)
+                if len(ranked) == limit:
+                    return ranked
+        chosen = set(ranked)
+        for position in range(low, high):
+            product_id = self._ids[position]
+            if product_id not in chosen:
+                chosen.add(product_id)
+                ranked.append(product_id)
+                if len(ranked) == limit:
+                    break
+        return ranked
+
+    def upsert(self, product_id: UUID, name: str) -> None:
+        with self._lock:
+            self._remove(product_id)
+            for key in _keys(name, self.max_words):
+                position = bisect.bisect_left(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, product_id)
+            self._names[product_id] = name
+            self._changed(product_id)
+
+    def remove(self, product_id: UUID) -> None:
+        with self._lock:
+            self._remove(product_id)
+            self._changed(product_id)
+
+    def _remove(self, product_id: UUID) -> None:
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        for key in _keys(name, self.max_words):
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == product_id:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+    def _changed(self, product_id: UUID) -> None:
+        if product_id in self._popularity:
+            self._refresh_popular()
+        self._ranked.clear()
+
+    def set_popularity(self, popularity: dict[UUID, int]) -> None:
+        with self._lock:
+            self._popularity = popularity
+            self._refresh_popular()
+            self._ranked.clear()
+
+    def _refresh_popular(self) -> None:
+        best_sellers = heapq.nlargest(self.popular_size, self._popularity.items(), key=operator.itemgetter(1))
+        self._popular = [
+            (product_id, " " + normalize(self._names[product_id]))
+            for product_id, _ in best_sellers
+            if product_id in self._names
+        ]
+
+    def load(self, db: Session) -> int:
+        # The version is read first, so a change committed during the load is picked up by the next sync
+        names_version = db.execute(select(CatalogVersion.names_version)).scalar()
+        rows = db.execute(select(Product.id, Product.name).execution_options(yield_per=50_000))
+        return self.rebuild(rows, names_version)
+
+    def rebuild(self, rows: Iterable[tuple[UUID, str]], names_version: int | None) -> int:
+        keys, ids, names = [], [], {}
+        for product_id, name in rows:
+            names[product_id] = name
+            for key in _keys(name, self.max_words):
+                keys.append(key)
+                ids.append(product_id)
+        # Sorting the keys alone and gathering both lists is much faster than sorting pairs
+        if len(keys) > 1:
+            gather = operator.itemgetter(*sorted(range(len(keys)), key=keys.__getitem__))
+            keys, ids = list(gather(keys)), list(gather(ids))
+        with self._lock:
+            self._keys, self._ids, self._names = keys, ids, names
+            self.names_version = names_version
+            self._refresh_popular()
+            self._ranked.clear()
+        return len(names)
+
+    def sync(self, db: Session) -> bool:
+        # Rebuilds only when product names changed since the last load
+        self.set_popularity(sales_ranking.totals("7d"))
+        if db.execute(select(CatalogVersion.names_version)).scalar() == self.names_version:
+            return False
+        self.load(db)
+        return True
+
+
+product_suggest = ProductNameIndex(
+    max_words=settings.SUGGEST_MAX_WORDS,
+    scan_limit=settings.SUGGEST_SCAN_LIMIT,
+    max_limit=settings.SUGGEST_MAX_LIMIT,
+    popular_size=settings.SUGGEST_POPULAR_SIZE,
+    cache_size=settings.SUGGEST_CACHE_SIZE,
+)
+
+
+def sync_product_suggest(db: Session) -> bool:
+    return product_suggest.sync(db)
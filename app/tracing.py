@@ -0,0 +1,185 @@
+# app/tracing.py
+#
+# OpenTelemetry tracing, off unless TRACING_ENABLED=true and opentelemetry-sdk
+# is installed. Each request gets a server span (continuing the caller's trace
+# from a W3C traceparent header), with child spans for service methods, bcrypt,
+# every SQL statement and each session commit.
+#
+# TRACING_SAMPLE_RATIO picks the share of new traces that are recorded; a
+# sampled-out request costs one non-recording span per step. Spans are exported
+# in batches by a background thread, either over OTLP (the standard
+# OTEL_EXPORTER_OTLP_* variables apply) or to a local NDJSON file or the console.
+#
+# When tracing is off, traced_service leaves classes untouched and span() is a
+# no-op, so nothing is added to the request path.
+
+import functools
+import inspect
+import sys
+from contextlib import nullcontext
+from typing import Iterable
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.settings import settings
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # optional dependency, tracing stays off without it
+    trace = None
+
+TRACING_ACTIVE = settings.TRACING_ENABLED and trace is not None
+
+tracer = trace.get_tracer("app") if TRACING_ACTIVE else None
+_provider = None
+
+
+def span(name: str, **attributes):
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def traced_service(cls=None, *, include: Iterable[str] = ()):
+    # Class decorator: one span per call of each public method (plus any in include)
+    def decorate(cls):
+        if tracer is None:
+            return cls
+        for name, method in list(vars(cls).items()):
+            if not inspect.isfunction(method) or (name.startswith("_") and name not in include):
+                continue
+            setattr(cls, name, _traced(f"{cls.__name__}.{name}", method))
+        return cls
+
+    return decorate(cls) if cls is not None else decorate
+
+
+def _traced(span_name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with tracer.start_as_current_span(span_name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def _exporter():
+    if settings.TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    # One JSON document per span and line, for reading traces offline
+    out = sys.stdout if settings.TRACING_EXPORTER == "console" else open(settings.TRACING_FILE_PATH, "a", encoding="utf-8")
+    return ConsoleSpanExporter(out=out, formatter=lambda finished: finished.to_json(indent=None) + "\n")
+
+
+def setup_tracing(engine: Engine) -> None:
+    global _provider
+    if not TRACING_ACTIVE or _provider is not None:
+        return
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(_provider)
+    _instrument_sql(engine)
+    _instrument_commits()
+
+
+def shutdown_tracing() -> None:
+    # Exports spans still buffered
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def _instrument_sql(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_statement_span(conn, cursor, statement, parameters, context, executemany):
+        if not trace.get_current_span().is_recording():
+            return
+        # The operation (SELECT, UPDATE, ...) names the span; the full text is an attribute
+        current = tracer.start_span(
+            f"SQL {statement.lstrip().split(None, 1)[0].upper()}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "postgresql", "db.statement": statement},
+        )
+        conn.info.setdefault("trace_spans", []).append(current)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_statement_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            current = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                current.set_attribute("db.rows", cursor.rowcount)
+            current.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _fail_statement_span(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            current = spans.pop()
+            current.set_status(Status(StatusCode.ERROR, str(context.original_exception)))
+            current.end()
+
+
+def _instrument_commits() -> None:
+    # Covers the flush plus the COMMIT itself
+    @event.listens_for(Session, "before_commit")
+    def _start_commit_span(session):
+        if trace.get_current_span().is_recording():
+            session.info["commit_span"] = tracer.start_span("Session.commit")
+
+    @event.listens_for(Session, "after_commit")
+    def _end_commit_span(session):
+        current = session.info.pop("commit_span", None)
+        if current is not None:
+            current.end()
+
+    @event.listens_for(Session, "after_rollback")
+    def _fail_commit_span(session):
+        current = session.info.pop("commit_span", None)
+        if current is not None:
+            current.set_status(Status(StatusCode.ERROR, "rolled back"))
+            current.end()
+
+
+class TracingMiddleware:
+    # Server span per request, named after the matched route template once routing has run
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if tracer is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = dict(Headers(scope=scope))
+        method = scope["method"]
+        with tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope["path"]},
+        ) as server_span:
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None and hasattr(route, "path"):
+                    server_span.update_name(f"{method} {route.path}")
+                    server_span.set_attribute("http.route", route.path)
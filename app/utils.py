@@ -1,19 +1,57 @@
 
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import jwt
 from passlib.context import CryptContext
 from app.settings import settings
+from app.metrics import BCRYPT_IN_PROGRESS, BCRYPT_WAITING
+from app.tracing import span
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_bcrypt_executor = ThreadPoolExecutor(settings.BCRYPT_THREADS or os.cpu_count() or 1, thread_name_prefix="bcrypt")
+
 ALGORITHM = "HS256"
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("bcrypt.verify"), BCRYPT_IN_PROGRESS.track_inprogress():
+        return pwd_context.verify(plain_password, hashed_password)
+
+
+async def run_bcrypt(function, *args):
+    # Runs verify_password or get_password_hash off the event loop, counting the
+    # calls that wait for a free bcrypt thread
+    waiting = [True]
+
+    def stop_waiting():
+        # list.pop is atomic, so exactly one of the two callers gets to decrement
+        try:
+            waiting.pop()
+        except IndexError:
+            return
+        BCRYPT_WAITING.dec()
+
+    def call():
+        stop_waiting()
+        return function(*args)
+
+    # run_in_executor doesn't carry contextvars over, so the bcrypt span would
+    # start a new trace and log lines would lose the request context
+    context = contextvars.copy_context()
+    BCRYPT_WAITING.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, context.run, call)
+    finally:
+        # Cancelled before a thread picked it up
+        stop_waiting()
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with span("bcrypt.hash"), BCRYPT_IN_PROGRESS.track_inprogress():
+        return pwd_context.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -0,0 +1,96 @@
+# benchmarks/bench_hot_sku.py
+#
+# Checkout throughput on a single product at 1, 8 and 64 concurrent clients,
+# once selling from the products row and once from stock slices (hot mode).
+# Each client is a thread with its own session calling OrderService.create_order.
+#
+#   python -m benchmarks.bench_hot_sku --seconds 10 --slices 64
+
+import argparse
+import threading
+import time
+from decimal import Decimal
+from uuid import uuid4
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Product, Status, User
+from app.schemas import CreateOrderProductRequestModel, CreateOrderRequestModel
+from app.services.inventory_service import InventoryService
+from app.services.order_service import OrderService
+from app.settings import settings
+
+CONCURRENCY_LEVELS = (1, 8, 64)
+
+# One pooled connection per client thread
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URL, pool_size=max(CONCURRENCY_LEVELS) + 2, max_overflow=0)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def setup(stock: int) -> tuple:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        if not db.query(Status).filter(Status.name == "Pending").first():
+            db.add(Status(name="Pending"))
+        user = User(username=f"bench-{uuid4().hex[:8]}", email=f"bench-{uuid4().hex[:8]}@example.com", hashed_password="-")
+        product = Product(name=f"bench-hot-sku-{uuid4().hex[:8]}", price=Decimal("9.99"), stock=stock)
+        db.add_all([user, product])
+        db.commit()
+        return user.id, product.id
+
+
+def run_clients(user_id, product_id, clients: int, seconds: float) -> tuple[int, int]:
+    request = CreateOrderRequestModel(products=[CreateOrderProductRequestModel(product_id=product_id, quantity=1)])
+    deadline = time.perf_counter() + seconds
+    counts = {"orders": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def client():
+        orders = errors = 0
+        with SessionLocal() as db:
+            order_service = OrderService(db)
+            while time.perf_counter() < deadline:
+                try:
+                    order_service.create_order(user_id, request)
+                    orders += 1
+                except HTTPException:
+                    db.rollback()
+                    errors += 1
+        with lock:
+            counts["orders"] += orders
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["orders"], counts["errors"]
+
+
+def main(seconds: float, slices: int, stock: int) -> None:
+    user_id, product_id = setup(stock)
+    print(f"{'mode':<10}{'clients':>8}{'orders/s':>12}{'errors':>8}")
+
+    for mode in ("row", "sliced"):
+        if mode == "sliced":
+            with SessionLocal() as db:
+                InventoryService(db).enable_hot_product(product_id, slices)
+
+        for clients in CONCURRENCY_LEVELS:
+            orders, errors = run_clients(user_id, product_id, clients, seconds)
+            print(f"{mode:<10}{clients:>8}{orders / seconds:>12.1f}{errors:>8}")
+
+    with SessionLocal() as db:
+        inventory_service = InventoryService(db)
+        inventory_service.flush()
+        inventory_service.disable_hot_product(product_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--slices", type=int, default=64)
+    parser.add_argument("--stock", type=int, default=10_000_000)
+    args = parser.parse_args()
+    main(args.seconds, args.slices, args.stock)
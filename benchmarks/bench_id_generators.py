@@ -0,0 +1,103 @@
+# benchmarks/bench_id_generators.py
+#
+# Insert throughput of uuid4 vs uuid7 primary keys as a table grows. Each
+# generator fills its own table in a scratch schema (bench_ids, dropped and
+# recreated on each run) of the database in SQLALCHEMY_DATABASE_URL, in
+# committed batches like checkout traffic. Reports rows/s per tenth of the
+# run, then WAL written, primary key index size and index blocks read from
+# disk. Once the index outgrows shared_buffers uuid4 slows down; uuid7 doesn't.
+#
+#   python -m benchmarks.bench_id_generators --rows 10000000 --batch-size 1000
+
+import argparse
+import io
+import time
+import uuid
+from sqlalchemy import create_engine, text
+from app.ids import uuid7
+from app.settings import settings
+
+SCHEMA = "bench_ids"
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def create_table(connection, name: str) -> None:
+    # Shaped like order_products: the key, two foreign key columns and a few values
+    connection.execute(text(f"""
+        CREATE TABLE {SCHEMA}.{name} (
+            id uuid PRIMARY KEY, order_id uuid NOT NULL, product_id uuid NOT NULL,
+            quantity int NOT NULL, line_total numeric(10, 2), created_at timestamp NOT NULL
+        )
+    """))
+
+
+def wal_position(cursor) -> int:
+    cursor.execute("SELECT pg_current_wal_lsn() - '0/0'")
+    return int(cursor.fetchone()[0])
+
+
+def fill(engine, name: str, generate, rows: int, batch_size: int) -> None:
+    product_ids = [uuid.uuid4() for _ in range(1000)]
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        wal_before = wal_position(cursor)
+        reported, inserted, segment_started = 0, 0, time.perf_counter()
+        started = segment_started
+        rates = []
+        while inserted < rows:
+            count = min(batch_size, rows - inserted)
+            buffer = io.StringIO()
+            order_id = generate()
+            for n in range(count):
+                if n % 3 == 0:
+                    order_id = generate()
+                buffer.write(f"{generate()}\t{order_id}\t{product_ids[n % 1000]}\t1\t9.99\t2025-01-01 00:00:00\n")
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {SCHEMA}.{name} FROM STDIN", buffer)
+            raw_connection.commit()
+            inserted += count
+
+            if inserted - reported >= rows // 10 or inserted == rows:
+                now = time.perf_counter()
+                rates.append((inserted - reported) / (now - segment_started))
+                reported, segment_started = inserted, now
+        elapsed = time.perf_counter() - started
+        wal_bytes = wal_position(cursor) - wal_before
+
+        cursor.execute(
+            "SELECT pg_relation_size(%s), idx_blks_read, idx_blks_hit FROM pg_statio_user_tables "
+            "WHERE schemaname = %s AND relname = %s",
+            (f"{SCHEMA}.{name}_pkey", SCHEMA, name),
+        )
+        index_bytes, blocks_read, blocks_hit = cursor.fetchone()
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+    print(f"\n{name}: {rows:,} rows in {elapsed:.0f}s ({rows / elapsed:,.0f} rows/s)")
+    print("  rows/s by tenth: " + "  ".join(f"{rate:,.0f}" for rate in rates))
+    print(f"  WAL {wal_bytes / 2**20:,.0f} MiB   pkey {index_bytes / 2**20:,.0f} MiB   "
+          f"index blocks read {blocks_read:,} / hit {blocks_hit:,}")
+
+
+def run(rows: int, batch_size: int) -> None:
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for name in GENERATORS:
+            create_table(connection, name)
+        shared_buffers = connection.execute(text("SHOW shared_buffers")).scalar()
+    print(f"shared_buffers = {shared_buffers}")
+
+    for name, generate in GENERATORS.items():
+        fill(engine, name, generate, rows, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.rows, args.batch_size)
@@ -0,0 +1,85 @@
+# benchmarks/bench_logging.py
+#
+# What one log call costs the request path. Compares writing JSON records
+# synchronously from the calling thread with the queue pipeline in app/logs.py,
+# once to a fast sink and once to a slow one (--sink-delay-us per write, like a
+# blocked stdout pipe or a busy disk), plus DEBUG calls that get sampled out and
+# calls below the log level. Needs no database.
+#
+#   python -m benchmarks.bench_logging --calls 100000 --sink-delay-us 200
+
+import argparse
+import io
+import logging
+import statistics
+import time
+from app.logs import ContextFilter, JsonFormatter, LogPipeline, _request_context
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, delay_seconds: float):
+        super().__init__()
+        self.delay_seconds = delay_seconds
+
+    def write(self, text: str) -> int:
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        return len(text)
+
+
+def measure(logger: logging.Logger, level: int, calls: int) -> tuple[float, float]:
+    samples = []
+    for n in range(calls):
+        started = time.perf_counter_ns()
+        logger.log(level, "order placed", extra={"order_id": n, "total_price": "19.99"})
+        samples.append(time.perf_counter_ns() - started)
+    return statistics.median(samples) / 1000, statistics.quantiles(samples, n=100)[98] / 1000
+
+
+def synchronous(stream) -> logging.Logger:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(ContextFilter())
+    logger = logging.getLogger("bench.sync")
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def run(calls: int, sink_delay_us: float, queue_size: int) -> None:
+    # Records carry a request context, as they would inside a request
+    _request_context.set({"request_id": "bench", "user_id": "bench-user", "route": "/api/v1/orders/"})
+    root = logging.getLogger()
+
+    print(f"{calls:,} calls per case, slow sink = {sink_delay_us:g} us per write\n")
+    print(f"{'case':<34}{'median':>10}{'p99':>12}{'dropped':>10}")
+    for sink_name, delay in (("fast sink", 0.0), ("slow sink", sink_delay_us / 1_000_000)):
+        median, p99 = measure(synchronous(SlowStream(delay)), logging.INFO, calls if not delay else calls // 20)
+        print(f"{'sync, ' + sink_name:<34}{median:>7.1f} us{p99:>9.1f} us{'-':>10}")
+
+        pipeline = LogPipeline(stream=SlowStream(delay), level="DEBUG", queue_size=queue_size, debug_sample_rate=0.01)
+        pipeline.start()
+        logger = logging.getLogger("bench.queued")
+        median, p99 = measure(logger, logging.INFO, calls)
+        print(f"{'queued, ' + sink_name:<34}{median:>7.1f} us{p99:>9.1f} us{pipeline.stats()['dropped']:>10,}")
+        pipeline.stop()
+
+    pipeline = LogPipeline(stream=SlowStream(0.0), level="DEBUG", queue_size=queue_size, debug_sample_rate=0.01)
+    pipeline.start()
+    median, p99 = measure(logging.getLogger("bench.queued"), logging.DEBUG, calls)
+    print(f"{'queued, DEBUG sampled at 1%':<34}{median:>7.1f} us{p99:>9.1f} us{pipeline.stats()['dropped']:>10,}")
+    pipeline.stop()
+
+    root.setLevel(logging.INFO)
+    median, p99 = measure(logging.getLogger("bench.queued"), logging.DEBUG, calls)
+    print(f"{'below LOG_LEVEL':<34}{median:>7.1f} us{p99:>9.1f} us{'-':>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--sink-delay-us", type=float, default=200)
+    parser.add_argument("--queue-size", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.calls, args.sink_delay_us, args.queue_size)
@@ -0,0 +1,111 @@
+# benchmarks/bench_optimistic_locking.py
+#
+# Read-modify-write under contention: version-checked UPDATEs with retries
+# (what Order/Product do through version_id_col) against SELECT ... FOR UPDATE.
+# Worker threads update random rows among --hot-rows; fewer rows means more
+# collisions. --think-ms is application work between the read and the write,
+# during which FOR UPDATE keeps the row locked. Uses a scratch schema
+# (bench_occ, dropped and recreated on each run) of the database in
+# SQLALCHEMY_DATABASE_URL.
+#
+#   python -m benchmarks.bench_optimistic_locking --workers 16 --hot-rows 1 10 100 1000
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from sqlalchemy import create_engine, text
+from app.settings import settings
+
+SCHEMA = "bench_occ"
+
+
+def pessimistic(connection, row_id: int, think: float) -> int:
+    with connection.begin():
+        price = connection.execute(
+            text(f"SELECT price FROM {SCHEMA}.items WHERE id = :id FOR UPDATE"), {"id": row_id}
+        ).scalar()
+        time.sleep(think)
+        connection.execute(
+            text(f"UPDATE {SCHEMA}.items SET price = :price WHERE id = :id"), {"id": row_id, "price": price + 1}
+        )
+    return 0
+
+
+def optimistic(connection, row_id: int, think: float) -> int:
+    retries = 0
+    while True:
+        with connection.begin():
+            row = connection.execute(
+                text(f"SELECT price, version FROM {SCHEMA}.items WHERE id = :id"), {"id": row_id}
+            ).one()
+            time.sleep(think)
+            updated = connection.execute(
+                text(
+                    f"UPDATE {SCHEMA}.items SET price = :price, version = version + 1 "
+                    "WHERE id = :id AND version = :version"
+                ),
+                {"id": row_id, "price": row.price + 1, "version": row.version},
+            ).rowcount
+        if updated:
+            return retries
+        retries += 1
+
+
+def run_mode(engine, strategy, workers: int, hot_rows: int, operations: int, think: float) -> tuple:
+    latencies, retries = [], [0]
+    lock = threading.Lock()
+
+    def worker() -> None:
+        local_latencies, local_retries = [], 0
+        with engine.connect() as connection:
+            for _ in range(operations):
+                started = time.perf_counter()
+                local_retries += strategy(connection, random.randrange(hot_rows), think)
+                local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            retries[0] += local_retries
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+    return len(latencies) / elapsed, retries[0] / len(latencies), p99
+
+
+def run(workers: int, hot_rows_options: list[int], operations: int, think_ms: float) -> None:
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URL, pool_size=workers, max_overflow=0)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.execute(text(f"CREATE TABLE {SCHEMA}.items (id int PRIMARY KEY, price int NOT NULL, version int NOT NULL)"))
+        connection.execute(text(
+            f"INSERT INTO {SCHEMA}.items SELECT n, 0, 1 FROM generate_series(0, :rows - 1) AS n"
+        ), {"rows": max(hot_rows_options)})
+
+    print(f"{workers} workers x {operations} updates, {think_ms:g} ms between read and write\n")
+    print(f"{'hot rows':>9}{'strategy':>14}{'updates/s':>12}{'retries/update':>16}{'p99':>12}")
+    for hot_rows in hot_rows_options:
+        for name, strategy in (("FOR UPDATE", pessimistic), ("version", optimistic)):
+            throughput, retry_rate, p99 = run_mode(engine, strategy, workers, hot_rows, operations, think_ms / 1000)
+            print(f"{hot_rows:>9}{name:>14}{throughput:>12,.0f}{retry_rate:>16.2f}{p99:>9.1f} ms")
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--hot-rows", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--operations", type=int, default=500, help="updates per worker")
+    parser.add_argument("--think-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    run(args.workers, args.hot_rows, args.operations, args.think_ms)
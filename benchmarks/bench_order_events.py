@@ -0,0 +1,86 @@
+# benchmarks/bench_order_events.py
+#
+# How many push subscribers one worker can hold: memory per subscriber (queue
+# plus the task serving it) and time to fan an event out to all of them, using
+# the same EventBroker the SSE/WebSocket endpoints use. Needs no database.
+#
+#   python -m benchmarks.bench_order_events --subscribers 1000 10000 50000
+
+import argparse
+import asyncio
+import resource
+import time
+import tracemalloc
+from collections import Counter
+from uuid import uuid4
+from app.events import EventBroker
+
+# Event counts per round: one order all subscribers follow, then many small ones
+HOT_EVENTS = 10
+SPREAD_EVENTS = 1000
+
+
+async def consumer(subscription, received: list[int], done: asyncio.Event, expected: int) -> None:
+    while True:
+        event = await subscription.get()
+        if event is None:
+            return
+        received[0] += 1
+        if received[0] == expected:
+            done.set()
+
+
+async def run(subscribers: int, queue_size: int) -> None:
+    broker = EventBroker(queue_size)
+    broker.start(asyncio.get_running_loop())
+    hot_order, hot_user = uuid4(), uuid4()
+    users = [uuid4() for _ in range(max(1, subscribers // 10))]
+    followers = Counter(n % len(users) for n in range(subscribers))
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    received, done = [0], asyncio.Event()
+    tasks = []
+    for n in range(subscribers):
+        subscription = broker.subscribe([f"order:{hot_order}", f"user:{users[n % len(users)]}"])
+        tasks.append(asyncio.create_task(consumer(subscription, received, done, subscribers * HOT_EVENTS)))
+    await asyncio.sleep(0)
+    allocated = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+
+    # Every subscriber follows the hot order
+    started = time.perf_counter()
+    for _ in range(HOT_EVENTS):
+        broker.publish({"type": "order.status_changed", "order_id": str(hot_order), "user_id": str(hot_user)})
+        await asyncio.sleep(0)
+    await done.wait()
+    hot_ms = (time.perf_counter() - started) * 1000 / HOT_EVENTS
+
+    # Events for individual users reach about ten subscribers each
+    started = time.perf_counter()
+    for n in range(SPREAD_EVENTS):
+        broker.publish({"type": "order.status_changed", "order_id": str(uuid4()), "user_id": str(users[n % len(users)])})
+    expected = subscribers * HOT_EVENTS + sum(followers[n % len(users)] for n in range(SPREAD_EVENTS))
+    while broker.delivered < expected:
+        await asyncio.sleep(0.001)
+    spread_us = (time.perf_counter() - started) * 1_000_000 / SPREAD_EVENTS
+
+    broker.close()
+    await asyncio.gather(*tasks)
+    print(f"{subscribers:>12,}{allocated / subscribers:>14,.0f} B{hot_ms:>16.2f} ms{spread_us:>16.1f} us{broker.overflows:>10}")
+
+
+def main(subscriber_counts: list[int], queue_size: int) -> None:
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    print(f"open file limit: {soft_limit:,} (each SSE/WebSocket client holds one socket)\n")
+    print(f"{'subscribers':>12}{'memory/sub':>16}{'fan-out to all':>19}{'per user event':>19}{'overflows':>10}")
+    for subscribers in subscriber_counts:
+        asyncio.run(run(subscribers, queue_size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--queue-size", type=int, default=64)
+    args = parser.parse_args()
+    main(args.subscribers, args.queue_size)
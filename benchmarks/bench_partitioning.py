@@ -0,0 +1,156 @@
+# benchmarks/bench_partitioning.py
+#
+# Compares plain and monthly-partitioned orders/order_products tables at scale.
+# Data goes into two scratch schemas (bench_plain, bench_partitioned) of the
+# database in SQLALCHEMY_DATABASE_URL, which are dropped and recreated on each run.
+#
+#   python -m benchmarks.bench_partitioning --order-lines 50000000 --months 24
+
+import argparse
+import statistics
+import time
+from datetime import date
+from sqlalchemy import create_engine, text
+from app.settings import settings
+
+SCHEMAS = ("bench_plain", "bench_partitioned")
+LINES_PER_ORDER = 3
+
+
+def _month(start: date, offset: int) -> date:
+    index = start.year * 12 + start.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_schema(connection, schema: str, months: int, first_month: date) -> None:
+    partitioned = schema == "bench_partitioned"
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    connection.execute(text(f"CREATE SCHEMA {schema}"))
+
+    partition_clause = " PARTITION BY RANGE (created_at)" if partitioned else ""
+    orders_key = "PRIMARY KEY (id, created_at)" if partitioned else "PRIMARY KEY (id)"
+    connection.execute(text(f"""
+        CREATE TABLE {schema}.orders (
+            id uuid NOT NULL, user_id uuid NOT NULL, status_id int NOT NULL,
+            total_price numeric(10, 2), created_at timestamp NOT NULL, {orders_key}
+        ){partition_clause}
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE {schema}.order_products (
+            id uuid NOT NULL, order_id uuid NOT NULL, product_id int NOT NULL, quantity int,
+            unit_price numeric(10, 2), line_total numeric(10, 2), created_at timestamp NOT NULL,
+            {orders_key}
+        ){partition_clause}
+    """))
+
+    if partitioned:
+        for offset in range(months + 1):
+            start, end = _month(first_month, offset), _month(first_month, offset + 1)
+            for table in ("orders", "order_products"):
+                connection.execute(text(
+                    f"CREATE TABLE {schema}.{table}_p{start:%Y_%m} PARTITION OF {schema}.{table} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+
+
+def load(connection, schema: str, orders: int, months: int, first_month: date) -> None:
+    # Orders spread evenly over the months; every order gets LINES_PER_ORDER lines
+    connection.execute(text(f"""
+        INSERT INTO {schema}.orders
+        SELECT md5(n::text)::uuid, md5((n % 100000)::text)::uuid, n % 4, 10 + n % 500,
+               timestamp '{first_month}' + (n::float / :orders) * (interval '1 month' * :months)
+        FROM generate_series(1, :orders) AS n
+    """), {"orders": orders, "months": months})
+    connection.execute(text(f"""
+        INSERT INTO {schema}.order_products
+        SELECT md5(o.id::text || l)::uuid, o.id, (abs(hashtext(o.id::text)) + l) % 50000, 1 + l,
+               5, 5 * (1 + l), o.created_at
+        FROM {schema}.orders AS o, generate_series(1, {LINES_PER_ORDER}) AS l
+    """))
+    connection.execute(text(f"CREATE INDEX ON {schema}.orders (user_id)"))
+    connection.execute(text(f"CREATE INDEX ON {schema}.orders (status_id)"))
+    connection.execute(text(f"CREATE INDEX ON {schema}.order_products (order_id)"))
+    connection.execute(text(f"CREATE INDEX ON {schema}.order_products (product_id)"))
+    connection.execute(text(f"ANALYZE {schema}.orders"))
+    connection.execute(text(f"ANALYZE {schema}.order_products"))
+
+
+def time_query(connection, sql: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(text(sql), params).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(order_lines: int, months: int, repeat: int) -> None:
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+    orders = order_lines // LINES_PER_ORDER
+    first_month = _month(date.today().replace(day=1), -months + 1)
+    recent = _month(first_month, months - 1)
+
+    with engine.connect() as connection:
+        for schema in SCHEMAS:
+            started = time.perf_counter()
+            with connection.begin():
+                create_schema(connection, schema, months, first_month)
+                load(connection, schema, orders, months, first_month)
+            print(f"{schema}: loaded {orders:,} orders / {orders * LINES_PER_ORDER:,} lines "
+                  f"in {time.perf_counter() - started:.0f}s")
+
+        row = connection.execute(text(
+            "SELECT id, created_at FROM bench_plain.orders ORDER BY created_at DESC LIMIT 1"
+        )).one()
+        sample = {"order_id": row.id, "created_at": row.created_at, "recent": recent}
+
+        queries = {
+            "order lines (pruned)": (
+                "SELECT product_id, quantity, unit_price FROM {schema}.order_products "
+                "WHERE order_id = :order_id AND created_at >= :created_at"
+            ),
+            "recent revenue by product": (
+                "SELECT product_id, sum(line_total) FROM {schema}.order_products "
+                "WHERE created_at >= :recent GROUP BY product_id"
+            ),
+            "recent orders by status": (
+                "SELECT status_id, count(*) FROM {schema}.orders "
+                "WHERE created_at >= :recent GROUP BY status_id"
+            ),
+        }
+
+        print(f"\n{'query':<28}" + "".join(f"{schema:>20}" for schema in SCHEMAS))
+        for name, sql in queries.items():
+            timings = [time_query(connection, sql.format(schema=schema), sample, repeat) for schema in SCHEMAS]
+            print(f"{name:<28}" + "".join(f"{timing:>17.2f} ms" for timing in timings))
+
+        connection.rollback()
+
+        # Archiving the oldest month: DELETE on the plain table vs DETACH on the partitioned one
+        oldest, next_month = first_month, _month(first_month, 1)
+        with connection.begin():
+            started = time.perf_counter()
+            connection.execute(text(
+                "DELETE FROM bench_plain.order_products WHERE created_at >= :start AND created_at < :end"
+            ), {"start": oldest, "end": next_month})
+            connection.execute(text(
+                "DELETE FROM bench_plain.orders WHERE created_at >= :start AND created_at < :end"
+            ), {"start": oldest, "end": next_month})
+            delete_ms = (time.perf_counter() - started) * 1000
+        with connection.begin():
+            started = time.perf_counter()
+            for table in ("order_products", "orders"):
+                connection.execute(text(
+                    f"ALTER TABLE bench_partitioned.{table} DETACH PARTITION bench_partitioned.{table}_p{oldest:%Y_%m}"
+                ))
+            detach_ms = (time.perf_counter() - started) * 1000
+        print(f"{'archive oldest month':<28}{delete_ms:>17.2f} ms{detach_ms:>17.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--order-lines", type=int, default=50_000_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.order_lines, args.months, args.repeat)
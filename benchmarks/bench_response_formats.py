@@ -0,0 +1,91 @@
+# benchmarks/bench_response_formats.py
+#
+# Bytes on the wire and encode time per 10k product rows for JSON, MessagePack
+# and Arrow IPC, each uncompressed and with gzip / brotli. Needs no database.
+#
+#   python -m benchmarks.bench_response_formats --rows 10000
+
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+from fastapi.encoders import jsonable_encoder
+from app.api import negotiation
+from app.api.negotiation import encode_arrow, encode_msgpack
+from app.schemas import GetProductResponseModel
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_rows(count: int) -> list[GetProductResponseModel]:
+    now = datetime.utcnow()
+    return [
+        GetProductResponseModel(
+            id=uuid4(),
+            name=f"Product {n} {random.choice(['red', 'blue', 'green'])}",
+            price=Decimal(random.randint(100, 99_999)) / 100,
+            stock=random.randint(0, 5000),
+            isAvailable=True,
+            created_at=now - timedelta(minutes=n),
+            updated_at=None if n % 3 else now,
+        )
+        for n in range(count)
+    ]
+
+
+def encode_json(rows, row_model) -> bytes:
+    # What the routes' default response path does
+    return json.dumps(jsonable_encoder(rows)).encode()
+
+
+def time_encoder(encoder, rows, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encoder(rows, GetProductResponseModel)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), body
+
+
+def main(rows: int, repeat: int) -> None:
+    data = make_rows(rows)
+    formats = {"json": encode_json}
+    if negotiation.msgpack is not None:
+        formats["msgpack"] = encode_msgpack
+    if negotiation.pyarrow is not None:
+        formats["arrow"] = encode_arrow
+
+    compressors = {"gzip": lambda body: gzip.compress(body, 6)}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=4)
+
+    scale = 10_000 / rows
+    header = f"{'format':<10}{'bytes':>12}{'encode':>12}"
+    header += "".join(f"{name + ' bytes':>14}{name:>12}" for name in compressors)
+    print(f"per 10k rows ({rows:,} encoded, median of {repeat})\n{header}")
+
+    for name, encoder in formats.items():
+        encode_ms, body = time_encoder(encoder, data, repeat)
+        line = f"{name:<10}{len(body) * scale:>12,.0f}{encode_ms * scale:>9.2f} ms"
+        for compress in compressors.values():
+            started = time.perf_counter()
+            compressed = compress(body)
+            compress_ms = (time.perf_counter() - started) * 1000
+            line += f"{len(compressed) * scale:>14,.0f}{compress_ms * scale:>9.2f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
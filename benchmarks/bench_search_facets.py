@@ -0,0 +1,99 @@
+# benchmarks/bench_search_facets.py
+#
+# Building a search sidebar (availability counts, price range, price histogram)
+# the way the catalog UI did, with one filtered count per facet value, against
+# /products/search?facets=true: one GROUPING SETS query, then the facet cache
+# until the catalog changes. Loads --products rows named with a random tag into
+# the database in SQLALCHEMY_DATABASE_URL and deletes them afterwards.
+#
+#   python -m benchmarks.bench_search_facets --products 200000
+
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+from uuid import uuid4
+from sqlalchemy import delete, func
+from app.connection_to_db import SessionLocal
+from app.models import Product
+from app.schemas import SearchRequest
+from app.services.product_service import ProductService, facet_cache, parse_price_breaks
+
+BATCH = 10_000
+REPEATS = 20
+
+
+def load(count: int, tag: str) -> None:
+    with SessionLocal() as db:
+        for start in range(0, count, BATCH):
+            db.bulk_insert_mappings(Product, [
+                {
+                    "name": f"{tag}-{n}",
+                    "price": Decimal(random.randint(100, 100_000)) / 100,
+                    "stock": random.randint(0, 100),
+                    "isAvailable": random.random() < 0.8,
+                }
+                for n in range(start, min(start + BATCH, count))
+            ])
+            db.commit()
+
+
+def separate_queries(service: ProductService, search: SearchRequest, breaks: tuple[Decimal, ...]) -> None:
+    # One count per availability value and price bucket, plus min/max
+    query = service.db.query(Product).filter(*service._search_filters(search))
+    for available in (True, False):
+        query.filter(Product.isAvailable == available).count()
+    service.db.query(func.min(Product.price), func.max(Product.price)).filter(*service._search_filters(search)).one()
+    bounds = (None, *breaks, None)
+    for low, high in zip(bounds, bounds[1:]):
+        bucket = query
+        if low is not None:
+            bucket = bucket.filter(Product.price >= low)
+        if high is not None:
+            bucket = bucket.filter(Product.price < high)
+        bucket.count()
+
+
+def timed(call) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def run(product_count: int) -> None:
+    tag = uuid4().hex[:8]
+    print(f"loading {product_count:,} products ...")
+    load(product_count, tag)
+    breaks = parse_price_breaks(None)
+    search = SearchRequest(name=tag)
+    try:
+        with SessionLocal() as db:
+            service = ProductService(db)
+            separate_ms = timed(lambda: separate_queries(service, search, breaks))
+
+            def uncached():
+                facet_cache.clear()
+                service._search_facets(search, breaks)
+
+            grouped_ms = timed(uncached)
+            cached_ms = timed(lambda: service._search_facets(search, breaks))
+
+        print(f"\n{len(breaks) + 1} price buckets, filter name ~ '{tag}'")
+        print(f"{'separate counts':<28}{separate_ms:>10.2f} ms")
+        print(f"{'one GROUPING SETS query':<28}{grouped_ms:>10.2f} ms")
+        print(f"{'facet cache hit':<28}{cached_ms:>10.2f} ms")
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(Product).where(Product.name.like(f"{tag}-%")))
+            db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200_000)
+    args = parser.parse_args()
+    run(args.products)
@@ -0,0 +1,72 @@
+# benchmarks/bench_suggest.py
+#
+# Autocomplete over a large catalog: how long ProductNameIndex takes to build
+# (what the startup load does after reading the rows), and how long one
+# /products/suggest lookup takes as the user types, against scanning every name
+# for a substring the way ilike '%x%' does. Synthetic names, no database needed.
+#
+#   python -m benchmarks.bench_suggest --products 1000000
+
+import argparse
+import random
+import statistics
+import time
+from uuid import uuid4
+from app.suggest import ProductNameIndex, normalize
+
+WORDS = (
+    "apple banana cherry organic fresh juice smoothie yogurt greek whole milk oat almond butter bread "
+    "sourdough rye pasta penne fusilli tomato basil pesto olive oil extra virgin coffee espresso decaf "
+    "green tea chai dark chocolate sea salt caramel vanilla bean honey maple syrup granola crunchy"
+).split()
+QUERIES = 500
+
+
+def synthetic_names(count: int) -> list[tuple]:
+    return [(uuid4(), " ".join(random.choices(WORDS, k=random.randint(2, 5))) + f" {n}") for n in range(count)]
+
+
+def percentiles(samples: list[float]) -> tuple[float, float]:
+    return statistics.median(samples) * 1_000_000, statistics.quantiles(samples, n=100)[98] * 1_000_000
+
+
+def run(product_count: int, limit: int) -> None:
+    random.seed(7)
+    rows = synthetic_names(product_count)
+    index = ProductNameIndex()
+    started = time.perf_counter()
+    index.rebuild(rows, names_version=1)
+    print(f"built index of {product_count:,} products ({len(index._keys):,} keys) in {time.perf_counter() - started:.1f} s")
+    index.set_popularity({product_id: random.randint(1, 1000) for product_id, _ in random.sample(rows, product_count // 10)})
+
+    # What a user types: growing prefixes of a real name
+    typed = []
+    for _, name in random.sample(rows, QUERIES // 5):
+        typed.extend(name[:length] for length in range(1, 6))
+
+    print(f"\n{'prefix length':<16}{'median':>12}{'p99':>12}")
+    for length in range(1, 6):
+        samples = []
+        for query in (query for query in typed if len(query) == length):
+            started = time.perf_counter()
+            index.suggest(query, limit)
+            samples.append(time.perf_counter() - started)
+        median, p99 = percentiles(samples)
+        print(f"{length:<16}{median:>9.1f} us{p99:>9.1f} us")
+
+    normalized = [normalize(name) for _, name in rows]
+    samples = []
+    for query in typed[:20]:
+        started = time.perf_counter()
+        needle = normalize(query)
+        [name for name in normalized if needle in name][:limit]
+        samples.append(time.perf_counter() - started)
+    print(f"\nsubstring scan, median {statistics.median(samples) * 1000:,.1f} ms per keystroke")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    run(args.products, args.limit)
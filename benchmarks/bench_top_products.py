@@ -0,0 +1,94 @@
+# benchmarks/bench_top_products.py
+#
+# Cost of answering "top products in the last 24h" as order volume grows:
+# SalesRanking.top() (what /products/top serves) against aggregating every
+# order line in the window on each request, which is what a GROUP BY over
+# order_products does. Synthetic orders, no database needed.
+#
+#   python -m benchmarks.bench_top_products --orders 10000 100000 1000000
+
+import argparse
+import heapq
+import random
+import statistics
+import time
+from collections import Counter
+from uuid import uuid4
+from app.ranking import SalesRanking
+
+WINDOW_SECONDS = 24 * 60 * 60
+READS = 200
+
+
+def synthetic_orders(count: int, products: list, now: float) -> list[tuple[float, list]]:
+    # Skewed popularity: a few products sell far more than the rest
+    weights = [1 / (rank + 1) for rank in range(len(products))]
+    orders = []
+    for _ in range(count):
+        # Within the last 23h so every order is inside the 24h window's whole-hour buckets
+        at = now - random.random() * (WINDOW_SECONDS - 60 * 60)
+        lines = random.choices(products, weights, k=random.randint(1, 3))
+        orders.append((at, [(product_id, random.randint(1, 5)) for product_id in lines]))
+    return orders
+
+
+def naive_top(orders: list[tuple[float, list]], since: float, limit: int) -> list:
+    totals = Counter()
+    for at, lines in orders:
+        if at >= since:
+            for product_id, units in lines:
+                totals[product_id] += units
+    return heapq.nlargest(limit, totals.items(), key=lambda item: item[1])
+
+
+def timed(call, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1_000_000
+
+
+def run(order_count: int, product_count: int, limit: int) -> None:
+    now = time.time()
+    products = [uuid4() for _ in range(product_count)]
+    orders = synthetic_orders(order_count, products, now)
+
+    # refresh_seconds=0 rebuilds the list after every write: the worst case
+    ranking = SalesRanking(refresh_seconds=0, max_top=100)
+    started = time.perf_counter()
+    for at, lines in orders:
+        ranking.record(lines, at, now=now)
+    record_us = (time.perf_counter() - started) * 1_000_000 / order_count
+    ranked = [units for _, units in ranking.top("24h", limit, now=now)]
+    if ranked != [units for _, units in naive_top(orders, now - WINDOW_SECONDS, limit)]:
+        print("  warning: ranking and full aggregation disagree")
+
+    cached_us = timed(lambda: ranking.top("24h", limit, now=now), READS)
+
+    def write_then_read():
+        ranking.record([(random.choice(products), 1)], now, now=now)
+        ranking.top("24h", limit, now=now)
+
+    refreshed_us = timed(write_then_read, READS)
+    naive_us = timed(lambda: naive_top(orders, now - WINDOW_SECONDS, limit), max(3, READS // max(1, order_count // 10_000)))
+
+    print(f"{order_count:>12,}{record_us:>12.1f} us{cached_us:>14.1f} us{refreshed_us:>16.1f} us{naive_us / 1000:>16.1f} ms")
+
+
+def main(order_counts: list[int], product_count: int, limit: int) -> None:
+    random.seed(42)
+    print(f"{product_count:,} products, top {limit} over 24h (medians)\n")
+    print(f"{'orders':>12}{'record/order':>15}{'top() cached':>17}{'top() rebuilt':>19}{'full aggregation':>19}")
+    for order_count in order_counts:
+        run(order_count, product_count, limit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    main(args.orders, args.products, args.limit)
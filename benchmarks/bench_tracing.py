@@ -0,0 +1,83 @@
+# benchmarks/bench_tracing.py
+#
+# What tracing costs in throughput. Runs the soak workload (catalog reads,
+# checkouts, order reads and cancellations) in-process with TestClient, once
+# with tracing off and once per --ratios sample ratio, each in a fresh process
+# since tracing is configured at import. Spans go to a file exporter in a temp
+# directory, so no collector is needed. Uses the database in
+# SQLALCHEMY_DATABASE_URL.
+#
+#   python -m benchmarks.bench_tracing --requests 5000 --ratios 0.01 0.1 1
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child(requests: int, warmup: int) -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from benchmarks.soak import Workload, setup
+
+    random.seed(7)
+    user_id, product_ids, tag, token = setup(1)
+    with TestClient(app) as client:
+        workload = Workload(client, user_id, product_ids, tag, token)
+        for _ in range(warmup):
+            workload.step()
+        started = time.perf_counter()
+        for _ in range(requests):
+            workload.step()
+        elapsed = time.perf_counter() - started
+    print(json.dumps({"requests_per_second": requests / elapsed}))
+
+
+def measure(requests: int, warmup: int, ratio: float | None, trace_dir: str) -> tuple[float, int]:
+    env = dict(os.environ, TRACING_ENABLED=str(ratio is not None).lower())
+    trace_file = os.path.join(trace_dir, f"traces-{ratio}.ndjson")
+    if os.path.exists(trace_file):
+        os.remove(trace_file)
+    if ratio is not None:
+        env.update(TRACING_EXPORTER="file", TRACING_FILE_PATH=trace_file, TRACING_SAMPLE_RATIO=str(ratio))
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_tracing", "--child", "--requests", str(requests), "--warmup", str(warmup)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    spans = 0
+    if os.path.exists(trace_file):
+        with open(trace_file, encoding="utf-8") as f:
+            spans = sum(1 for _ in f)
+    return result["requests_per_second"], spans
+
+
+def run(requests: int, warmup: int, ratios: list[float], rounds: int) -> None:
+    with tempfile.TemporaryDirectory() as trace_dir:
+        print(f"{requests:,} requests per run, best of {rounds}\n")
+        print(f"{'tracing':<16}{'req/s':>10}{'overhead':>11}{'spans':>10}")
+        baseline = None
+        for ratio in [None, *ratios]:
+            # Best of several runs, to keep noise from swamping a ~1% difference
+            best, spans = max(measure(requests, warmup, ratio, trace_dir) for _ in range(rounds))
+            label = "off" if ratio is None else f"ratio {ratio:g}"
+            baseline = baseline or best
+            print(f"{label:<16}{best:>10,.0f}{(baseline - best) / baseline:>10.1%}{spans:>10,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.01, 0.1, 1.0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests, args.warmup)
+    else:
+        run(args.requests, args.warmup, args.ratios, args.rounds)
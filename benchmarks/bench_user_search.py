@@ -0,0 +1,91 @@
+# benchmarks/bench_user_search.py
+#
+# Admin user search latency at scale. Users are loaded into a scratch schema
+# (bench_users) with the same table and indexes as public.users, so run the
+# app once first to apply app/migrations.py.
+#
+#   python -m benchmarks.bench_user_search --users 5000000
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.schemas import UserSearchRequest
+from app.services.user_service import UserService
+from app.settings import settings
+
+SCHEMA = "bench_users"
+
+
+def load(engine, users: int) -> None:
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.execute(text(f"CREATE TABLE {SCHEMA}.users (LIKE public.users INCLUDING ALL)"))
+        connection.execute(text(f"""
+            INSERT INTO {SCHEMA}.users (id, username, email, hashed_password, is_admin, is_active, created_at)
+            SELECT md5(n::text)::uuid, 'user_' || n || '_' || substr(md5(n::text), 1, 6),
+                   'user' || n || '@example' || (n % 100) || '.com', 'x',
+                   n % 1000 = 0, n % 10 <> 0, now() - n * interval '10 seconds'
+            FROM generate_series(1, :users) AS n
+        """), {"users": users})
+        connection.execute(text(f"ANALYZE {SCHEMA}.users"))
+
+
+def time_search(session_factory, search: UserSearchRequest, repeat: int) -> tuple[float, int, int]:
+    timings = []
+    for _ in range(repeat):
+        with session_factory() as db:
+            started = time.perf_counter()
+            result = UserService(db).search_users(search)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(result.users), result.estimated_total
+
+
+def main(users: int, repeat: int) -> None:
+    # Point the app's queries at the scratch schema
+    engine = create_engine(
+        settings.SQLALCHEMY_DATABASE_URL,
+        connect_args={"options": f"-csearch_path={SCHEMA},public"},
+    )
+    started = time.perf_counter()
+    load(engine, users)
+    print(f"Loaded {users:,} users in {time.perf_counter() - started:.0f}s\n")
+
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    searches = {
+        "email prefix": UserSearchRequest(email_prefix="user12345"),
+        "username substring": UserSearchRequest(username="a1b2"),
+        "admins, newest first": UserSearchRequest(is_admin=True),
+        "inactive in last day": UserSearchRequest(
+            is_active=False, created_from=datetime.now() - timedelta(days=1)
+        ),
+        "sorted by email": UserSearchRequest(sort_by="email", sort_order="asc"),
+    }
+
+    print(f"{'search':<24}{'median':>12}{'rows':>8}{'estimate':>12}")
+    for name, search in searches.items():
+        median, rows, estimate = time_search(session_factory, search, repeat)
+        print(f"{name:<24}{median:>9.2f} ms{rows:>8}{estimate:>12,}")
+
+    # Deep pagination stays flat with keyset cursors
+    with session_factory() as db:
+        service = UserService(db)
+        search = UserSearchRequest(limit=500)
+        page_timings = []
+        for _ in range(100):
+            started = time.perf_counter()
+            result = service.search_users(search)
+            page_timings.append((time.perf_counter() - started) * 1000)
+            search = search.copy(update={"cursor": result.next_cursor})
+    print(f"\npage 1 vs page 100 (500 rows each): {page_timings[0]:.2f} ms / {page_timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.users, args.repeat)
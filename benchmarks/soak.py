@@ -0,0 +1,217 @@
+# benchmarks/soak.py
+#
+# Soak test for memory growth in a long-running API worker. Drives a mixed
+# workload (catalog reads, checkouts, order reads and cancellations) through
+# the app in-process with TestClient, for as long as --minutes says, against
+# the database in SQLALCHEMY_DATABASE_URL.
+#
+# Every --report-seconds it prints the tracemalloc allocation sites that grew
+# since the previous report, along with live ORM sessions, identity map sizes,
+# mapped objects, pydantic models and checked-out connections. At the end it
+# prints what each endpoint allocates per request. The run fails (exit 1) if
+# memory retained per request after warm-up exceeds --budget-bytes, or if
+# sessions or connections are left open once the workload stops. The warm-up
+# should be long enough to fill the bounded caches (order snapshots, ranking).
+#
+#   python -m benchmarks.soak --minutes 240 --budget-bytes 256
+
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.connection_to_db import SessionLocal, engine
+from app.main import app
+from app.models import Product, Status, User
+from app.utils import create_access_token
+
+PRODUCTS = 200
+TOP_SITES = 15
+
+
+def setup(hours: float) -> tuple:
+    with SessionLocal() as db:
+        for name in ("Pending", "Canceled"):
+            if not db.query(Status).filter(Status.name == name).first():
+                db.add(Status(name=name))
+        tag = uuid4().hex[:8]
+        user = User(username=f"soak-{tag}", email=f"soak-{tag}@example.com", hashed_password="-")
+        products = [
+            Product(name=f"soak-{tag}-{n}", price=Decimal("4.99") + n, stock=10_000_000)
+            for n in range(PRODUCTS)
+        ]
+        db.add(user)
+        db.add_all(products)
+        db.commit()
+        token = create_access_token({"sub": str(user.id)}, timedelta(hours=hours + 1))
+        return str(user.id), [str(product.id) for product in products], tag, token
+
+
+class Workload:
+    def __init__(self, client: TestClient, user_id: str, product_ids: list[str], tag: str, token: str):
+        self.client = client
+        self.user_id = user_id
+        self.product_ids = product_ids
+        self.tag = tag
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.order_ids: list[str] = []
+        # (label, weight, callable)
+        self.operations = [
+            ("GET /products", 10, lambda: self.get("/products/")),
+            ("GET /products?fields", 5, lambda: self.get("/products/?fields=name,price")),
+            ("GET /products/search", 10, lambda: self.get(f"/products/search?name={self.tag}&page=1")),
+            ("GET /products/{id}", 15, lambda: self.get(f"/products/{random.choice(self.product_ids)}")),
+            ("GET /products/top", 5, lambda: self.get("/products/top?window=1h")),
+            ("POST /orders", 15, self.create_order),
+            ("GET /orders/{id}", 15, lambda: self.order_read(lambda order_id: f"/orders/{order_id}?expand=products")),
+            ("GET /orders?ids", 5, lambda: self.order_read(lambda _: "/orders/?ids=" + ",".join(self.order_ids[-20:]))),
+            ("GET /users/{id}/orders", 5, lambda: self.get(f"/users/{self.user_id}/orders")),
+            ("GET /users/{id}/summary", 5, lambda: self.get(f"/users/{self.user_id}/summary")),
+            ("DELETE /orders/{id}", 5, self.cancel_order),
+        ]
+        self.weights = [weight for _, weight, _ in self.operations]
+
+    def get(self, path: str):
+        return self.client.get(f"/api/v1{path}", headers=self.headers)
+
+    def create_order(self):
+        lines = random.sample(self.product_ids, random.randint(1, 4))
+        response = self.client.post(
+            "/api/v1/orders/",
+            headers=self.headers,
+            json={"products": [{"product_id": product_id, "quantity": random.randint(1, 3)} for product_id in lines]},
+        )
+        if response.status_code == 201:
+            self.order_ids.append(response.json()["id"])
+            # Only recent orders are read back, so the list itself doesn't grow without bound
+            del self.order_ids[:-1000]
+        return response
+
+    def order_read(self, path_for):
+        if not self.order_ids:
+            return self.create_order()
+        return self.get(path_for(random.choice(self.order_ids)))
+
+    def cancel_order(self):
+        if not self.order_ids:
+            return self.create_order()
+        order_id = self.order_ids.pop(random.randrange(len(self.order_ids)))
+        return self.client.delete(f"/api/v1/orders/{order_id}", headers=self.headers)
+
+    def step(self) -> tuple[str, int]:
+        label, _, operation = random.choices(self.operations, self.weights)[0]
+        return label, operation().status_code
+
+
+def live_objects() -> dict:
+    gc.collect()
+    sessions = mapped = models = 0
+    identity_map = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, Session):
+            sessions += 1
+            identity_map += len(obj.identity_map)
+        elif isinstance(obj, BaseModel):
+            models += 1
+        elif hasattr(type(obj), "_sa_class_manager"):
+            mapped += 1
+    return {
+        "sessions": sessions,
+        "identity_map": identity_map,
+        "mapped_objects": mapped,
+        "pydantic_models": models,
+        "connections_out": engine.pool.checkedout(),
+    }
+
+
+def print_growth(previous: tracemalloc.Snapshot, current: tracemalloc.Snapshot) -> None:
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = current.filter_traces(filters).compare_to(previous.filter_traces(filters), "lineno")
+    for stat in [stat for stat in stats if stat.size_diff > 0][:TOP_SITES]:
+        frame = stat.traceback[0]
+        print(f"    {stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} blocks  {frame.filename}:{frame.lineno}")
+
+
+def main(minutes: float, warmup_requests: int, report_seconds: float, budget_bytes: float) -> None:
+    random.seed(7)
+    user_id, product_ids, tag, token = setup(minutes / 60)
+    endpoint_stats = defaultdict(lambda: {"requests": 0, "errors": 0, "peak": 0, "retained": 0})
+    failures = []
+
+    with TestClient(app) as client:
+        workload = Workload(client, user_id, product_ids, tag, token)
+        tracemalloc.start(10)
+        for _ in range(warmup_requests):
+            workload.step()
+        gc.collect()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        previous_snapshot = tracemalloc.take_snapshot()
+        print(f"warm-up: {warmup_requests:,} requests, traced {baseline_memory / 2**20:,.1f} MiB, {live_objects()}")
+
+        requests = 0
+        deadline = time.monotonic() + minutes * 60
+        next_report = time.monotonic() + report_seconds
+        while time.monotonic() < deadline:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            label, status_code = workload.step()
+            current, peak = tracemalloc.get_traced_memory()
+            stats = endpoint_stats[label]
+            stats["requests"] += 1
+            stats["errors"] += status_code >= 400
+            stats["peak"] += peak - before
+            stats["retained"] += current - before
+            requests += 1
+
+            if time.monotonic() >= next_report:
+                gc.collect()
+                snapshot = tracemalloc.take_snapshot()
+                traced = tracemalloc.get_traced_memory()[0]
+                per_request = (traced - baseline_memory) / requests
+                print(f"\n{requests:,} requests, traced {traced / 2**20:,.1f} MiB "
+                      f"({per_request:+,.1f} B/request since warm-up), {live_objects()}")
+                print_growth(previous_snapshot, snapshot)
+                previous_snapshot = snapshot
+                next_report = time.monotonic() + report_seconds
+
+        gc.collect()
+        retained_per_request = (tracemalloc.get_traced_memory()[0] - baseline_memory) / max(requests, 1)
+
+    # The app's own sessions and connections should all be closed by now
+    leftovers = live_objects()
+    tracemalloc.stop()
+
+    print(f"\n{'endpoint':<26}{'requests':>10}{'errors':>8}{'peak/req':>14}{'retained/req':>15}")
+    for label, stats in sorted(endpoint_stats.items(), key=lambda item: -item[1]["peak"] / item[1]["requests"]):
+        count = stats["requests"]
+        print(f"{label:<26}{count:>10,}{stats['errors']:>8,}{stats['peak'] / count / 1024:>10.1f} KiB"
+              f"{stats['retained'] / count:>13.1f} B")
+
+    print(f"\nretained after warm-up: {retained_per_request:,.1f} B/request (budget {budget_bytes:,.0f})")
+    print(f"left open after the run: {leftovers}")
+    if retained_per_request > budget_bytes:
+        failures.append(f"retained {retained_per_request:,.1f} B/request, over the {budget_bytes:,.0f} B budget")
+    if leftovers["sessions"] or leftovers["connections_out"]:
+        failures.append(f"{leftovers['sessions']} sessions / {leftovers['connections_out']} connections not released")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--warmup-requests", type=int, default=5000)
+    parser.add_argument("--report-seconds", type=float, default=300)
+    parser.add_argument("--budget-bytes", type=float, default=256, help="memory retained per request after warm-up")
+    args = parser.parse_args()
+    main(args.minutes, args.warmup_requests, args.report_seconds, args.budget_bytes)
@@ -0,0 +1,70 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.ids import id_generator, uuid7, uuid7_bounds, uuid7_time
+from app.settings import settings
+
+
+def test_uuid7_layout():
+    value = uuid7(timestamp_ms=0x0123456789AB)
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert value.int >> 80 == 0x0123456789AB
+
+
+def test_uuid7_increases_within_a_process():
+    values = [uuid7() for _ in range(10_000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_uuid7_counter_rolls_over_into_the_next_millisecond(monkeypatch):
+    # A frozen clock: the 12-bit counter runs out and ids move to the next millisecond
+    frozen_ms = 2**46
+    monkeypatch.setattr(time, "time_ns", lambda: frozen_ms * 1_000_000)
+    values = [uuid7() for _ in range(5000)]
+    assert values == sorted(values)
+    timestamps = [value.int >> 80 for value in values]
+    assert timestamps[0] == frozen_ms
+    assert timestamps[-1] == frozen_ms + 1
+    first_borrowed = values[timestamps.index(frozen_ms + 1)]
+    assert (first_borrowed.int >> 64) & 0xFFF == 0
+
+
+def test_uuid7_time():
+    moment = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    assert uuid7_time(uuid7(timestamp_ms=int(moment.timestamp() * 1000))) == moment
+    assert uuid7_time(uuid.uuid4()) is None
+
+
+def test_uuid7_bounds_cover_the_range():
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    end = start + timedelta(hours=1)
+    low, high = uuid7_bounds(start, end)
+    start_ms, end_ms = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+    for _ in range(100):
+        assert low <= uuid7(timestamp_ms=start_ms) <= high
+        assert low <= uuid7(timestamp_ms=end_ms - 1) <= high
+        assert uuid7(timestamp_ms=start_ms - 1) < low
+        assert uuid7(timestamp_ms=end_ms) > high
+
+
+def test_uuid7_bounds_treat_naive_times_as_utc():
+    start = datetime(2024, 5, 1)
+    end = start + timedelta(minutes=1)
+    assert uuid7_bounds(start, end) == uuid7_bounds(start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc))
+
+
+def test_id_generator_overrides_merge_with_table_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "ID_GENERATOR", "uuid4")
+    monkeypatch.setattr(settings, "ID_GENERATOR_OVERRIDES", {"users": "uuid7"})
+    assert id_generator("users") is uuid7
+    assert id_generator("orders") is uuid7
+    assert id_generator("statuses") is uuid.uuid4
+
+
+def test_id_generator_rejects_unknown_names(monkeypatch):
+    monkeypatch.setattr(settings, "ID_GENERATOR_OVERRIDES", {"users": "uuid1"})
+    with pytest.raises(ValueError):
+        id_generator("users")
@@ -0,0 +1,26 @@
+from decimal import Decimal
+import pytest
+from fastapi import HTTPException
+from app.services.product_service import parse_price_breaks
+from app.settings import settings
+
+
+def test_parse_price_breaks_defaults_to_settings():
+    assert parse_price_breaks(None) == tuple(Decimal(str(price)) for price in settings.FACET_PRICE_BREAKS)
+
+
+def test_parse_price_breaks():
+    assert parse_price_breaks("10, 50,100.5") == (Decimal("10"), Decimal("50"), Decimal("100.5"))
+
+
+@pytest.mark.parametrize("value", ["10,abc", "50,10", "10,10", "10,NaN", "Infinity", ""])
+def test_parse_price_breaks_rejects_bad_input(value):
+    with pytest.raises(HTTPException) as error:
+        parse_price_breaks(value)
+    assert error.value.status_code == 400
+
+
+def test_parse_price_breaks_limits_the_count(monkeypatch):
+    monkeypatch.setattr(settings, "FACET_MAX_PRICE_BREAKS", 2)
+    with pytest.raises(HTTPException):
+        parse_price_breaks("1,2,3")
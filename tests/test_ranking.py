@@ -0,0 +1,51 @@
+import time
+from uuid import uuid4
+from app.ranking import SalesRanking
+
+APPLE, PEAR, PLUM = uuid4(), uuid4(), uuid4()
+HOUR = 60 * 60
+
+
+def test_top_orders_products_by_units_sold():
+    ranking = SalesRanking(refresh_seconds=0)
+    now = time.time()
+    ranking.record([(APPLE, 3), (PEAR, 5)], now, now=now)
+    ranking.record([(APPLE, 1), (PLUM, 1)], now, now=now)
+    assert ranking.top("1h", 10, now=now) == [(PEAR, 5), (APPLE, 4), (PLUM, 1)]
+    assert ranking.top("1h", 2, now=now) == [(PEAR, 5), (APPLE, 4)]
+
+
+def test_cancellations_take_sales_back_out():
+    ranking = SalesRanking(refresh_seconds=0)
+    now = time.time()
+    ranking.record([(APPLE, 3), (PEAR, 5)], now, now=now)
+    ranking.record([(PEAR, -5)], now, now=now)
+    assert ranking.top("1h", 10, now=now) == [(APPLE, 3)]
+
+
+def test_sales_leave_each_window_after_its_span():
+    ranking = SalesRanking(refresh_seconds=0)
+    now = time.time()
+    ranking.record([(APPLE, 2)], now, now=now)
+    later = now + 2 * HOUR
+    assert ranking.top("1h", 10, now=later) == []
+    assert ranking.top("24h", 10, now=later) == [(APPLE, 2)]
+    assert ranking.top("7d", 10, now=now + 8 * 24 * HOUR) == []
+
+
+def test_sales_older_than_a_window_are_not_counted():
+    ranking = SalesRanking(refresh_seconds=0)
+    now = time.time()
+    ranking.record([(APPLE, 2)], now - 2 * HOUR, now=now)
+    assert ranking.top("1h", 10, now=now) == []
+    assert ranking.top("24h", 10, now=now) == [(APPLE, 2)]
+
+
+def test_top_list_is_refreshed_at_most_every_refresh_seconds():
+    ranking = SalesRanking(refresh_seconds=60)
+    now = time.time()
+    ranking.record([(APPLE, 1)], now, now=now)
+    assert ranking.top("1h", 10, now=now) == [(APPLE, 1)]
+    ranking.record([(PEAR, 5)], now, now=now)
+    assert ranking.top("1h", 10, now=now + 1) == [(APPLE, 1)]
+    assert ranking.top("1h", 10, now=now + 61) == [(PEAR, 5), (APPLE, 1)]
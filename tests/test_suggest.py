@@ -0,0 +1,81 @@
+from uuid import uuid4
+from app.suggest import ProductNameIndex, normalize
+
+
+def ids(suggestions):
+    return [product_id for product_id, _ in suggestions]
+
+
+def test_normalize_strips_accents_case_and_spacing():
+    assert normalize("  Crème   BRÛLÉE ") == "creme brulee"
+    assert normalize("Apple Juice") == "apple juice"
+
+
+def test_suggest_matches_the_start_of_any_word():
+    juice, jam = uuid4(), uuid4()
+    index = ProductNameIndex()
+    index.rebuild([(juice, "Apple Juice"), (jam, "Strawberry Jam")], 1)
+    assert index.suggest("jui", 10) == [(juice, "Apple Juice")]
+    assert index.suggest("app", 10) == [(juice, "Apple Juice")]
+    # Equal sales: in key order, "jam" before "juice"
+    assert index.suggest("j", 10) == [(jam, "Strawberry Jam"), (juice, "Apple Juice")]
+    assert index.suggest("ice", 10) == []
+
+
+def test_a_product_matching_through_several_words_is_listed_once():
+    product = uuid4()
+    index = ProductNameIndex()
+    index.rebuild([(product, "Green Grape Granola")], 1)
+    assert index.suggest("gr", 10) == [(product, "Green Grape Granola")]
+
+
+def test_upsert_renames_and_remove_drops_every_word():
+    product = uuid4()
+    index = ProductNameIndex()
+    index.rebuild([], 1)
+    index.upsert(product, "Oat Milk")
+    assert index.suggest("milk", 10) == [(product, "Oat Milk")]
+
+    index.upsert(product, "Almond Milk")
+    assert index.suggest("oat", 10) == []
+    assert index.suggest("milk", 10) == [(product, "Almond Milk")]
+
+    index.remove(product)
+    assert index.suggest("almond", 10) == []
+    assert index.suggest("milk", 10) == []
+    assert len(index) == 0
+
+
+def test_remove_keeps_other_products_with_the_same_name():
+    first, second = uuid4(), uuid4()
+    index = ProductNameIndex()
+    index.rebuild([(first, "Honey"), (second, "Honey")], 1)
+    index.remove(first)
+    assert index.suggest("honey", 10) == [(second, "Honey")]
+
+
+def test_best_sellers_come_first():
+    slow, fast = uuid4(), uuid4()
+    index = ProductNameIndex()
+    index.rebuild([(slow, "Tea Green"), (fast, "Tea Black")], 1)
+    index.set_popularity({fast: 10, slow: 1})
+    assert ids(index.suggest("tea", 10)) == [fast, slow]
+
+
+def test_broad_prefixes_rank_popular_products_then_index_order():
+    products = [(uuid4(), f"Apple {n:03}") for n in range(50)]
+    popular = products[30][0]
+    index = ProductNameIndex(scan_limit=10, max_limit=5)
+    index.rebuild(products, 1)
+    index.set_popularity({popular: 7})
+    assert ids(index.suggest("apple", 3)) == [popular, products[0][0], products[1][0]]
+    # The cached ranking is dropped when the index changes
+    index.remove(popular)
+    assert ids(index.suggest("apple", 3)) == ids(products[:3])
+
+
+def test_ready_once_loaded():
+    index = ProductNameIndex()
+    assert not index.ready
+    index.rebuild([], 1)
+    assert index.ready